@@ -0,0 +1,260 @@
+# ats_project/benchmark.py
+"""
+View benchmarks.
+
+run_benchmarks() requests every URL of the project's own apps (the admin and
+django.contrib.auth views are left out) as a logged-in staff user through
+the test client, against whatever data the database holds, usually
+synthetic data from ats_project.synthetic. URL parameters are filled in
+with sample rows, favouring the job with the most applicants and one of its
+candidates, so detail pages are measured at their heaviest.
+
+For each view it records:
+
+- the status code, query count, SQL time and latency of a first request
+  made with an empty cache
+- the latency percentiles of `repeat` further requests
+- the query count and peak Python memory of one more request, measured
+  with tracemalloc separately because tracing slows requests down
+
+Results are plain JSON, so runs from two commits can be compared with
+compare().
+"""
+import platform
+import re
+import subprocess
+import time
+import tracemalloc
+from contextlib import ExitStack
+from datetime import datetime, timezone as dt_timezone
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import URLPattern, URLResolver, get_resolver
+
+from candidates.matching import reset_match_index
+from candidates.models import (
+    Application, Candidate, CandidateEducation, CandidateSkill, CandidateWorkExperience, DuplicateCandidate,
+)
+from jobs.models import JobPost
+from recruiters.calendar_feed import get_or_create_feed
+from recruiters.models import EmailTemplate
+from .profiling import RequestProfile, percentile
+
+BENCHMARK_USERNAME = 'benchmark'
+# Views whose GET changes data
+SKIPPED_VIEWS = {
+    'parse_resume',  # queues a parse job
+}
+RESULTS_VERSION = 1
+ROUTE_PARAMETER = re.compile(r'<(?:\w+:)?(\w+)>')
+
+
+def project_urls(resolver=None, prefix=''):
+    """
+    Yield (URL name, route) for every named URL pattern outside the admin
+    and Django's own apps
+    """
+    resolver = resolver or get_resolver()
+    for pattern in resolver.url_patterns:
+        route = prefix + str(pattern.pattern)
+        if isinstance(pattern, URLResolver):
+            module = getattr(pattern.urlconf_module, '__name__', '')
+            if pattern.app_name == 'admin' or module.startswith('django.'):
+                continue
+            yield from project_urls(pattern, route)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            yield pattern.name, route
+
+
+def sample_parameters(user):
+    """
+    Values for the URL parameters of the project's routes, by name. Names
+    with nothing to point at (an empty table) are left out.
+    """
+    job = JobPost.objects.order_by('-applicant_count', 'id').first()
+    application = Application.objects.filter(job=job).order_by('id').first() if job else None
+    candidate_id = application.candidate_id if application else (
+        Candidate.objects.order_by('id').values_list('id', flat=True).first()
+    )
+    values = {
+        'job_id': job.id if job else None,
+        'application_id': application.id if application else None,
+        'candidate_id': candidate_id,
+        'other_id': Candidate.objects.exclude(id=candidate_id).order_by('id').values_list('id', flat=True).first(),
+        'duplicate_id': DuplicateCandidate.objects.filter(status='open').order_by('id').values_list(
+            'id', flat=True,
+        ).first(),
+        'skill_id': CandidateSkill.objects.filter(candidate_id=candidate_id).values_list('id', flat=True).first(),
+        'education_id': CandidateEducation.objects.filter(candidate_id=candidate_id).values_list(
+            'id', flat=True,
+        ).first(),
+        'experience_id': CandidateWorkExperience.objects.filter(candidate_id=candidate_id).values_list(
+            'id', flat=True,
+        ).first(),
+        'template_id': EmailTemplate.objects.order_by('id').values_list('id', flat=True).first(),
+        'token': get_or_create_feed(user).token,
+        'fmt': 'csv',
+    }
+    return {name: value for name, value in values.items() if value is not None}
+
+
+def _fill(route, parameters):
+    missing = [name for name in ROUTE_PARAMETER.findall(route) if name not in parameters]
+    if missing:
+        return None, missing
+    return '/' + ROUTE_PARAMETER.sub(lambda match: str(parameters[match.group(1)]), route), []
+
+
+def _get(client, url, profile=None):
+    """
+    Request `url` and read the whole body, streamed or not; returns the
+    response and the seconds taken. Queries are counted into `profile`.
+    """
+    with ExitStack() as stack:
+        if profile is not None:
+            for database in connections.all():
+                stack.enter_context(database.execute_wrapper(profile.time_query))
+        started = time.perf_counter()
+        response = client.get(url)
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        else:
+            response.content
+        elapsed = time.perf_counter() - started
+    response.close()
+    return response, elapsed
+
+
+def _milliseconds(seconds):
+    return round(seconds * 1000, 3)
+
+
+def measure(client, url, repeat=5):
+    cache.clear()
+    reset_match_index()
+    cold_profile = RequestProfile()
+    response, cold = _get(client, url, cold_profile)
+    warm = sorted(_get(client, url)[1] for _ in range(repeat))
+
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        warm_profile = RequestProfile()
+        _get(client, url, warm_profile)
+        peak = tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+
+    return {
+        'status': response.status_code,
+        'cold_ms': _milliseconds(cold),
+        'cold_queries': cold_profile.sql_queries,
+        'cold_sql_ms': _milliseconds(cold_profile.sql_duration),
+        'warm_ms': {
+            'p50': _milliseconds(percentile(warm, 0.5)),
+            'p90': _milliseconds(percentile(warm, 0.9)),
+            'max': _milliseconds(warm[-1]),
+        } if warm else None,
+        'warm_queries': warm_profile.sql_queries,
+        'peak_memory_kb': round(max(peak, 0) / 1024, 1),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def run_benchmarks(repeat=5, names=None, progress=None):
+    """
+    Benchmark every project URL, or only those named in `names`, and return
+    the results document; see the module docstring
+    """
+    user, created = User.objects.get_or_create(
+        username=BENCHMARK_USERNAME, defaults={'is_staff': True, 'is_superuser': True},
+    )
+    if created:
+        user.set_unusable_password()
+        user.save(update_fields=['password'])
+    # Errors are results too: record the 500 and carry on
+    client = Client(raise_request_exception=False)
+    client.force_login(user)
+    parameters = sample_parameters(user)
+
+    views = {}
+    # The test client's host name, whatever the deployment allows
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+        for name, route in project_urls():
+            if names and name not in names:
+                continue
+            entry = {'name': name}
+            url, missing = _fill(route, parameters)
+            if name in SKIPPED_VIEWS:
+                entry['skipped'] = 'GET changes data'
+            elif url is None:
+                entry['skipped'] = f"no sample value for {', '.join(missing)}"
+            else:
+                entry['url'] = url
+                entry.update(measure(client, url, repeat))
+            views[route] = entry
+            if progress is not None:
+                progress(route, entry)
+
+    return {
+        'version': RESULTS_VERSION,
+        'meta': {
+            'commit': _git_commit(),
+            'created_at': datetime.now(dt_timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'repeat': repeat,
+            'rows': {
+                'jobs': JobPost.objects.count(),
+                'candidates': Candidate.objects.count(),
+                'applications': Application.objects.count(),
+            },
+        },
+        'views': views,
+    }
+
+
+def compare(baseline, current, tolerance=0.2, min_change_ms=1.0):
+    """
+    Compare two results documents view by view. Returns [(route, metric,
+    before, after)] for regressions: more queries, a new error status, or a
+    latency (cold or warm p50) more than `tolerance` and `min_change_ms`
+    above the baseline.
+    """
+    regressions = []
+    for route, after in current['views'].items():
+        before = baseline['views'].get(route)
+        if not before or 'skipped' in before or 'skipped' in after:
+            continue
+        if after['status'] >= 500 > before['status']:
+            regressions.append((route, 'status', before['status'], after['status']))
+        for metric in ('cold_queries', 'warm_queries'):
+            if after[metric] > before[metric]:
+                regressions.append((route, metric, before[metric], after[metric]))
+        latencies = [('cold_ms', before['cold_ms'], after['cold_ms'])]
+        if before['warm_ms'] and after['warm_ms']:
+            latencies.append(('warm_ms.p50', before['warm_ms']['p50'], after['warm_ms']['p50']))
+        for metric, old, new in latencies:
+            if new - old > max(old * tolerance, min_change_ms):
+                regressions.append((route, metric, old, new))
+    return regressions
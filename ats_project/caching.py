@@ -0,0 +1,89 @@
+# ats_project/caching.py
+"""
+Page and fragment caching keyed on change stamps.
+
+A stamp is a small cache entry holding the time something last changed: one
+per job and per candidate, plus JOB_POSTS for job and department rows (which
+many pages show) and JOB_BOARD for the applicant counters on the job list.
+Cached objects and template fragments carry the stamps they depend on in
+their keys. A change only has to move those stamps, and the next request
+builds new keys and leaves the old entries to expire. post_save and
+post_delete receivers move them, and so do the bulk paths that bypass
+signals. Reading stamps is one cache round trip, so a page whose stamps
+have not moved is served without querying the database.
+
+Stamps only work if every process that writes reads the same cache, which
+is why the default cache is file-based (see CACHES in settings): a stamp
+moved by the resume worker or a management command is seen by every web
+process.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+CACHE_TIMEOUT = 60 * 60
+# Titles, descriptions and departments of every job
+JOB_POSTS = 'job-posts'
+# Applicant counters shown on the job list
+JOB_BOARD = 'job-board'
+
+
+def job_stamp(job_id):
+    return f'job:{job_id}'
+
+
+def candidate_stamp(candidate_id):
+    return f'candidate:{candidate_id}'
+
+
+def _stamp_key(name):
+    return f'stamp:{name}'
+
+
+def stamps(*names):
+    """
+    Return the stamps of `names` joined into one string for use in a cache
+    key, starting a stamp for names that have none yet
+    """
+    keys = [_stamp_key(name) for name in names]
+    found = cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        now = time.time_ns()
+        for key in missing:
+            # add() keeps a stamp another request set in the meantime
+            cache.add(key, now, None)
+        found.update(cache.get_many(missing))
+    return '.'.join(str(found.get(key, 0)) for key in keys)
+
+
+def touch(*names):
+    """
+    Mark `names` as changed. The stamps move straight away, so the rest of
+    the transaction reads its own changes, and again after commit, so a
+    page another request renders from the pre-commit data in between is
+    never served.
+    """
+    if not names:
+        return
+
+    def move():
+        now = time.time_ns()
+        cache.set_many({_stamp_key(name): now for name in names}, None)
+
+    move()
+    transaction.on_commit(move)
+
+
+def cached(key, build, timeout=CACHE_TIMEOUT):
+    """
+    Return the value cached under `key`, calling build() to compute and
+    store it on a miss. Exceptions from build() (such as Http404) are not
+    cached.
+    """
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, timeout)
+    return value
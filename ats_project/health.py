@@ -0,0 +1,39 @@
+# ats_project/health.py
+"""
+Health check for load balancers and uptime monitors.
+
+/healthz/ needs no login and runs one trivial query on every configured
+database, answering 200 when all of them respond and 503 otherwise.
+"""
+import logging
+
+from django.db import DatabaseError, connections
+from django.http import JsonResponse
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_GET
+
+from .query_budget import query_budget
+
+logger = logging.getLogger(__name__)
+
+
+@never_cache
+@require_GET
+@query_budget(1)
+def health(request):
+    databases = {}
+    for alias in connections:
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SELECT 1')
+                cursor.fetchone()
+        except DatabaseError:
+            logger.exception("Health check failed for database %r", alias)
+            databases[alias] = 'unavailable'
+        else:
+            databases[alias] = 'ok'
+    healthy = all(status == 'ok' for status in databases.values())
+    return JsonResponse(
+        {'status': 'ok' if healthy else 'unavailable', 'databases': databases},
+        status=200 if healthy else 503,
+    )
@@ -0,0 +1,242 @@
+# ats_project/profiling.py
+"""
+Opt-in request profiling.
+
+With PROFILING set, ProfilingMiddleware records for every request the wall
+time, the number and total time of SQL queries on every database, the time
+spent rendering templates and, with PROFILING_MEMORY also set, the peak
+Python memory allocated while handling it. Template time includes queries
+run by lazy querysets the template evaluates, which is usually the point.
+
+Samples are grouped by URL name. The last PROFILING_SAMPLES of each are kept
+in process memory for percentiles, along with running totals. They are
+served as JSON at /profiling/ to staff, and in the Prometheus text format at
+/profiling/metrics to staff or to a scraper sending
+"Authorization: Bearer <PROFILING_TOKEN>". Each worker process keeps and
+reports its own numbers.
+
+Peak memory comes from tracemalloc, which slows every allocation down, and
+is only exact when a process handles one request at a time.
+"""
+import functools
+import hmac
+import math
+import threading
+import time
+import tracemalloc
+from collections import defaultdict, deque
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
+from django.template.backends.django import Template
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_GET
+
+from .query_budget import query_budget
+
+QUANTILES = (0.5, 0.9, 0.99)
+# (sample field, Prometheus metric name, help text)
+METRICS = [
+    ('duration', 'ats_request_duration_seconds', 'Wall time of the request'),
+    ('sql_queries', 'ats_request_sql_queries', 'SQL queries issued by the request'),
+    ('sql_duration', 'ats_request_sql_duration_seconds', 'Time spent executing SQL'),
+    ('template_duration', 'ats_request_template_duration_seconds', 'Time spent rendering templates'),
+    ('peak_memory', 'ats_request_peak_memory_bytes', 'Peak Python memory allocated by the request'),
+]
+UNRESOLVED = '<unresolved>'
+
+_current = ContextVar('ats_request_profile', default=None)
+_templates_instrumented = False
+
+
+class RequestProfile:
+    """
+    Counters for the request being handled
+    """
+    def __init__(self):
+        self.sql_queries = 0
+        self.sql_duration = 0.0
+        self.template_duration = 0.0
+        self.rendering = False
+
+    def time_query(self, execute, sql, params, many, context):
+        # Installed with connection.execute_wrapper()
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_duration += time.perf_counter() - started
+            self.sql_queries += 1
+
+
+def percentile(ordered, fraction):
+    """
+    Nearest-rank percentile of a sorted, non-empty list
+    """
+    rank = min(max(math.ceil(fraction * len(ordered)), 1), len(ordered))
+    return ordered[rank - 1]
+
+
+class ProfileStore:
+    """
+    Per-view samples and totals, safe to update from several threads
+    """
+    def __init__(self, max_samples=1000):
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._samples = defaultdict(lambda: deque(maxlen=self.max_samples))
+            self._totals = defaultdict(lambda: defaultdict(float))
+            self._counts = defaultdict(int)
+
+    def add(self, view_name, sample):
+        with self._lock:
+            self._samples[view_name].append(sample)
+            self._counts[view_name] += 1
+            for field, value in sample.items():
+                self._totals[view_name][field] += value
+
+    def summary(self, quantiles=QUANTILES):
+        """
+        {view name: {'requests': n, field: {'p50': .., 'sum': ..}}} for each
+        recorded field
+        """
+        with self._lock:
+            samples = {view_name: list(recent) for view_name, recent in self._samples.items()}
+            totals = {view_name: dict(fields) for view_name, fields in self._totals.items()}
+            counts = dict(self._counts)
+        summary = {}
+        for view_name in sorted(samples):
+            entry = {'requests': counts[view_name]}
+            for field in totals[view_name]:
+                ordered = sorted(sample[field] for sample in samples[view_name] if field in sample)
+                entry[field] = {f'p{round(q * 100)}': percentile(ordered, q) for q in quantiles}
+                entry[field]['sum'] = totals[view_name][field]
+            summary[view_name] = entry
+        return summary
+
+
+store = ProfileStore(getattr(settings, 'PROFILING_SAMPLES', 1000))
+
+
+def _instrument_templates():
+    """
+    Time Template.render() of the template backend, which render() and
+    render_to_string() call once per top-level template
+    """
+    global _templates_instrumented
+    if _templates_instrumented:
+        return
+    render = Template.render
+
+    @functools.wraps(render)
+    def timed_render(self, context=None, request=None):
+        profile = _current.get()
+        # Templates rendered from inside a template are already being timed
+        if profile is None or profile.rendering:
+            return render(self, context, request)
+        profile.rendering = True
+        started = time.perf_counter()
+        try:
+            return render(self, context, request)
+        finally:
+            profile.template_duration += time.perf_counter() - started
+            profile.rendering = False
+
+    Template.render = timed_render
+    _templates_instrumented = True
+
+
+class ProfilingMiddleware:
+    """
+    Record wall, SQL and template time per request; see the module docstring.
+    Put it first in MIDDLEWARE so the session and user lookups are counted.
+    """
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.track_memory = getattr(settings, 'PROFILING_MEMORY', False)
+        _instrument_templates()
+        if self.track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        token = _current.set(profile)
+        if self.track_memory:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile.time_query))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        sample = {
+            'duration': time.perf_counter() - started,
+            'sql_queries': profile.sql_queries,
+            'sql_duration': profile.sql_duration,
+            'template_duration': profile.template_duration,
+        }
+        if self.track_memory:
+            sample['peak_memory'] = max(tracemalloc.get_traced_memory()[1] - baseline, 0)
+        match = request.resolver_match
+        store.add(match.view_name if match else UNRESOLVED, sample)
+        return response
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus_text(summary, quantiles=QUANTILES):
+    """
+    Render a ProfileStore summary as Prometheus summaries, one per metric
+    """
+    lines = []
+    for field, name, help_text in METRICS:
+        views = [(view_name, entry) for view_name, entry in summary.items() if field in entry]
+        if not views:
+            continue
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} summary']
+        for view_name, entry in views:
+            view = _label(view_name)
+            for q in quantiles:
+                lines.append(f'{name}{{view="{view}",quantile="{q}"}} {entry[field][f"p{round(q * 100)}"]}')
+            lines.append(f'{name}_sum{{view="{view}"}} {entry[field]["sum"]}')
+            lines.append(f'{name}_count{{view="{view}"}} {entry["requests"]}')
+    return '\n'.join(lines) + '\n'
+
+
+@never_cache
+@require_GET
+@staff_member_required
+@query_budget(2)
+def profiling_summary(request):
+    return JsonResponse({'views': store.summary()})
+
+
+def _has_scrape_token(request):
+    token = getattr(settings, 'PROFILING_TOKEN', '')
+    header = request.headers.get('Authorization', '')
+    return bool(token) and hmac.compare_digest(header, f'Bearer {token}')
+
+
+@never_cache
+@require_GET
+@query_budget(2)
+def profiling_metrics(request):
+    if not (_has_scrape_token(request) or (request.user.is_active and request.user.is_staff)):
+        return HttpResponseForbidden()
+    return HttpResponse(prometheus_text(store.summary()), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,55 @@
+# ats_project/query_budget.py
+from urllib.parse import urlsplit
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+
+
+def query_budget(max_queries):
+    """
+    Declare the maximum number of SQL queries a view may issue per request,
+    including the session and user lookups done by the auth middleware.
+
+    The budget is stored on the view function, and survives decorators such as
+    login_required because functools.wraps copies the function's __dict__.
+    """
+    def decorator(view_func):
+        view_func.query_budget = max_queries
+        return view_func
+    return decorator
+
+
+class QueryBudgetTestMixin:
+    """
+    TestCase mixin that runs a request through the test client and fails when
+    the resolved view issues more queries than its declared budget, counting
+    on-commit callbacks the request registered and, for streaming responses,
+    the queries made while the body is read
+    """
+    def assertWithinQueryBudget(self, url, method='get', data=None, **extra):
+        match = resolve(urlsplit(url).path)
+        budget = getattr(match.func, 'query_budget', None)
+        if budget is None:
+            self.fail(f"View '{match.view_name}' does not declare a query budget")
+
+        # Work deferred with transaction.on_commit() runs inside the request in
+        # production, so it is executed and counted here too
+        with CaptureQueriesContext(connection) as context:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = getattr(self.client, method)(url, data or {}, **extra)
+            if response.streaming:
+                # A streamed body queries as it is read, so read it here and
+                # hand the test the same bytes
+                content = b''.join(response.streaming_content)
+                response.streaming_content = [content]
+
+        if len(context) > budget:
+            queries = '\n'.join(
+                f"{i}. {query['sql']}" for i, query in enumerate(context.captured_queries, start=1)
+            )
+            self.fail(
+                f"View '{match.view_name}' issued {len(context)} queries for {method.upper()} {url}, "
+                f"over its budget of {budget}:\n{queries}"
+            )
+        return response
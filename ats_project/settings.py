@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 from pathlib import Path
 import os
 
+from .database import database_config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -44,6 +46,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'ats_project.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -76,15 +79,39 @@ WSGI_APPLICATION = 'ats_project.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
+# Set DATABASE_URL to use PostgreSQL; see ats_project/database.py for the
+# pooling and SQLite tuning options
 
 DATABASES = {
+    'default': database_config(BASE_DIR / 'db.sqlite3'),
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# A file-based cache under CACHE_DIR, so that the web processes, the resume
+# worker and management commands all see the same entries and the change
+# stamps any of them moves; see ats_project/caching.py. Point CACHE_DIR at a
+# directory every process can write to.
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': Path(os.environ.get('CACHE_DIR', BASE_DIR / 'cache')),
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    },
 }
 
 
+# Request profiling, off unless PROFILING=1; see ats_project/profiling.py.
+# PROFILING_MEMORY=1 also tracks peak memory, at a noticeable cost per request
+
+PROFILING = os.environ.get('PROFILING') == '1'
+PROFILING_MEMORY = os.environ.get('PROFILING_MEMORY') == '1'
+PROFILING_SAMPLES = 1000
+PROFILING_TOKEN = os.environ.get('PROFILING_TOKEN', '')
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -121,6 +148,24 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Uploaded files. Resumes are stored under resumes/ in subdirectories named
+# after the first characters of their content hash.
+MEDIA_ROOT = Path(os.environ.get('MEDIA_ROOT', BASE_DIR / 'media'))
+MEDIA_URL = '/media/'
+
+# Chunked resume uploads (candidates.uploads)
+RESUME_UPLOAD_MAX_SIZE = 20 * 1024 * 1024
+RESUME_UPLOAD_CHUNK_SIZE = 5 * 1024 * 1024
+# Let the front proxy send resume downloads: '' (Django streams them),
+# 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache, lighttpd). See
+# candidates.downloads.
+RESUME_SENDFILE = os.environ.get('RESUME_SENDFILE', '')
+RESUME_SENDFILE_PREFIX = os.environ.get('RESUME_SENDFILE_PREFIX', '/protected-media/')
+
+# Seconds a background thread waits to batch up candidates whose search
+# index entries went stale before reindexing them (candidates.indexing)
+CANDIDATE_INDEX_DELAY = 1.0
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -0,0 +1,290 @@
+# ats_project/synthetic.py
+"""
+Seeded synthetic data for benchmarks.
+
+generate() fills the database with departments, jobs, recruiters, email
+templates and candidates with skills, education, work history,
+applications, notes and interviews, in realistic proportions. The same seed
+always produces the same people and history, so benchmark results from
+different commits are comparable.
+
+Candidates are written in batches with bulk_create, one transaction per
+batch, so memory use stays flat at a million candidates. Bulk inserts send
+no signals, so each batch does what the post_save handlers would: stage
+history, job counters and the search index. A small share of candidates
+are near-duplicates of earlier ones (same name and phone, another email),
+and the duplicate index is rebuilt once at the end.
+"""
+import random
+from datetime import timedelta
+from functools import partial
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from candidates.dedup import rebuild_duplicate_index
+from candidates.matching import invalidate_match_index
+from candidates.models import (
+    Application, Candidate, CandidateEducation, CandidateSkill, CandidateWorkExperience,
+)
+from candidates.parsing import SKILL_VOCABULARY
+from candidates.pipeline import record_stage_entries
+from candidates.search import index_candidates
+from jobs.models import Department, JobPost
+from recruiters.calendar_feed import touch_calendars
+from recruiters.models import EmailTemplate, Interview, Note
+from recruiters.scheduling import sync_bookings
+from .caching import JOB_BOARD, JOB_POSTS, touch
+
+SYNTHETIC_BATCH_SIZE = 2000
+# Share of candidates that repeat an earlier person's name and phone
+DUPLICATE_RATE = 0.01
+# Earlier people remembered for making duplicates
+MAX_PEOPLE = 10000
+FIRST_NAMES = [
+    'Ada', 'Alan', 'Amara', 'Andrei', 'Aisha', 'Bruno', 'Carmen', 'Chen', 'Daniel', 'Diego', 'Elena', 'Emeka',
+    'Fatima', 'Grace', 'Hana', 'Hiro', 'Ines', 'Ivan', 'James', 'Jin', 'Kofi', 'Lara', 'Liam', 'Maria',
+    'Mateo', 'Mei', 'Nadia', 'Noah', 'Olga', 'Omar', 'Priya', 'Rahul', 'Rosa', 'Sara', 'Sofia', 'Tariq',
+    'Tomas', 'Uma', 'Victor', 'Wei', 'Yara', 'Yusuf', 'Zoe',
+]
+LAST_NAMES = [
+    'Adeyemi', 'Almeida', 'Andersson', 'Bauer', 'Becker', 'Chandra', 'Costa', 'Dubois', 'Eriksen', 'Fischer',
+    'Garcia', 'Gupta', 'Haddad', 'Hoang', 'Ivanova', 'Jensen', 'Kaur', 'Kim', 'Kowalski', 'Lopez', 'Martin',
+    'Mensah', 'Moreau', 'Nakamura', 'Novak', 'Okafor', 'Olsen', 'Park', 'Patel', 'Petrov', 'Quinn', 'Rossi',
+    'Sato', 'Schmidt', 'Silva', 'Singh', 'Tanaka', 'Uchenna', 'Varga', 'Wang', 'Weber', 'Yilmaz', 'Zhang',
+]
+EMAIL_DOMAINS = ['example.com', 'example.org', 'example.net', 'mail.example.com']
+DEPARTMENTS = [
+    'Engineering', 'Data', 'Product', 'Design', 'Marketing', 'Sales', 'Finance', 'People', 'Operations',
+    'Support', 'Security', 'Legal', 'Research', 'Infrastructure', 'Mobile', 'Platform',
+]
+JOB_LEVELS = ['Junior', '', 'Senior', 'Staff', 'Principal', 'Lead']
+JOB_ROLES = [
+    'Backend Engineer', 'Frontend Engineer', 'Data Engineer', 'Data Scientist', 'Product Manager',
+    'Product Designer', 'Site Reliability Engineer', 'Mobile Engineer', 'QA Engineer', 'Security Engineer',
+    'Marketing Manager', 'Account Executive', 'Financial Analyst', 'Recruiter', 'Support Specialist',
+]
+LOCATIONS = ['Remote', 'London', 'Berlin', 'New York', 'Bangalore', 'Toronto', 'Singapore', 'Lisbon']
+INSTITUTIONS = [
+    'University of Lagos', 'Technical University of Munich', 'University of Toronto', 'IIT Bombay',
+    'University of Sao Paulo', 'National University of Singapore', 'University of Edinburgh', 'MIT',
+]
+DEGREES = ['BSc', 'BA', 'BEng', 'MSc', 'MBA', 'PhD']
+FIELDS_OF_STUDY = ['Computer Science', 'Mathematics', 'Physics', 'Economics', 'Design', 'Business', 'Statistics']
+COMPANIES = ['Acme', 'Globex', 'Initech', 'Umbrella', 'Hooli', 'Stark Industries', 'Wayne Enterprises', 'Vandelay']
+# Stages of applications, weighted roughly like a real funnel
+STAGE_WEIGHTS = {
+    'new': 40, 'screening': 20, 'interview': 12, 'technical': 8, 'final': 5, 'offer': 3, 'hired': 2, 'rejected': 10,
+}
+INTERVIEWED_STAGES = {'interview', 'technical', 'final', 'offer', 'hired'}
+NOTE_TEXTS = [
+    'Strong communication skills on the phone screen.',
+    'Asked about relocation support and visa sponsorship.',
+    'Salary expectations are above the posted range.',
+    'Referred by a current employee.',
+    'Available to start in a month.',
+    'Good fit for the team; follow up next week.',
+]
+EMAIL_TEMPLATES = [
+    ('application_received', 'Application received', 'Thanks for applying for {{ job.title }}.'),
+    ('interview_invitation', 'Interview invitation', 'We would like to invite you to interview for {{ job.title }}.'),
+    ('rejection', 'Your application', 'Thank you for your interest in {{ job.title }}.'),
+    ('offer', 'Job offer', 'We are delighted to offer you the {{ job.title }} role.'),
+]
+
+
+def _skills(rng, count):
+    return rng.sample(SKILL_VOCABULARY, count)
+
+
+def _date_range(rng, now, max_years):
+    start = now.date() - timedelta(days=rng.randint(180, 365 * max_years))
+    end = start + timedelta(days=rng.randint(180, 365 * 4))
+    return start, (end if end < now.date() else None)
+
+
+def _users(count):
+    users = []
+    for i in range(count):
+        user, created = User.objects.get_or_create(
+            username=f'synthetic-recruiter-{i}',
+            defaults={'first_name': FIRST_NAMES[i % len(FIRST_NAMES)], 'last_name': 'Recruiter',
+                      'email': f'recruiter{i}@example.com', 'is_staff': True},
+        )
+        if created:
+            user.set_unusable_password()
+            user.save(update_fields=['password'])
+        users.append(user)
+    return users
+
+
+def _jobs(rng, count, departments, users):
+    departments = [Department.objects.create(name=name, description=f'The {name} team') for name in departments]
+    jobs = []
+    for _ in range(count):
+        skills = _skills(rng, 6)
+        salary = rng.randrange(40000, 200000, 5000)
+        jobs.append(JobPost(
+            title=f'{rng.choice(JOB_LEVELS)} {rng.choice(JOB_ROLES)}'.strip(),
+            department=rng.choice(departments), location=rng.choice(LOCATIONS),
+            description=f'Join us to build and run {skills[0]} and {skills[1]} systems used by millions.',
+            requirements=', '.join(skills), responsibilities='Design, build, review and operate features.',
+            status=rng.choices(['published', 'draft', 'closed'], [80, 10, 10])[0],
+            created_by=rng.choice(users), salary_min=salary, salary_max=salary + rng.randrange(10000, 60000, 5000),
+        ))
+    jobs = JobPost.objects.bulk_create(jobs, batch_size=SYNTHETIC_BATCH_SIZE)
+    touch(JOB_POSTS, JOB_BOARD)
+    return jobs
+
+
+def _candidate_batch(rng, numbers, people):
+    """
+    Candidates numbered `numbers`, each a new person or, now and then, a
+    near-duplicate of someone earlier in `people` (a list of (first name,
+    last name, phone) it appends to)
+    """
+    candidates = []
+    for number in numbers:
+        if people and rng.random() < DUPLICATE_RATE:
+            first_name, last_name, phone = rng.choice(people)
+        else:
+            first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            phone = f'+1{rng.randrange(2000000000, 9999999999)}'
+            people.append((first_name, last_name, phone))
+        skills = _skills(rng, 3)
+        candidates.append(Candidate(
+            first_name=first_name, last_name=last_name,
+            email=f'{first_name}.{last_name}.{number}@{rng.choice(EMAIL_DOMAINS)}'.lower(),
+            phone=phone, resume=f'resumes/synthetic-{number}.pdf',
+            cover_letter=f'I have worked with {skills[0]}, {skills[1]} and {skills[2]} and would love to join.',
+        ))
+    return candidates
+
+
+def _profiles(rng, candidates, now):
+    skills, education, experience = [], [], []
+    for candidate in candidates:
+        skills += [
+            CandidateSkill(candidate_id=candidate.id, skill=skill, years_experience=rng.randint(0, 12))
+            for skill in _skills(rng, rng.randint(2, 8))
+        ]
+        for _ in range(rng.randint(1, 2)):
+            from_date, to_date = _date_range(rng, now, 15)
+            education.append(CandidateEducation(
+                candidate_id=candidate.id, institution=rng.choice(INSTITUTIONS), degree=rng.choice(DEGREES),
+                field_of_study=rng.choice(FIELDS_OF_STUDY), from_date=from_date, to_date=to_date,
+            ))
+        for _ in range(rng.randint(0, 4)):
+            from_date, to_date = _date_range(rng, now, 12)
+            experience.append(CandidateWorkExperience(
+                candidate_id=candidate.id, company=rng.choice(COMPANIES),
+                position=f'{rng.choice(JOB_LEVELS)} {rng.choice(JOB_ROLES)}'.strip(),
+                from_date=from_date, to_date=to_date, description=', '.join(_skills(rng, 3)),
+            ))
+    CandidateSkill.objects.bulk_create(skills, batch_size=SYNTHETIC_BATCH_SIZE)
+    CandidateEducation.objects.bulk_create(education, batch_size=SYNTHETIC_BATCH_SIZE)
+    CandidateWorkExperience.objects.bulk_create(experience, batch_size=SYNTHETIC_BATCH_SIZE)
+    return len(skills) + len(education) + len(experience)
+
+
+def _applications(rng, candidates, jobs, now):
+    stages, weights = list(STAGE_WEIGHTS), list(STAGE_WEIGHTS.values())
+    applications = []
+    for candidate in candidates:
+        # Candidate.created_at is always the insert time; applications spread over two years
+        applied_at = now - timedelta(days=rng.randint(0, 730), seconds=rng.randint(0, 86400))
+        for job in rng.sample(jobs, min(rng.choices([1, 2, 3], [70, 20, 10])[0], len(jobs))):
+            created_at = min(applied_at + timedelta(hours=rng.randint(0, 72)), now)
+            applications.append(Application(
+                candidate_id=candidate.id, job_id=job.id, stage=rng.choices(stages, weights)[0],
+                created_at=created_at, stage_changed_at=min(created_at + timedelta(days=rng.randint(0, 60)), now),
+            ))
+    applications = Application.objects.bulk_create(applications, batch_size=SYNTHETIC_BATCH_SIZE)
+    record_stage_entries(applications)
+    return applications
+
+
+def _notes_and_interviews(rng, candidates, applications, users, now):
+    notes = [
+        Note(candidate_id=candidate.id, author=rng.choice(users), content=rng.choice(NOTE_TEXTS))
+        for candidate in candidates
+        for _ in range(rng.choices([0, 1, 2], [70, 20, 10])[0])
+    ]
+    Note.objects.bulk_create(notes, batch_size=SYNTHETIC_BATCH_SIZE)
+
+    planned = []
+    for application in applications:
+        if application.stage not in INTERVIEWED_STAGES:
+            continue
+        upcoming = application.stage == 'interview' and rng.random() < 0.5
+        if upcoming:
+            scheduled_at = now + timedelta(days=rng.randint(1, 30), hours=rng.randint(0, 8))
+        else:
+            scheduled_at = application.stage_changed_at - timedelta(days=rng.randint(1, 14))
+        interview = Interview(
+            candidate_id=application.candidate_id, job_id=application.job_id,
+            scheduled_at=scheduled_at.replace(minute=0, second=0, microsecond=0),
+            duration=rng.choice([30, 45, 60]), location=rng.choice(['Video call', 'Office']),
+            status='scheduled' if upcoming else 'completed',
+        )
+        planned.append((interview, rng.sample(users, min(rng.randint(1, 2), len(users)))))
+    interviews = Interview.objects.bulk_create([interview for interview, _ in planned], batch_size=SYNTHETIC_BATCH_SIZE)
+    Interview.interviewers.through.objects.bulk_create([
+        Interview.interviewers.through(interview_id=interview.id, user_id=user.id)
+        for interview, (_, panel) in zip(interviews, planned)
+        for user in panel
+    ], batch_size=SYNTHETIC_BATCH_SIZE)
+    sync_bookings([interview for interview in interviews if interview.status == 'scheduled'])
+    return len(notes), len(interviews)
+
+
+def generate(jobs=1000, candidates=1000000, departments=len(DEPARTMENTS), users=20, seed=0,
+             batch_size=SYNTHETIC_BATCH_SIZE, rebuild_duplicates=True, progress=None):
+    """
+    Add synthetic data to the database; see the module docstring. Calls
+    progress(step, count) as it goes and returns the number of rows created
+    per kind.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    created = dict.fromkeys(
+        ['jobs', 'candidates', 'profile_rows', 'applications', 'notes', 'interviews', 'duplicates'], 0,
+    )
+    with transaction.atomic():
+        recruiters = _users(max(users, 1))
+        for kind, subject, body in EMAIL_TEMPLATES:
+            EmailTemplate.objects.get_or_create(
+                name=subject, type=kind, defaults={'subject': subject, 'body': body, 'created_by': recruiters[0]},
+            )
+        names = [DEPARTMENTS[i % len(DEPARTMENTS)] for i in range(max(departments, 1))]
+        job_posts = _jobs(rng, jobs, names, recruiters)
+    created['jobs'] = len(job_posts)
+    if progress is not None:
+        progress('jobs', created['jobs'])
+
+    # Numbers keep the emails of repeated runs apart
+    first_number = (Candidate.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+    people = []
+    for start in range(0, candidates if job_posts else 0, batch_size):
+        numbers = range(first_number + start, first_number + min(start + batch_size, candidates))
+        with transaction.atomic():
+            batch = Candidate.objects.bulk_create(_candidate_batch(rng, numbers, people))
+            created['profile_rows'] += _profiles(rng, batch, now)
+            applications = _applications(rng, batch, job_posts, now)
+            notes, interviews = _notes_and_interviews(rng, batch, applications, recruiters, now)
+            transaction.on_commit(partial(index_candidates, [candidate.id for candidate in batch]))
+        del people[:max(len(people) - MAX_PEOPLE, 0)]
+        created['candidates'] += len(batch)
+        created['applications'] += len(applications)
+        created['notes'] += notes
+        created['interviews'] += interviews
+        if progress is not None:
+            progress('candidates', created['candidates'])
+
+    invalidate_match_index()
+    touch_calendars([user.id for user in recruiters])
+    if rebuild_duplicates and created['candidates']:
+        created['duplicates'] = rebuild_duplicate_index(progress=progress)
+    return created
@@ -17,13 +17,17 @@ Including another URLconf
 # ats_project/urls.py
 from django.contrib import admin
 from django.urls import path, include
-from django.conf import settings
-from django.conf.urls.static import static
+
+from .health import health
+from .profiling import profiling_metrics, profiling_summary
 
 urlpatterns = [
+    path('healthz/', health, name='health'),
+    path('profiling/', profiling_summary, name='profiling'),
+    path('profiling/metrics', profiling_metrics, name='profiling_metrics'),
     path('admin/', admin.site.urls),
     path('', include('jobs.urls')),
     path('candidates/', include('candidates.urls')),
     path('recruiters/', include('recruiters.urls')),
     path('accounts/', include('django.contrib.auth.urls')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+]
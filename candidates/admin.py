@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Candidate, CandidateSkill, CandidateEducation, CandidateWorkExperience
+from .models import (
+    Application, Candidate, CandidateSkill, CandidateEducation, CandidateWorkExperience, DuplicateCandidate, ResumeParseJob,
+    StageTransition,
+)
 
 class CandidateSkillInline(admin.TabularInline):
     model = CandidateSkill
@@ -13,19 +16,25 @@ class CandidateWorkExperienceInline(admin.TabularInline):
     model = CandidateWorkExperience
     extra = 1
 
+class ApplicationInline(admin.TabularInline):
+    model = Application
+    extra = 0
+    fields = ('job', 'stage', 'created_at')
+    readonly_fields = ('stage', 'created_at')
+
 @admin.register(Candidate)
 class CandidateAdmin(admin.ModelAdmin):
-    list_display = ('first_name', 'last_name', 'email', 'job', 'stage', 'created_at')
-    list_filter = ('stage', 'job', 'created_at')
-    search_fields = ('first_name', 'last_name', 'email', 'job__title')
-    inlines = [CandidateSkillInline, CandidateEducationInline, CandidateWorkExperienceInline]
+    list_display = ('first_name', 'last_name', 'email', 'created_at')
+    list_filter = ('created_at',)
+    search_fields = ('first_name', 'last_name', 'email')
+    inlines = [ApplicationInline, CandidateSkillInline, CandidateEducationInline, CandidateWorkExperienceInline]
     readonly_fields = ('created_at', 'updated_at')
     fieldsets = (
         ('Personal Information', {
             'fields': ('first_name', 'last_name', 'email', 'phone')
         }),
         ('Application Details', {
-            'fields': ('job', 'stage', 'resume', 'cover_letter')
+            'fields': ('resume', 'cover_letter')
         }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
@@ -33,6 +42,21 @@ class CandidateAdmin(admin.ModelAdmin):
         }),
     )
 
+@admin.register(Application)
+class ApplicationAdmin(admin.ModelAdmin):
+    list_display = ('candidate', 'job', 'stage', 'created_at')
+    list_filter = ('stage', 'job', 'created_at')
+    search_fields = ('candidate__first_name', 'candidate__last_name', 'candidate__email', 'job__title')
+    raw_id_fields = ('candidate', 'job')
+    # Stages change through candidates.pipeline so the transition log stays complete
+    readonly_fields = ('stage', 'stage_changed_at', 'created_at', 'updated_at')
+
+    def get_readonly_fields(self, request, obj=None):
+        # Moving an application to another job would skew both jobs' counters
+        if obj is not None:
+            return self.readonly_fields + ('job',)
+        return self.readonly_fields
+
 @admin.register(CandidateSkill)
 class CandidateSkillAdmin(admin.ModelAdmin):
     list_display = ('candidate', 'skill', 'years_experience')
@@ -48,4 +72,31 @@ class CandidateEducationAdmin(admin.ModelAdmin):
 class CandidateWorkExperienceAdmin(admin.ModelAdmin):
     list_display = ('candidate', 'position', 'company', 'from_date', 'to_date')
     search_fields = ('candidate__first_name', 'candidate__last_name', 'company', 'position')
-    list_filter = ('company',)
\ No newline at end of file
+    list_filter = ('company',)
+
+@admin.register(ResumeParseJob)
+class ResumeParseJobAdmin(admin.ModelAdmin):
+    list_display = ('candidate', 'status', 'attempts', 'created_at', 'started_at', 'finished_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('candidate__first_name', 'candidate__last_name', 'candidate__email')
+    raw_id_fields = ('candidate',)
+    readonly_fields = ('created_at', 'started_at', 'finished_at')
+
+@admin.register(StageTransition)
+class StageTransitionAdmin(admin.ModelAdmin):
+    list_display = ('candidate', 'job', 'from_stage', 'to_stage', 'time_in_stage', 'changed_by', 'created_at')
+    list_filter = ('to_stage', 'created_at')
+    raw_id_fields = ('candidate', 'application', 'job', 'changed_by')
+
+    # The log is append-only; rollups are derived from it
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(DuplicateCandidate)
+class DuplicateCandidateAdmin(admin.ModelAdmin):
+    list_display = ('candidate', 'other', 'score', 'reasons', 'status', 'created_at')
+    list_filter = ('status',)
+    raw_id_fields = ('candidate', 'other')
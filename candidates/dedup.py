@@ -0,0 +1,410 @@
+# candidates/dedup.py
+"""
+Duplicate candidate detection and merging.
+
+Every candidate gets a handful of blocking keys in CandidateBlockingKey: the
+normalised email, the last digits of the phone number, a Soundex code of the
+name and the resume content hash. Only candidates that share at least one key
+are compared, so checking a new candidate is a single indexed lookup rather
+than a comparison against everyone. Compared pairs are scored from the
+evidence they share, and likely duplicates are stored in DuplicateCandidate
+for a recruiter to merge or dismiss.
+
+Keys are refreshed when a candidate is created or its identifying fields
+change (see candidates.signals); rebuild_duplicate_index recomputes them and
+re-scans every block after a bulk load.
+"""
+import unicodedata
+from itertools import combinations
+
+from django.db import transaction
+from django.db.models import Q
+
+from ats_project.caching import candidate_stamp, job_stamp, touch
+
+from .models import (
+    Application, Candidate, CandidateBlockingKey, CandidateEducation, CandidateSkill, CandidateWorkExperience,
+    DuplicateCandidate, ResumeParseJob, StageTransition,
+)
+
+# Candidate fields that feed the blocking keys and the scores
+IDENTITY_FIELDS = ('first_name', 'last_name', 'email', 'phone', 'resume_hash')
+
+PHONE_SUFFIX_DIGITS = 7
+PHONE_MATCH_DIGITS = 10
+# Email providers that ignore dots in the local part
+DOTLESS_EMAIL_DOMAINS = {'gmail.com': 'gmail.com', 'googlemail.com': 'gmail.com'}
+
+# Evidence weights, combined as 1 - prod(1 - weight). A name alone is never
+# enough; a name plus a phone number is.
+EMAIL_WEIGHT = 0.95
+RESUME_WEIGHT = 0.9
+PHONE_WEIGHT = 0.6
+NAME_WEIGHT = 0.4
+DUPLICATE_THRESHOLD = 0.65
+NAME_SIMILARITY_THRESHOLD = 0.85
+
+# Blocks larger than this (very common names) are not compared pairwise in
+# a full scan; stronger keys still catch duplicates inside them
+MAX_BLOCK_SIZE = 200
+SCAN_CHUNK_SIZE = 10000
+
+SOUNDEX_CODES = {
+    letter: digit
+    for letters, digit in (('bfpv', '1'), ('cgjkqsxz', '2'), ('dt', '3'), ('l', '4'), ('mn', '5'), ('r', '6'))
+    for letter in letters
+}
+
+
+def fold_text(value):
+    """
+    Lower-case ASCII letters and spaces only, with accents removed
+    """
+    value = unicodedata.normalize('NFKD', value or '').lower()
+    return ' '.join(''.join(c if 'a' <= c <= 'z' else ' ' for c in value).split())
+
+
+def normalize_email(email):
+    local, _, domain = (email or '').strip().lower().rpartition('@')
+    if not local:
+        return ''
+    local = local.split('+', 1)[0]
+    if domain in DOTLESS_EMAIL_DOMAINS:
+        local = local.replace('.', '')
+        domain = DOTLESS_EMAIL_DOMAINS[domain]
+    return f'{local}@{domain}'
+
+
+def normalize_phone(phone):
+    """
+    The last PHONE_MATCH_DIGITS digits, which drops country and trunk
+    prefixes, or '' when there are too few digits to mean anything
+    """
+    digits = ''.join(c for c in phone or '' if c.isdigit())
+    if len(digits) < PHONE_SUFFIX_DIGITS:
+        return ''
+    return digits[-PHONE_MATCH_DIGITS:]
+
+
+def soundex(word):
+    letters = fold_text(word).replace(' ', '')
+    if not letters:
+        return ''
+    code = letters[0].upper()
+    previous = SOUNDEX_CODES.get(letters[0], '')
+    for letter in letters[1:]:
+        digit = SOUNDEX_CODES.get(letter, '')
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        if letter not in 'hw':
+            previous = digit
+    return code.ljust(4, '0')
+
+
+def name_key(first_name, last_name):
+    last = soundex(last_name)
+    first = soundex(first_name)
+    return f'{last}:{first}' if last and first else ''
+
+
+def blocking_keys(candidate):
+    """
+    Return [(kind, key)] for a candidate given as a dict of IDENTITY_FIELDS
+    """
+    keys = []
+    email = normalize_email(candidate['email'])
+    if email:
+        keys.append(('email', email))
+    phone = normalize_phone(candidate['phone'])
+    if phone:
+        keys.append(('phone', phone[-PHONE_SUFFIX_DIGITS:]))
+    name = name_key(candidate['first_name'], candidate['last_name'])
+    if name:
+        keys.append(('name', name))
+    if candidate['resume_hash']:
+        keys.append(('resume', candidate['resume_hash']))
+    return keys
+
+
+def jaro_winkler(a, b):
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    window = max(max(len(a), len(b)) // 2 - 1, 0)
+    a_matched = [False] * len(a)
+    b_matched = [False] * len(b)
+    matches = 0
+    for i, char in enumerate(a):
+        for j in range(max(0, i - window), min(len(b), i + window + 1)):
+            if not b_matched[j] and b[j] == char:
+                a_matched[i] = b_matched[j] = True
+                matches += 1
+                break
+    if not matches:
+        return 0.0
+    a_chars = [char for char, matched in zip(a, a_matched) if matched]
+    b_chars = [char for char, matched in zip(b, b_matched) if matched]
+    transpositions = sum(x != y for x, y in zip(a_chars, b_chars)) / 2
+    jaro = (matches / len(a) + matches / len(b) + (matches - transpositions) / matches) / 3
+    prefix = 0
+    for x, y in zip(a[:4], b[:4]):
+        if x != y:
+            break
+        prefix += 1
+    return jaro + prefix * 0.1 * (1 - jaro)
+
+
+def score_pair(a, b):
+    """
+    Return (score between 0 and 1, [reasons]) for two candidates given as
+    dicts of IDENTITY_FIELDS
+    """
+    evidence = []
+    if normalize_email(a['email']) and normalize_email(a['email']) == normalize_email(b['email']):
+        evidence.append(('email', EMAIL_WEIGHT))
+    if a['resume_hash'] and a['resume_hash'] == b['resume_hash']:
+        evidence.append(('resume', RESUME_WEIGHT))
+    if normalize_phone(a['phone']) and normalize_phone(a['phone']) == normalize_phone(b['phone']):
+        evidence.append(('phone', PHONE_WEIGHT))
+    similarity = jaro_winkler(
+        fold_text(f"{a['first_name']} {a['last_name']}"), fold_text(f"{b['first_name']} {b['last_name']}"),
+    )
+    if similarity >= NAME_SIMILARITY_THRESHOLD:
+        evidence.append(('name', NAME_WEIGHT * similarity))
+    remaining = 1.0
+    for _, weight in evidence:
+        remaining *= 1 - weight
+    return 1 - remaining, [reason for reason, _ in evidence]
+
+
+def _identities(candidate_ids):
+    return {
+        row['id']: row for row in Candidate.objects.filter(id__in=candidate_ids).values('id', *IDENTITY_FIELDS)
+    }
+
+
+def _save_matches(pairs, identities, ignore_conflicts=False):
+    """
+    Score candidate id pairs and store the likely duplicates, updating the
+    score of stored pairs or, with `ignore_conflicts`, leaving them as they
+    are. Pairs a recruiter has dismissed keep their status.
+    """
+    matches = []
+    for first, second in pairs:
+        if first not in identities or second not in identities:
+            continue
+        score, reasons = score_pair(identities[first], identities[second])
+        if score >= DUPLICATE_THRESHOLD:
+            matches.append(DuplicateCandidate(
+                candidate_id=first, other_id=second, score=score, reasons=', '.join(reasons),
+            ))
+    if ignore_conflicts:
+        DuplicateCandidate.objects.bulk_create(matches, batch_size=1000, ignore_conflicts=True)
+    else:
+        DuplicateCandidate.objects.bulk_create(
+            matches, batch_size=1000, update_conflicts=True,
+            unique_fields=['candidate', 'other'], update_fields=['score', 'reasons'],
+        )
+    return len(matches)
+
+
+def refresh_duplicates(candidate_ids, created=False):
+    """
+    Recompute the blocking keys of the given candidates and record any likely
+    duplicates among the candidates sharing a key with them, with a fixed
+    number of queries. `created` skips clearing the keys and matches that
+    newly created candidates cannot have yet.
+    """
+    candidate_ids = list(candidate_ids)
+    if not candidate_ids:
+        return 0
+    identities = _identities(candidate_ids)
+    keys = [
+        CandidateBlockingKey(candidate_id=candidate_id, kind=kind, key=key)
+        for candidate_id, identity in identities.items()
+        for kind, key in blocking_keys(identity)
+    ]
+    if not created:
+        CandidateBlockingKey.objects.filter(candidate_id__in=candidate_ids).delete()
+        # Open matches are found again below if they still hold
+        DuplicateCandidate.objects.filter(status='open').filter(
+            Q(candidate_id__in=candidate_ids) | Q(other_id__in=candidate_ids),
+        ).delete()
+    CandidateBlockingKey.objects.bulk_create(keys, batch_size=2000)
+    if not keys:
+        return 0
+
+    by_kind = {}
+    for key in keys:
+        by_kind.setdefault(key.kind, set()).add(key.key)
+    shared = CandidateBlockingKey.objects.none()
+    for kind, values in by_kind.items():
+        shared |= CandidateBlockingKey.objects.filter(kind=kind, key__in=values)
+    blocks = {}
+    for candidate_id, kind, key in shared.values_list('candidate_id', 'kind', 'key'):
+        blocks.setdefault((kind, key), set()).add(candidate_id)
+
+    pairs = set()
+    for key in keys:
+        for other_id in blocks.get((key.kind, key.key), ()):
+            if other_id != key.candidate_id:
+                pairs.add((min(key.candidate_id, other_id), max(key.candidate_id, other_id)))
+    if not pairs:
+        return 0
+    identities.update(_identities({candidate_id for pair in pairs for candidate_id in pair} - set(identities)))
+    return _save_matches(pairs, identities)
+
+
+def refresh_duplicates_on_commit(candidate_ids, created=False):
+    candidate_ids = list(candidate_ids)
+    transaction.on_commit(lambda: refresh_duplicates(candidate_ids, created))
+
+
+def rebuild_duplicate_index(chunk_size=SCAN_CHUNK_SIZE, progress=None):
+    """
+    Recompute every blocking key, then compare the candidates within each
+    block. Returns the number of likely duplicate pairs found.
+    """
+    CandidateBlockingKey.objects.all().delete()
+    DuplicateCandidate.objects.filter(status='open').delete()
+    rows = Candidate.objects.order_by('id').values('id', *IDENTITY_FIELDS).iterator(chunk_size=chunk_size)
+    batch = []
+    indexed = 0
+    for row in rows:
+        batch.extend(
+            CandidateBlockingKey(candidate_id=row['id'], kind=kind, key=key) for kind, key in blocking_keys(row)
+        )
+        indexed += 1
+        if len(batch) >= chunk_size:
+            CandidateBlockingKey.objects.bulk_create(batch, batch_size=chunk_size)
+            batch = []
+            if progress is not None:
+                progress('indexed', indexed)
+    CandidateBlockingKey.objects.bulk_create(batch, batch_size=chunk_size)
+
+    # Walk the keys in index order; each run of equal keys is one block.
+    # Pairs are scored and written a chunk at a time, so memory stays flat
+    # however many blocks there are. A pair sharing several keys is seen
+    # once per block, and its repeats are dropped on insert.
+    pairs = set()
+    block = []
+    current = None
+    compared = 0
+    for kind, key, candidate_id in CandidateBlockingKey.objects.order_by('kind', 'key').values_list(
+        'kind', 'key', 'candidate_id',
+    ).iterator(chunk_size=chunk_size):
+        if (kind, key) != current:
+            _add_block_pairs(block, pairs)
+            block = []
+            current = (kind, key)
+            if len(pairs) >= chunk_size:
+                compared += _save_rebuilt_matches(pairs)
+                pairs = set()
+                if progress is not None:
+                    progress('compared', compared)
+        block.append(candidate_id)
+    _add_block_pairs(block, pairs)
+    compared += _save_rebuilt_matches(pairs)
+    if progress is not None:
+        progress('compared', compared)
+    return DuplicateCandidate.objects.filter(status='open').count()
+
+
+def _save_rebuilt_matches(pairs):
+    """
+    Score a chunk of pairs and insert the likely duplicates, leaving pairs
+    already stored (by an earlier chunk, or dismissed) alone. Returns the
+    number of pairs compared.
+    """
+    if pairs:
+        _save_matches(
+            pairs, _identities({candidate_id for pair in pairs for candidate_id in pair}), ignore_conflicts=True,
+        )
+    return len(pairs)
+
+
+def _add_block_pairs(block, pairs):
+    if 1 < len(block) <= MAX_BLOCK_SIZE:
+        pairs.update(combinations(sorted(block), 2))
+
+
+def find_duplicates_of(candidate):
+    """
+    Return open DuplicateCandidate rows involving a candidate, with the other
+    candidate of each pair as `.match`
+    """
+    matches = []
+    for duplicate in DuplicateCandidate.objects.filter(
+        status='open',
+    ).filter(
+        Q(candidate=candidate) | Q(other=candidate),
+    ).select_related('candidate', 'other').order_by('-score'):
+        duplicate.match = duplicate.other if duplicate.candidate_id == candidate.id else duplicate.candidate
+        matches.append(duplicate)
+    return matches
+
+
+def merge_candidates(keep, duplicate, user):
+    """
+    Move everything attached to `duplicate` onto `keep` and delete
+    `duplicate`. Skills `keep` already has are dropped, blank profile fields
+    on `keep` are filled in, and a note records the duplicate's
+    applications. Applications to jobs `keep` has also applied for are
+    dropped; their stage history stays in the log under `keep`.
+    """
+    # Imported here because recruiters.models depends on this app's models
+    from recruiters.calendar_feed import touch_calendars
+    from recruiters.models import Interview, Note, OutboundEmail
+    if keep.pk == duplicate.pk:
+        raise ValueError("A candidate cannot be merged into itself")
+    with transaction.atomic():
+        keep = Candidate.objects.select_for_update().get(pk=keep.pk)
+        duplicate = Candidate.objects.select_for_update().get(pk=duplicate.pk)
+        applications = list(duplicate.applications.select_related('job').order_by('created_at'))
+
+        # Moved interviews show another candidate in the interviewers' feeds
+        touch_calendars(list(Interview.interviewers.through.objects.filter(
+            interview__candidate=duplicate,
+        ).values_list('user_id', flat=True)))
+        existing_skills = {skill.lower() for skill in keep.skills.values_list('skill', flat=True)}
+        moved_skills = [
+            skill_id for skill_id, skill in duplicate.skills.values_list('id', 'skill')
+            if skill.lower() not in existing_skills
+        ]
+        CandidateSkill.objects.filter(id__in=moved_skills).update(candidate=keep)
+        Application.objects.filter(candidate=duplicate).exclude(
+            job_id__in=list(keep.applications.values_list('job_id', flat=True)),
+        ).update(candidate=keep)
+        for model in (CandidateEducation, CandidateWorkExperience, Note, Interview, StageTransition, OutboundEmail):
+            model.objects.filter(candidate=duplicate).update(candidate=keep)
+        ResumeParseJob.objects.filter(candidate=duplicate).delete()
+        # The bulk updates bypass signals: `keep` gained rows and the jobs of
+        # the moved applications list it under the duplicate's name
+        touch(candidate_stamp(keep.pk), *{job_stamp(application.job_id) for application in applications})
+
+        changed = []
+        for field in ('phone', 'cover_letter'):
+            if not getattr(keep, field) and getattr(duplicate, field):
+                setattr(keep, field, getattr(duplicate, field))
+                changed.append(field)
+        if not keep.resume and duplicate.resume:
+            keep.resume, keep.resume_hash = duplicate.resume, duplicate.resume_hash
+            changed += ['resume', 'resume_hash']
+        if changed:
+            keep.save(update_fields=changed + ['updated_at'])
+
+        applied = ', '.join(
+            f"{application.job.title} ({application.get_stage_display()}) on {application.created_at:%Y-%m-%d}"
+            for application in applications
+        )
+        Note.objects.create(candidate=keep, author=user, content=(
+            f"Merged duplicate profile {duplicate.first_name} {duplicate.last_name} <{duplicate.email}>"
+            + (f", who applied for {applied}." if applied else ".")
+        ))
+        # Signals reindex `keep` for the note, re-check it for duplicates if
+        # its contact details changed and drop the duplicate from the indexes
+        duplicate.delete()
+    return keep
@@ -0,0 +1,140 @@
+# candidates/downloads.py
+"""
+Serving stored resumes.
+
+send_stored_file() answers a GET or HEAD for a file in default storage with
+an ETag, honouring If-None-Match, and a single byte range ("Range:
+bytes=a-b", "bytes=a-" or "bytes=-n", guarded by If-Range), which is what
+PDF viewers ask for when they load a large document page by page. Requests
+for several ranges get the whole file, which HTTP allows.
+
+By default the bytes are streamed from Python in blocks. With
+RESUME_SENDFILE set to 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache
+mod_xsendfile, lighttpd), the response only carries headers naming the
+file, and the proxy sends the bytes and handles ranges itself, so no Python
+worker is held while a large file downloads. For nginx, map
+RESUME_SENDFILE_PREFIX to MEDIA_ROOT in an internal location:
+
+    location /protected-media/ {
+        internal;
+        alias /path/to/media/;
+    }
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header, http_date, quote_etag
+
+BLOCK_SIZE = 64 * 1024
+SENDFILE_HEADERS = {
+    'x-accel-redirect': 'X-Accel-Redirect',
+    'x-sendfile': 'X-Sendfile',
+}
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def parse_range(header, size):
+    """
+    The (first, last) byte positions of a single-range Range header, None
+    to send the whole file, or False if the range is unsatisfiable
+    """
+    match = RANGE.match(header.replace(' ', ''))
+    if not match or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if not first:
+        # The last n bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    first = int(first)
+    last = min(int(last), size - 1) if last else size - 1
+    if first >= size:
+        return False
+    if first > last:
+        return None
+    return first, last
+
+
+def _read(path, first, length):
+    with open(path, 'rb') as stored:
+        stored.seek(first)
+        while length > 0:
+            block = stored.read(min(BLOCK_SIZE, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+
+
+def send_stored_file(request, name, etag=None, filename=None):
+    """
+    Serve `name` from default storage inline, as `filename` if given.
+    `etag` should change whenever the content does, such as a content
+    hash; by default it is derived from the file's size and modification
+    time.
+    """
+    try:
+        path = default_storage.path(name)
+        stat = os.stat(path)
+    except (OSError, ValueError):
+        raise Http404("The file is missing")
+    etag = quote_etag(etag or f'{stat.st_mtime_ns:x}-{stat.st_size:x}')
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        response = _file_response(request, name, path, stat.st_size, etag)
+    response.headers['ETag'] = etag
+    response.headers['Last-Modified'] = http_date(stat.st_mtime)
+    response.headers['Accept-Ranges'] = 'bytes'
+    # Only for the logged-in user, and checked with the ETag on every use
+    patch_cache_control(response, private=True, no_cache=True)
+    if response.status_code in (200, 206):
+        content_type, encoding = mimetypes.guess_type(name)
+        response.headers['Content-Type'] = content_type or 'application/octet-stream'
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Content-Disposition'] = content_disposition_header(
+            False, filename or os.path.basename(name),
+        )
+    return response
+
+
+def _file_response(request, name, path, size, etag):
+    mode = getattr(settings, 'RESUME_SENDFILE', '')
+    if mode in SENDFILE_HEADERS:
+        if mode == 'x-sendfile':
+            location = path
+        else:
+            prefix = getattr(settings, 'RESUME_SENDFILE_PREFIX', '/protected-media/')
+            location = quote(prefix.rstrip('/') + '/' + name.replace(os.sep, '/'))
+        response = HttpResponse()
+        response.headers[SENDFILE_HEADERS[mode]] = location
+        # The proxy fills in the body and answers ranges
+        return response
+
+    byte_range = None
+    if 'Range' in request.headers and request.headers.get('If-Range', etag) == etag:
+        byte_range = parse_range(request.headers['Range'], size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response.headers['Content-Range'] = f'bytes */{size}'
+        return response
+
+    first, last = byte_range or (0, size - 1)
+    length = last - first + 1 if size else 0
+    if request.method == 'HEAD':
+        response = HttpResponse(status=206 if byte_range else 200)
+    else:
+        response = StreamingHttpResponse(_read(path, first, length), status=206 if byte_range else 200)
+    if byte_range:
+        response.headers['Content-Range'] = f'bytes {first}-{last}/{size}'
+    response.headers['Content-Length'] = str(length)
+    return response
@@ -0,0 +1,249 @@
+# candidates/exporting.py
+"""
+Streaming CSV, JSON Lines and Parquet exports.
+
+Rows are produced from a queryset iterated server-side with
+.iterator(chunk_size=...), their related rows are prefetched with one query
+per relation and chunk, and they are encoded and sent one chunk at a time
+through a StreamingHttpResponse. Memory use therefore depends on the chunk
+size rather than on the number of rows exported, and the first bytes leave
+as soon as the first chunk has been read.
+
+Each export is described by a list of (column, type) pairs. The type is one
+of 'int', 'string', 'date' and 'timestamp', or a list of such pairs for a
+column holding a list of records (skills, notes, ...). In CSV those nested
+columns are written as JSON arrays.
+"""
+import csv
+import io
+import json
+from datetime import date, datetime
+from itertools import islice
+
+from django.http import StreamingHttpResponse
+
+from .models import (
+    Application, Candidate, CandidateEducation, CandidateSkill, CandidateWorkExperience,
+)
+
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+CANDIDATE_EXPORT_COLUMNS = [
+    ('id', 'int'),
+    ('first_name', 'string'),
+    ('last_name', 'string'),
+    ('email', 'string'),
+    ('phone', 'string'),
+    ('resume', 'string'),
+    ('cover_letter', 'string'),
+    ('created_at', 'timestamp'),
+    ('updated_at', 'timestamp'),
+    ('applications', [
+        ('job_id', 'int'), ('job', 'string'), ('stage', 'string'), ('created_at', 'timestamp'),
+    ]),
+    ('skills', [('skill', 'string'), ('years_experience', 'int')]),
+    ('education', [
+        ('institution', 'string'), ('degree', 'string'), ('field_of_study', 'string'),
+        ('from_date', 'date'), ('to_date', 'date'),
+    ]),
+    ('experience', [
+        ('company', 'string'), ('position', 'string'), ('from_date', 'date'), ('to_date', 'date'),
+        ('description', 'string'),
+    ]),
+    ('notes', [('author', 'string'), ('created_at', 'timestamp'), ('content', 'string')]),
+]
+
+
+class ExportFormatError(Exception):
+    """Raised for an unknown export format or a missing optional dependency."""
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serialisable")
+
+
+def chunked(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+def stream_csv(rows, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    nested = {name for name, kind in columns if isinstance(kind, list)}
+    writer.writerow([name for name, _ in columns])
+    for chunk in chunked(rows, EXPORT_CHUNK_SIZE):
+        for row in chunk:
+            writer.writerow([
+                json.dumps(row[name], default=_json_default) if name in nested
+                else row[name].isoformat() if isinstance(row[name], (date, datetime))
+                else row[name]
+                for name, _ in columns
+            ])
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def stream_jsonl(rows, columns):
+    for chunk in chunked(rows, EXPORT_CHUNK_SIZE):
+        yield ''.join(json.dumps(row, default=_json_default) + '\n' for row in chunk).encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+    Write-only file that hands back whatever was written since the last drain
+    """
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _arrow_type(pa, kind):
+    if isinstance(kind, list):
+        return pa.list_(pa.struct([(name, _arrow_type(pa, sub)) for name, sub in kind]))
+    return {
+        'int': pa.int64(),
+        'string': pa.string(),
+        'date': pa.date32(),
+        'timestamp': pa.timestamp('us', tz='UTC'),
+    }[kind]
+
+
+def stream_parquet(rows, columns):
+    """
+    Encode each chunk of rows as a Parquet row group and send it as soon as
+    it is written; the file footer follows the last group
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as exc:
+        raise ExportFormatError("Parquet export requires the 'pyarrow' package") from exc
+    schema = pa.schema([(name, _arrow_type(pa, kind)) for name, kind in columns])
+
+    def generate():
+        sink = _ChunkSink()
+        writer = pq.ParquetWriter(sink, schema, compression='snappy')
+        for chunk in chunked(rows, EXPORT_CHUNK_SIZE):
+            writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+            yield sink.drain()
+        writer.close()
+        yield sink.drain()
+
+    return generate()
+
+
+STREAMERS = {'csv': stream_csv, 'jsonl': stream_jsonl, 'parquet': stream_parquet}
+
+
+def export_response(rows, columns, fmt, filename):
+    """
+    Return a StreamingHttpResponse sending `rows` in format `fmt` as an
+    attachment named `filename`.<fmt>
+    """
+    if fmt not in STREAMERS:
+        raise ExportFormatError(f"Unknown export format: {fmt}")
+    response = StreamingHttpResponse(
+        STREAMERS[fmt](rows, columns), content_type=EXPORT_FORMATS[fmt],
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    # Ask proxies such as nginx not to buffer the whole export before sending
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def prefetch_grouped(chunk, queryset, key, fields):
+    """
+    Fetch the rows of `queryset` related to a chunk of exported rows with one
+    query and return them as {key value: [{field: value}]}. Working on plain
+    values instead of model instances keeps large exports fast.
+    """
+    grouped = {}
+    ids = [row['id'] for row in chunk]
+    for values in queryset.filter(**{f'{key}__in': ids}).values_list(key, *fields.values()):
+        grouped.setdefault(values[0], []).append(dict(zip(fields, values[1:])))
+    return grouped
+
+
+def candidate_export_queryset(queryset=None):
+    if queryset is None:
+        queryset = Candidate.objects.all()
+    return queryset.order_by('id')
+
+
+def candidate_rows(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield one dict per candidate, matching CANDIDATE_EXPORT_COLUMNS. The
+    candidates are read with a server-side iterator and their related rows
+    are prefetched once per chunk.
+    """
+    # Imported here because recruiters.models depends on this app's models
+    from recruiters.models import Note
+    candidates = queryset.values(
+        'id', 'first_name', 'last_name', 'email', 'phone', 'resume', 'cover_letter',
+        'created_at', 'updated_at',
+    )
+    for chunk in chunked(candidates.iterator(chunk_size=chunk_size), chunk_size):
+        applications = prefetch_grouped(
+            chunk, Application.objects.order_by('created_at', 'id'), 'candidate_id', {
+                'job_id': 'job_id', 'job': 'job__title', 'stage': 'stage',
+                'created_at': 'created_at',
+            },
+        )
+        skills = prefetch_grouped(
+            chunk, CandidateSkill.objects.order_by('id'), 'candidate_id', {
+                'skill': 'skill', 'years_experience': 'years_experience',
+            },
+        )
+        education = prefetch_grouped(
+            chunk, CandidateEducation.objects.order_by('id'), 'candidate_id', {
+                'institution': 'institution', 'degree': 'degree',
+                'field_of_study': 'field_of_study', 'from_date': 'from_date', 'to_date': 'to_date',
+            },
+        )
+        experience = prefetch_grouped(
+            chunk, CandidateWorkExperience.objects.order_by('id'), 'candidate_id', {
+                'company': 'company', 'position': 'position',
+                'from_date': 'from_date', 'to_date': 'to_date', 'description': 'description',
+            },
+        )
+        notes = prefetch_grouped(
+            chunk, Note.objects.order_by('created_at', 'id'), 'candidate_id', {
+                'author': 'author__username', 'created_at': 'created_at', 'content': 'content',
+            },
+        )
+        for row in chunk:
+            row['applications'] = applications.get(row['id'], [])
+            row['skills'] = skills.get(row['id'], [])
+            row['education'] = education.get(row['id'], [])
+            row['experience'] = experience.get(row['id'], [])
+            row['notes'] = notes.get(row['id'], [])
+            yield row
@@ -1,16 +1,120 @@
 # candidates/forms.py
 from django import forms
 from django.forms import inlineformset_factory
-from .models import Candidate, CandidateSkill, CandidateEducation, CandidateWorkExperience
+from jobs.models import JobPost
+from recruiters.models import EmailTemplate
+from .models import (
+    Application, Candidate, CandidateSkill, CandidateEducation, CandidateWorkExperience, ResumeUpload,
+)
 
 class CandidateForm(forms.ModelForm):
+    """
+    A new candidate's profile and their first application. The resume is
+    either a file posted with the form or, with `user` given, a finished
+    chunked upload of theirs (see candidates.uploads) named in
+    resume_upload.
+    """
+    job = forms.ModelChoiceField(queryset=JobPost.objects.all())
+    stage = forms.ChoiceField(choices=Application.STAGE_CHOICES, initial='new')
+    resume_upload = forms.UUIDField(required=False, widget=forms.HiddenInput)
+
     class Meta:
         model = Candidate
-        fields = ['first_name', 'last_name', 'email', 'phone', 'resume', 'cover_letter', 'job', 'stage']
+        fields = ['first_name', 'last_name', 'email', 'phone', 'resume', 'cover_letter']
         widgets = {
             'cover_letter': forms.Textarea(attrs={'rows': 4}),
         }
 
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user = user
+        self.fields['resume'].required = False
+
+    def clean_resume_upload(self):
+        upload_id = self.cleaned_data['resume_upload']
+        if upload_id is None:
+            return None
+        upload = ResumeUpload.objects.filter(
+            pk=upload_id, created_by=self.user, completed_at__isnull=False,
+        ).first() if self.user else None
+        if upload is None:
+            raise forms.ValidationError("The resume upload was not found or has not finished.")
+        return upload
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('resume') and not cleaned_data.get('resume_upload') \
+                and 'resume_upload' not in self.errors:
+            self.add_error('resume', forms.Field.default_error_messages['required'])
+        return cleaned_data
+
+    def save(self, commit=True):
+        upload = self.cleaned_data.get('resume_upload')
+        if upload is not None and not self.cleaned_data.get('resume'):
+            # The file is already in place and hashed
+            self.instance.resume.name = upload.stored_name
+            self.instance.resume_hash = upload.sha256
+        candidate = super().save(commit)
+        if upload is not None and commit:
+            upload.delete()
+        return candidate
+
+class ApplicationForm(forms.ModelForm):
+    """
+    Apply an existing candidate to another job
+    """
+    class Meta:
+        model = Application
+        fields = ['job', 'stage']
+        widgets = {
+            'job': forms.Select(attrs={'class': 'form-select'}),
+            'stage': forms.Select(attrs={'class': 'form-select'}),
+        }
+
+    def __init__(self, *args, candidate, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.instance.candidate = candidate
+        self.fields['job'].queryset = JobPost.objects.exclude(applications__candidate=candidate).order_by('title')
+
+class BulkStageForm(forms.Form):
+    """
+    Move the selected applications, or every application matching the
+    candidate list's filters, to another stage, optionally emailing the
+    candidates who moved
+    """
+    application = forms.Field(required=False, widget=forms.MultipleHiddenInput)
+    all_matching = forms.BooleanField(required=False, label="Every application matching the filters")
+    filters = forms.CharField(required=False, widget=forms.HiddenInput)
+    to_stage = forms.ChoiceField(choices=Application.STAGE_CHOICES, label="Move to")
+    send_email = forms.BooleanField(required=False, label="Email the candidates who move")
+    template = forms.ModelChoiceField(
+        queryset=EmailTemplate.objects.all(), required=False, empty_label="Select a template (optional)",
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+    subject = forms.CharField(max_length=200, required=False, widget=forms.TextInput(attrs={'class': 'form-control'}))
+    body = forms.CharField(required=False, widget=forms.Textarea(attrs={
+        'rows': 6, 'class': 'form-control',
+        'placeholder': 'You can use variables like {{candidate.first_name}}, {{job.title}}, etc.',
+    }))
+
+    def clean_application(self):
+        try:
+            return sorted({int(value) for value in self.cleaned_data['application'] or []})
+        except (TypeError, ValueError):
+            raise forms.ValidationError("Select candidates from the list.")
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('all_matching') and not cleaned_data.get('application') \
+                and 'application' not in self.errors:
+            raise forms.ValidationError("Select at least one candidate.")
+        if cleaned_data.get('send_email'):
+            if not cleaned_data.get('subject'):
+                self.add_error('subject', 'Enter a subject for the email.')
+            if not cleaned_data.get('template') and not cleaned_data.get('body'):
+                self.add_error('body', 'Enter a message or select a template.')
+        return cleaned_data
+
 CandidateSkillFormSet = inlineformset_factory(
     Candidate, CandidateSkill, 
     fields=['skill', 'years_experience'],
@@ -27,4 +131,23 @@ CandidateWorkExperienceFormSet = inlineformset_factory(
     Candidate, CandidateWorkExperience,
     fields=['company', 'position', 'from_date', 'to_date', 'description'],
     extra=2, can_delete=True
-)
\ No newline at end of file
+)
+
+class CandidateImportUploadForm(forms.Form):
+    file = forms.FileField(
+        help_text="CSV or XLSX file with one candidate per row",
+        widget=forms.ClearableFileInput(attrs={'accept': '.csv,.xlsx'}),
+    )
+    job = forms.ModelChoiceField(
+        queryset=JobPost.objects.order_by('title'), required=False,
+        help_text="Used for rows that do not name a job",
+    )
+    download_errors = forms.BooleanField(
+        required=False, label="Download the error report as CSV instead of showing it",
+    )
+
+    def clean_file(self):
+        upload = self.cleaned_data['file']
+        if not upload.name.lower().endswith(('.csv', '.xlsx')):
+            raise forms.ValidationError("Upload a .csv or .xlsx file.")
+        return upload
@@ -0,0 +1,382 @@
+# candidates/importing.py
+"""
+Bulk candidate import from CSV and XLSX files.
+
+Files are read in chunks (pandas for CSV, openpyxl in read-only mode for
+XLSX), so memory use does not grow with the file. Every row is validated
+with the fields of CandidateImportForm, which applies CandidateForm's
+rules, and its skills, education and work history with the forms the
+candidate formsets use.
+Valid rows are written with bulk_create, one transaction per batch; invalid
+rows are reported through an error callback and skipped.
+
+Expected columns (extra columns are ignored):
+
+    first_name, last_name, email, phone, cover_letter, stage, job, resume,
+    skills, education, experience
+
+`job` is a job id or exact title and may be omitted when a default job is
+given; each row is an application of the person with that email to the job.
+Rows for people who already exist, in the database or earlier in the file,
+only add an application and leave the existing profile alone. `resume` is
+the storage path of an already uploaded file; rather than read every file
+during the import, the resume worker hashes it when it parses it. The three
+related columns hold ";"-separated entries:
+
+    skills:      Python:5; Django:3; SQL
+    education:   Institution | Degree | Field | 2015-09-01 | 2019-06-30
+    experience:  Company | Position | 2019-07-01 | 2021-12-31 | Description
+"""
+import csv
+from pathlib import Path
+
+import pandas as pd
+
+from django import forms
+from django.db import IntegrityError, transaction
+
+from jobs.models import JobPost
+from .forms import (
+    CandidateForm, CandidateEducationFormSet, CandidateSkillFormSet, CandidateWorkExperienceFormSet,
+)
+from .dedup import refresh_duplicates_on_commit
+from .indexing import mark_stale
+from .matching import invalidate_match_index
+from .models import (
+    Application, Candidate, CandidateEducation, CandidateSkill, CandidateWorkExperience, ResumeParseJob,
+)
+from .pipeline import record_stage_entries
+
+IMPORT_BATCH_SIZE = 1000
+ERROR_REPORT_HEADER = ['row', 'field', 'error']
+MAX_KEPT_ERRORS = 100
+
+EDUCATION_COLUMNS = ['institution', 'degree', 'field_of_study', 'from_date', 'to_date']
+EXPERIENCE_COLUMNS = ['company', 'position', 'from_date', 'to_date', 'description']
+
+
+class CandidateImportError(Exception):
+    """Raised when an import file cannot be read at all."""
+
+
+class CandidateImportForm(CandidateForm):
+    """
+    CandidateForm rules for one imported row. The job is resolved from a map
+    loaded once per import, the resume is the storage path of a file that
+    was uploaded separately, and email uniqueness is checked by the importer
+    for a whole batch at once.
+    """
+    job = forms.CharField(required=False)
+    resume = forms.CharField(required=False, max_length=100)
+
+    class Meta(CandidateForm.Meta):
+        fields = ['first_name', 'last_name', 'email', 'phone', 'cover_letter']
+
+    def __init__(self, *args, jobs, default_job=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.jobs = jobs
+        self.default_job = default_job
+
+    def clean_job(self):
+        value = self.cleaned_data['job'].strip()
+        if not value:
+            if self.default_job is None:
+                raise forms.ValidationError('This field is required.')
+            return self.default_job
+        job_id = self.jobs.get(value.lower())
+        if job_id is None:
+            raise forms.ValidationError(f'No job with id or title "{value}".')
+        return job_id
+
+    def validate_unique(self):
+        pass
+
+
+def read_rows(path, chunk_size=IMPORT_BATCH_SIZE):
+    """
+    Yield lists of up to `chunk_size` row dicts (all values as strings) from a
+    .csv or .xlsx file
+    """
+    suffix = Path(path).suffix.lower()
+    if suffix == '.csv':
+        try:
+            reader = pd.read_csv(
+                path, dtype=str, keep_default_na=False, chunksize=chunk_size, encoding='utf-8-sig',
+            )
+            for chunk in reader:
+                chunk.columns = [str(column).strip().lower() for column in chunk.columns]
+                yield chunk.to_dict('records')
+        except (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError) as exc:
+            raise CandidateImportError(f'Could not read CSV: {exc}') from exc
+    elif suffix == '.xlsx':
+        yield from _read_xlsx_rows(path, chunk_size)
+    else:
+        raise CandidateImportError(f'Unsupported import format: {suffix or "no extension"}')
+
+
+def _read_xlsx_rows(path, chunk_size):
+    try:
+        from openpyxl import load_workbook
+    except ImportError as exc:
+        raise CandidateImportError("XLSX import requires the 'openpyxl' package") from exc
+    try:
+        workbook = load_workbook(path, read_only=True, data_only=True)
+    except Exception as exc:
+        raise CandidateImportError(f'Could not read XLSX: {exc}') from exc
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(cell or '').strip().lower() for cell in next(rows, ())]
+        chunk = []
+        for values in rows:
+            chunk.append({
+                column: _cell_text(value) for column, value in zip(header, values) if column
+            })
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    finally:
+        workbook.close()
+
+
+def _cell_text(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'date') and callable(value.date):
+        return value.date().isoformat()
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _split_entries(value):
+    return [entry.strip() for entry in value.split(';') if entry.strip()]
+
+
+def _related_entries(row):
+    """
+    Yield (column, data) for the skills, education and experience entries of
+    a row
+    """
+    for entry in _split_entries(row.get('skills', '')):
+        skill, _, years = entry.partition(':')
+        yield 'skills', {'skill': skill.strip(), 'years_experience': years.strip() or 0}
+    for entry in _split_entries(row.get('education', '')):
+        values = [part.strip() for part in entry.split('|')]
+        yield 'education', dict(zip(EDUCATION_COLUMNS, values))
+    for entry in _split_entries(row.get('experience', '')):
+        values = [part.strip() for part in entry.split('|', len(EXPERIENCE_COLUMNS) - 1)]
+        yield 'experience', dict(zip(EXPERIENCE_COLUMNS, values))
+
+
+class RowValidator:
+    """
+    Validate plain dicts with a model form's fields and clean_<field> hooks
+    and build unsaved model instances from them.
+
+    Binding a new form per row deep-copies all of its fields, which dominates
+    the cost of a large import, so a single unbound form is built up front
+    and its fields are reused for every row.
+    """
+    def __init__(self, form):
+        self.form = form
+        self.model = form._meta.model
+        self.model_fields = set(form._meta.fields)
+
+    def clean(self, data):
+        """
+        Return (instance, None) or (None, {field: [messages]})
+        """
+        form = self.form
+        form.cleaned_data = {}
+        errors = {}
+        for name, field in form.fields.items():
+            try:
+                form.cleaned_data[name] = field.clean(data.get(name, ''))
+                hook = getattr(form, f'clean_{name}', None)
+                if hook is not None:
+                    form.cleaned_data[name] = hook()
+            except forms.ValidationError as exc:
+                errors[name] = exc.messages
+        if errors:
+            return None, errors
+        return self.model(**{
+            name: value for name, value in form.cleaned_data.items() if name in self.model_fields
+        }), None
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.failed = 0
+        self.error_count = 0
+        # Only the first MAX_KEPT_ERRORS are kept; the rest go to the report
+        self.errors = []
+
+    @property
+    def total(self):
+        return self.created + self.failed
+
+
+class CandidateImporter:
+    """
+    Import candidates from a file, calling `report(row, field, message)` for
+    every problem found. Row numbers match the spreadsheet, with the header
+    on row 1.
+    """
+    def __init__(self, default_job=None, user=None, batch_size=IMPORT_BATCH_SIZE, report=None):
+        self.default_job = default_job.id if isinstance(default_job, JobPost) else default_job
+        self.user = user
+        self.batch_size = batch_size
+        self.report = report
+        self.jobs = {}
+        for job_id, title in JobPost.objects.values_list('id', 'title'):
+            self.jobs[str(job_id)] = job_id
+            self.jobs.setdefault(title.strip().lower(), job_id)
+        self.candidate_validator = RowValidator(
+            CandidateImportForm(jobs=self.jobs, default_job=self.default_job),
+        )
+        self.related_validators = {
+            'skills': RowValidator(CandidateSkillFormSet.form()),
+            'education': RowValidator(CandidateEducationFormSet.form()),
+            'experience': RowValidator(CandidateWorkExperienceFormSet.form()),
+        }
+
+    def run(self, path):
+        result = ImportResult()
+        first_row = 2
+        for chunk in read_rows(path, self.batch_size):
+            self.import_batch(chunk, first_row, result)
+            first_row += len(chunk)
+        return result
+
+    def import_batch(self, rows, first_row, result):
+        valid = []
+        for row_number, row in enumerate(rows, start=first_row):
+            if not any(str(value).strip() for value in row.values()):
+                continue
+            parsed = self.validate_row(row, row_number, result)
+            if parsed is not None:
+                valid.append(parsed)
+
+        # One profile per email: rows for people already in the database, or
+        # earlier in the file, become further applications of that person
+        people = {
+            candidate.email.lower(): candidate for candidate in Candidate.objects.filter(
+                email__in={email for parsed in valid for email in (parsed[1].email, parsed[1].email.lower())},
+            ).only('id', 'email')
+        }
+        applied = {
+            (email.lower(), job_id): None for email, job_id in Application.objects.filter(
+                candidate__in=list(people.values()),
+            ).values_list('candidate__email', 'job_id')
+        }
+        accepted = []
+        for row_number, candidate, related, application in valid:
+            key = candidate.email.lower()
+            first_row = applied.get((key, application.job_id), False)
+            if first_row is None:
+                self.reject(result, row_number, 'email', 'This candidate has already applied for this job.')
+            elif first_row:
+                self.reject(result, row_number, 'email', f'Duplicate of row {first_row} in this file.')
+            else:
+                applied[key, application.job_id] = row_number
+                if key in people:
+                    candidate, related = people[key], []
+                else:
+                    people[key] = candidate
+                accepted.append((row_number, candidate, related, application))
+
+        if accepted:
+            try:
+                self.write_batch(accepted)
+            except IntegrityError as exc:
+                for row_number, _, _, _ in accepted:
+                    self.reject(result, row_number, '', f'Batch could not be saved: {exc}')
+            else:
+                result.created += len(accepted)
+
+    def reject(self, result, row_number, field, message):
+        result.failed += 1
+        self._record(result, row_number, field, message)
+
+    def _record(self, result, row_number, field, message):
+        result.error_count += 1
+        if len(result.errors) < MAX_KEPT_ERRORS:
+            result.errors.append((row_number, field, message))
+        if self.report is not None:
+            self.report(row_number, field, message)
+
+    def validate_row(self, row, row_number, result):
+        """
+        Return (row number, unsaved Candidate, [unsaved related rows], unsaved
+        Application) or None after reporting the row's errors
+        """
+        data = dict(row)
+        data['stage'] = data.get('stage', '').strip().lower() or 'new'
+        candidate, candidate_errors = self.candidate_validator.clean(data)
+        errors = []
+        if candidate is not None:
+            cleaned = self.candidate_validator.form.cleaned_data
+            candidate.resume = cleaned['resume']
+            application = Application(job_id=cleaned['job'], stage=cleaned['stage'])
+        else:
+            errors.extend(
+                (field, message) for field, messages in candidate_errors.items() for message in messages
+            )
+
+        related = []
+        for column, entry in _related_entries(row):
+            instance, entry_errors = self.related_validators[column].clean(entry)
+            if instance is not None:
+                related.append(instance)
+            else:
+                errors.extend(
+                    (column, f'{name}: {message}')
+                    for name, messages in entry_errors.items() for message in messages
+                )
+
+        if errors:
+            result.failed += 1
+            for field, message in errors:
+                self._record(result, row_number, field, message)
+            return None
+        return row_number, candidate, related, application
+
+    @transaction.atomic
+    def write_batch(self, accepted):
+        # A person new to the database can have several rows in the batch
+        new = {id(candidate): candidate for _, candidate, _, _ in accepted if candidate.pk is None}
+        candidates = Candidate.objects.bulk_create(list(new.values()))
+        related = {CandidateSkill: [], CandidateEducation: [], CandidateWorkExperience: []}
+        for _, candidate, rows, application in accepted:
+            application.candidate_id = candidate.id
+            for row in rows:
+                row.candidate_id = candidate.id
+                related[type(row)].append(row)
+        for model, rows in related.items():
+            model.objects.bulk_create(rows, batch_size=self.batch_size)
+        applications = Application.objects.bulk_create([application for _, _, _, application in accepted])
+
+        # bulk_create sends no signals, so do what the post_save handlers
+        # would for each new candidate and application
+        record_stage_entries(applications, user=self.user)
+        if not candidates:
+            return
+        ResumeParseJob.objects.bulk_create([
+            ResumeParseJob(candidate_id=candidate.id) for candidate in candidates if candidate.resume
+        ])
+        ids = [candidate.id for candidate in candidates]
+        mark_stale(*ids)
+        refresh_duplicates_on_commit(ids, created=True)
+        invalidate_match_index()
+
+
+def write_error_report(file):
+    """
+    Return a report callback writing errors as CSV rows to `file`
+    """
+    writer = csv.writer(file)
+    writer.writerow(ERROR_REPORT_HEADER)
+    return lambda row, field, message: writer.writerow([row, field, message])
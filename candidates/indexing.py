@@ -0,0 +1,107 @@
+# candidates/indexing.py
+"""
+Deferred search and match indexing.
+
+Writes that change what the search or match index knows about a candidate
+do not update them on the spot. Once their transaction commits, the
+candidate's id is added to a per-process set of stale candidates, which
+costs no queries, and a background thread drains the set
+CANDIDATE_INDEX_DELAY seconds later: one index_candidates() call
+reindexes everything that went stale in the meantime, and one change set
+tells every process which rows of its match index to recompute (see
+candidates.matching). A burst of edits to one profile is indexed once, and
+the request that made them never waits for it.
+
+Management commands that write candidates call drain_stale() before they
+exit, as their process may end before the thread wakes. A process that is
+killed loses at most the last few seconds of changes, which the
+rebuild_search_index command repairs.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+
+from .matching import record_changes
+from .search import index_candidates
+
+logger = logging.getLogger(__name__)
+
+INDEX_BATCH_SIZE = 1000
+
+_lock = threading.Lock()
+_stale = set()
+_worker = None
+
+
+def index_delay():
+    return getattr(settings, 'CANDIDATE_INDEX_DELAY', 1.0)
+
+
+def mark_stale(*candidate_ids):
+    """
+    Queue candidates for reindexing once the current transaction commits
+    (straight away in autocommit mode), so the index never sees rolled-back
+    data and cascading deletes are finished before they are looked up
+    """
+    candidate_ids = {candidate_id for candidate_id in candidate_ids if candidate_id is not None}
+    if candidate_ids:
+        transaction.on_commit(lambda: _queue(candidate_ids))
+
+
+def _queue(candidate_ids):
+    with _lock:
+        _stale.update(candidate_ids)
+    # Callbacks only run inside an atomic block under TestCase, whose rows
+    # another connection cannot see, so there the ids wait for drain_stale()
+    if not connection.in_atomic_block:
+        _start_worker()
+
+
+def _start_worker():
+    global _worker
+    with _lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_work, name='candidate-indexer', daemon=True)
+            _worker.start()
+
+
+def _work():
+    global _worker
+    try:
+        while True:
+            time.sleep(index_delay())
+            with _lock:
+                if not _stale:
+                    _worker = None
+                    return
+            try:
+                drain_stale()
+            except Exception:
+                logger.exception("Reindexing stale candidates failed, retrying")
+    finally:
+        # Connections are per thread, so this only closes the worker's own
+        connections.close_all()
+
+
+def drain_stale(batch_size=INDEX_BATCH_SIZE):
+    """
+    Reindex every stale candidate now, `batch_size` at a time. Returns the
+    number of candidates reindexed. A batch that fails is put back.
+    """
+    drained = 0
+    while True:
+        with _lock:
+            batch = [_stale.pop() for _ in range(min(batch_size, len(_stale)))]
+        if not batch:
+            return drained
+        try:
+            index_candidates(batch)
+            record_changes(batch)
+        except Exception:
+            with _lock:
+                _stale.update(batch)
+            raise
+        drained += len(batch)
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ats_project.synthetic import SYNTHETIC_BATCH_SIZE, generate
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with seeded synthetic jobs, candidates and history for benchmarking'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=1000, help='Job posts to create')
+        parser.add_argument('--candidates', type=int, default=1000000, help='Candidates to create')
+        parser.add_argument('--departments', type=int, default=16, help='Departments to create')
+        parser.add_argument('--users', type=int, default=20, help='Recruiter and interviewer accounts')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same data')
+        parser.add_argument('--batch-size', type=int, default=SYNTHETIC_BATCH_SIZE,
+                            help='Candidates inserted per transaction')
+        parser.add_argument('--skip-duplicates', action='store_true',
+                            help='Do not rebuild the duplicate index afterwards')
+
+    def handle(self, *args, **options):
+        if options['jobs'] < 1 and options['candidates'] > 0:
+            raise CommandError('Candidates need at least one job to apply for')
+        created = generate(
+            jobs=options['jobs'], candidates=options['candidates'], departments=options['departments'],
+            users=options['users'], seed=options['seed'], batch_size=max(1, options['batch_size']),
+            rebuild_duplicates=not options['skip_duplicates'],
+            progress=lambda step, count: self.stdout.write(f'{step.capitalize()}: {count}'),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            'Created ' + ', '.join(f"{count} {kind.replace('_', ' ')}" for kind, count in created.items())
+        ))
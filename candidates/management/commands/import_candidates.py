@@ -0,0 +1,47 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from candidates.importing import CandidateImporter, CandidateImportError, IMPORT_BATCH_SIZE, write_error_report
+from candidates.indexing import drain_stale
+from jobs.models import JobPost
+
+
+class Command(BaseCommand):
+    help = 'Import candidates from a CSV or XLSX file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or XLSX file to import')
+        parser.add_argument('--job', type=int,
+                            help='Id of the job to use for rows without a job column')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE,
+                            help='Rows validated and inserted per transaction')
+        parser.add_argument('--errors',
+                            help='Where to write the per-row error report (default: <path>.errors.csv)')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.is_file():
+            raise CommandError(f'{path} does not exist')
+        if options['job'] is not None and not JobPost.objects.filter(id=options['job']).exists():
+            raise CommandError(f'No job with id {options["job"]}')
+        errors_path = Path(options['errors'] or f'{path}.errors.csv')
+
+        with errors_path.open('w', newline='') as report_file:
+            importer = CandidateImporter(
+                default_job=options['job'], batch_size=options['batch_size'],
+                report=write_error_report(report_file),
+            )
+            try:
+                result = importer.run(path)
+            except CandidateImportError as exc:
+                raise CommandError(str(exc)) from exc
+            # Rather than leave the new candidates to a thread that may not
+            # get to run before the command exits
+            drain_stale()
+
+        self.stdout.write(self.style.SUCCESS(f'Imported {result.created} of {result.total} row(s)'))
+        if result.failed:
+            self.stdout.write(self.style.WARNING(f'{result.failed} row(s) rejected, see {errors_path}'))
+        else:
+            errors_path.unlink()
@@ -0,0 +1,56 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from candidates.indexing import drain_stale
+from candidates.tasks import claim_jobs, purge_stale_parse_cache, requeue_stale_jobs, run_parse_jobs
+
+
+class Command(BaseCommand):
+    help = 'Parse queued resumes in a pool of worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Number of parser processes (defaults to the CPU count)')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Jobs claimed per round (defaults to four per worker)')
+        parser.add_argument('--poll-interval', type=float, default=5.0,
+                            help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the queue is empty instead of polling')
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        batch_size = options['batch_size'] or workers * 4
+
+        purged = purge_stale_parse_cache()
+        if purged:
+            self.stdout.write(f'Purged {purged} stale parse cache entries')
+
+        requeued = requeue_stale_jobs()
+        if requeued:
+            self.stdout.write(f'Requeued {requeued} stale job(s)')
+
+        # Child processes never touch the database; don't let them inherit
+        # the parent's open connection.
+        connections.close_all()
+        processed = 0
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            while True:
+                jobs = claim_jobs(batch_size)
+                if not jobs:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+                run_parse_jobs(jobs, executor)
+                # Rather than leave the parsed text to a thread that may not
+                # get to run before the command exits
+                drain_stale()
+                processed += len(jobs)
+                self.stdout.write(f'Processed {processed} resume(s)')
+
+        self.stdout.write(self.style.SUCCESS(f'Done, processed {processed} resume(s)'))
@@ -0,0 +1,17 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from candidates.uploads import purge_stale_uploads
+
+
+class Command(BaseCommand):
+    help = 'Delete chunked resume uploads that were abandoned or never attached to a candidate'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, default=24,
+                            help='Delete uploads untouched for this many hours')
+
+    def handle(self, *args, **options):
+        deleted = purge_stale_uploads(timedelta(hours=options['hours']))
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} stale uploads'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from candidates.tasks import enqueue_missing_previews
+
+
+class Command(BaseCommand):
+    help = 'Queue resumes that have no thumbnail or text preview yet for the process_resumes worker'
+
+    def handle(self, *args, **options):
+        queued = enqueue_missing_previews()
+        self.stdout.write(self.style.SUCCESS(f'Queued {queued} resume(s); run process_resumes to build the previews'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from candidates.dedup import SCAN_CHUNK_SIZE, rebuild_duplicate_index
+
+
+class Command(BaseCommand):
+    help = 'Recompute candidate blocking keys and re-scan every block for likely duplicates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=SCAN_CHUNK_SIZE,
+                            help='Rows read, and pairs compared, per batch')
+
+    def handle(self, *args, **options):
+        found = rebuild_duplicate_index(
+            chunk_size=max(1, options['chunk_size']),
+            progress=lambda step, count: self.stdout.write(f'{step.capitalize()} {count}'),
+        )
+        self.stdout.write(self.style.SUCCESS(f'Done, found {found} likely duplicate pair(s)'))
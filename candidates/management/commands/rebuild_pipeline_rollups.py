@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from candidates.pipeline import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the pipeline funnel and time-in-stage rollups from the stage transition log'
+
+    def handle(self, *args, **options):
+        daily, durations = rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS(
+            f'Done, wrote {daily} daily count row(s) and {durations} duration bucket row(s)'
+        ))
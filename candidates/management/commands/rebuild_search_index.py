@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from candidates.models import Candidate
+from candidates.search import index_candidates
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the candidate full-text search index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Candidates indexed per batch')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        ids = Candidate.objects.order_by('id').values_list('id', flat=True)
+        batch = []
+        indexed = 0
+        for candidate_id in ids.iterator(chunk_size=batch_size):
+            batch.append(candidate_id)
+            if len(batch) == batch_size:
+                index_candidates(batch)
+                indexed += len(batch)
+                batch = []
+                self.stdout.write(f'Indexed {indexed} candidate(s)')
+        index_candidates(batch)
+        indexed += len(batch)
+        self.stdout.write(self.style.SUCCESS(f'Done, indexed {indexed} candidate(s)'))
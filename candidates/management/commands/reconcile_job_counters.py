@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from candidates.pipeline import reconcile_job_counters
+
+
+class Command(BaseCommand):
+    help = "Recount each job's applicant and per-stage counters from its applications and fix any drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Jobs locked and recounted per transaction')
+
+    def handle(self, *args, **options):
+        corrected = reconcile_job_counters(
+            chunk_size=max(1, options['chunk_size']),
+            progress=lambda checked, corrected: self.stdout.write(f'Checked {checked} job(s), corrected {corrected}'),
+        )
+        self.stdout.write(self.style.SUCCESS(f'Done, corrected {corrected} job(s)'))
@@ -0,0 +1,55 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ats_project.benchmark import compare, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Measure latency, queries and memory of every view and write the results as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='benchmark.json', help='Where to write the results')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed requests per view after the first')
+        parser.add_argument('--view', action='append', dest='views',
+                            help='Only benchmark this URL name (repeatable)')
+        parser.add_argument('--baseline', help='Results of an earlier run to compare against')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Relative latency increase reported as a regression')
+        parser.add_argument('--fail-on-regression', action='store_true',
+                            help='Exit with an error when the comparison finds regressions')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            try:
+                baseline = json.loads(Path(options['baseline']).read_text())
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Cannot read {options['baseline']}: {exc}") from exc
+
+        results = run_benchmarks(
+            repeat=max(0, options['repeat']), names=options['views'], progress=self.report,
+        )
+        Path(options['output']).write_text(json.dumps(results, indent=2) + '\n')
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(results['views'])} result(s) to {options['output']}"))
+
+        if baseline is None:
+            return
+        regressions = compare(baseline, results, tolerance=options['tolerance'])
+        for route, metric, before, after in regressions:
+            self.stdout.write(self.style.WARNING(f'{route} {metric}: {before} -> {after}'))
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
+        elif options['fail_on_regression']:
+            raise CommandError(f'{len(regressions)} regression(s) against the baseline')
+
+    def report(self, route, entry):
+        if 'skipped' in entry:
+            self.stdout.write(f"{route}: skipped, {entry['skipped']}")
+            return
+        warm = entry['warm_ms']['p50'] if entry['warm_ms'] else '-'
+        self.stdout.write(
+            f"{route}: {entry['status']}, {entry['cold_queries']} queries, "
+            f"{entry['cold_ms']} ms cold, {warm} ms warm p50, {entry['peak_memory_kb']} KB"
+        )
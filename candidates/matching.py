@@ -0,0 +1,390 @@
+# candidates/matching.py
+"""
+Candidate-to-job match scoring.
+
+Every candidate is represented by a sparse TF-IDF vector built from their
+skills (weighted by years of experience) and work history. A job is vectorised
+from its title and requirements against the same vocabulary, and the match
+score is the cosine similarity between the two, computed for all candidates at
+once as a single sparse matrix-vector product.
+
+Building the candidate matrix takes a few queries and a pass over every skill
+and experience row, so each process keeps its index and brings it up to date
+rather than rebuilding it. Candidates whose skills or work history change are
+recorded by candidates.indexing as numbered MatchIndexChange rows, which every
+process reads, whichever one wrote them, and a process holding an older index
+recomputes only those candidates' rows. Term weights keep the IDF of the last
+full build, with terms it had never seen weighted as the rarest. A full
+rebuild, needed after bulk loads, after too many changes or once change sets
+may have been pruned, runs in a background thread while the old index keeps
+answering, so no request waits for it once a process has an index. Indexes
+are built outside the lock that guards the process's copy, and swapped in
+under it.
+"""
+import logging
+import math
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+import numpy as np
+from scipy import sparse
+
+from django.db import connection, connections
+from django.utils import timezone
+
+from .models import Candidate, CandidateSkill, CandidateWorkExperience, MatchIndexChange
+from .search import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Change sets are pruned after a day; a process that has not looked at them
+# for that long rebuilds its index
+CHANGES_TIMEOUT = 60 * 60 * 24
+MAX_CHANGE_SETS = 1000
+# Beyond this share of all candidates, an update costs as much as a rebuild
+MAX_UPDATE_FRACTION = 0.1
+MIN_UPDATE_LIMIT = 100
+
+# Weight of each skill term relative to a word of work history. Years of
+# experience add to it logarithmically so a decade does not drown everything.
+SKILL_WEIGHT = 3.0
+POSITION_WEIGHT = 1.5
+DESCRIPTION_WEIGHT = 1.0
+MATCHED_TERMS_SHOWN = 5
+
+_lock = threading.Lock()
+_memo = {'index': None, 'version': 0, 'synced_at': 0.0, 'rebuilding': False}
+
+
+class MatchIndex:
+    """
+    L2-normalised TF-IDF matrix with one row per candidate, ordered by id
+    """
+    def __init__(self, candidate_ids, vocabulary, matrix, idf):
+        self.candidate_ids = candidate_ids
+        self.vocabulary = vocabulary
+        self.term_ids = {term: i for i, term in enumerate(vocabulary)}
+        self.matrix = matrix
+        self.idf = idf
+        # Terms that no candidate has still count towards a job's norm, as if
+        # they were the rarest term in the corpus
+        self.unseen_idf = math.log(1 + len(candidate_ids)) + 1
+
+    def vectorize(self, texts):
+        """
+        Return a (len(texts) x vocabulary) CSR matrix of L2-normalised TF-IDF
+        vectors for free-text documents such as job requirements
+        """
+        rows, cols, values = [], [], []
+        norms = np.ones(len(texts))
+        for row, text in enumerate(texts):
+            squared = 0.0
+            for term, count in Counter(tokenize(text)).items():
+                term_id = self.term_ids.get(term)
+                idf = self.unseen_idf if term_id is None else self.idf[term_id]
+                weight = (1 + math.log(count)) * idf
+                squared += weight * weight
+                if term_id is not None:
+                    rows.append(row)
+                    cols.append(term_id)
+                    values.append(weight)
+            if squared:
+                norms[row] = math.sqrt(squared)
+        vectors = sparse.csr_matrix((values, (rows, cols)), shape=(len(texts), len(self.vocabulary)))
+        return sparse.diags(1 / norms) @ vectors
+
+    def rows_for(self, candidate_ids):
+        """
+        Map candidate ids to matrix rows, dropping ids that are not indexed
+        """
+        candidate_ids = np.asarray(candidate_ids, dtype=np.int64)
+        if not len(self.candidate_ids):
+            return np.empty(0, dtype=np.int64)
+        positions = np.searchsorted(self.candidate_ids, candidate_ids)
+        positions[positions >= len(self.candidate_ids)] = 0
+        return positions[self.candidate_ids[positions] == candidate_ids]
+
+    def rank(self, text, candidate_ids=None, limit=None):
+        """
+        Return [(candidate_id, score)] best first for a job description,
+        optionally restricted to the given candidates
+        """
+        query = self.vectorize([text])
+        if candidate_ids is None:
+            rows = np.arange(len(self.candidate_ids))
+            scores = (self.matrix @ query.T).toarray().ravel()
+        else:
+            rows = self.rows_for(candidate_ids)
+            scores = (self.matrix[rows] @ query.T).toarray().ravel()
+        order = _top(scores, limit)
+        return list(zip(self.candidate_ids[rows[order]].tolist(), scores[order].tolist()))
+
+    def matched_terms(self, text, candidate_ids, limit=MATCHED_TERMS_SHOWN):
+        """
+        Return {candidate_id: [term, ...]} with the terms contributing most to
+        each candidate's score
+        """
+        query = self.vectorize([text])
+        rows = self.rows_for(candidate_ids)
+        contributions = self.matrix[rows].multiply(query).tocsr()
+        matched = {}
+        for i, row in enumerate(rows):
+            start, end = contributions.indptr[i], contributions.indptr[i + 1]
+            columns = contributions.indices[start:end]
+            best = columns[np.argsort(contributions.data[start:end])[::-1][:limit]]
+            matched[int(self.candidate_ids[row])] = [self.vocabulary[column] for column in best]
+        return matched
+
+    def updated(self, candidate_ids, documents, existing):
+        """
+        Return a copy with the rows of `candidate_ids` rebuilt from
+        `documents` ({candidate_id: Counter of term weights}): rows are
+        added for new candidates in `existing` and dropped for deleted ones
+        """
+        keep = ~np.isin(self.candidate_ids, np.fromiter(candidate_ids, dtype=np.int64))
+        added = np.asarray(sorted(existing), dtype=np.int64)
+        new_terms = sorted({term for counts in documents.values() for term in counts} - self.term_ids.keys())
+        vocabulary = self.vocabulary + new_terms
+        idf = np.concatenate([self.idf, np.full(len(new_terms), self.unseen_idf)])
+        term_ids = {term: i for i, term in enumerate(vocabulary)}
+
+        rows, columns, values = [], [], []
+        for row, candidate_id in enumerate(added.tolist()):
+            counts = documents.get(candidate_id, {})
+            rows.extend([row] * len(counts))
+            columns.extend(term_ids[term] for term in counts)
+            values.extend(counts.values())
+        counts = sparse.csr_matrix(
+            (
+                np.array(values, dtype=np.float64),
+                (np.array(rows, dtype=np.int64), np.array(columns, dtype=np.int64)),
+            ),
+            shape=(len(added), len(vocabulary)),
+        )
+
+        kept = self.matrix[keep]
+        # Widened to the new vocabulary without copying
+        kept = sparse.csr_matrix(
+            (kept.data, kept.indices, kept.indptr), shape=(kept.shape[0], len(vocabulary)),
+        )
+        ids = np.concatenate([self.candidate_ids[keep], added])
+        order = np.argsort(ids, kind='stable')
+        matrix = sparse.vstack([kept, _normalise(counts, idf)]).tocsr()[order]
+        index = MatchIndex(ids[order], vocabulary, matrix, idf)
+        index.unseen_idf = self.unseen_idf
+        return index
+
+
+def _top(scores, limit):
+    """
+    Indices of the `limit` highest scores, best first, without a full sort
+    """
+    if limit is not None and limit < len(scores):
+        candidates = np.argpartition(-scores, limit)[:limit]
+        return candidates[np.argsort(-scores[candidates], kind='stable')]
+    return np.argsort(-scores, kind='stable')
+
+
+def _documents(candidate_ids=None):
+    """
+    Map candidate ids to a Counter of weighted terms from their skills and
+    work history, for every candidate or only the given ones, with two
+    queries
+    """
+    skills = CandidateSkill.objects.all()
+    experience = CandidateWorkExperience.objects.all()
+    if candidate_ids is not None:
+        skills = skills.filter(candidate_id__in=candidate_ids)
+        experience = experience.filter(candidate_id__in=candidate_ids)
+    documents = defaultdict(Counter)
+    for candidate_id, skill, years in skills.values_list(
+        'candidate_id', 'skill', 'years_experience',
+    ).iterator(chunk_size=10000):
+        weight = SKILL_WEIGHT * (1 + math.log1p(years or 0))
+        for term in tokenize(skill):
+            documents[candidate_id][term] += weight
+    for candidate_id, position, description in experience.values_list(
+        'candidate_id', 'position', 'description',
+    ).iterator(chunk_size=10000):
+        for term in tokenize(position):
+            documents[candidate_id][term] += POSITION_WEIGHT
+        for term in tokenize(description):
+            documents[candidate_id][term] += DESCRIPTION_WEIGHT
+    return documents
+
+
+def _normalise(counts, idf):
+    """
+    Turn a matrix of raw term weights into L2-normalised TF-IDF rows, with
+    sublinear term frequency
+    """
+    counts.data = 1 + np.log(counts.data)
+    weighted = counts @ sparse.diags(idf)
+    norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return (sparse.diags(1 / norms) @ weighted).tocsr()
+
+
+def build_match_index():
+    """
+    Build a MatchIndex over every candidate with three queries
+    """
+    candidate_ids = np.fromiter(
+        Candidate.objects.order_by('id').values_list('id', flat=True).iterator(chunk_size=10000),
+        dtype=np.int64,
+    )
+    documents = _documents()
+
+    rows, terms, values = [], [], []
+    row_of = {candidate_id: row for row, candidate_id in enumerate(candidate_ids.tolist())}
+    for candidate_id, counts in documents.items():
+        row = row_of.get(candidate_id)
+        if row is None:
+            continue
+        rows.extend([row] * len(counts))
+        terms.extend(counts.keys())
+        values.extend(counts.values())
+
+    vocabulary, columns = np.unique(np.array(terms, dtype=object), return_inverse=True)
+    counts = sparse.csr_matrix(
+        (np.array(values, dtype=np.float64), (np.array(rows, dtype=np.int64), columns)),
+        shape=(len(candidate_ids), len(vocabulary)),
+    )
+    # Smoothed inverse document frequency
+    document_frequency = np.bincount(counts.indices, minlength=len(vocabulary))
+    idf = np.log((1 + len(candidate_ids)) / (1 + document_frequency)) + 1
+    return MatchIndex(candidate_ids, vocabulary.tolist(), _normalise(counts, idf), idf)
+
+
+def _latest_change():
+    return MatchIndexChange.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def _changed_since(version):
+    """
+    The id of the newest change set after `version` and the ids of the
+    candidates changed since, or None for the candidates if the index has to
+    be rebuilt
+    """
+    changes = list(
+        MatchIndexChange.objects.filter(id__gt=version).order_by('id')
+        .values_list('id', 'candidate_ids')[:MAX_CHANGE_SETS + 1]
+    )
+    if not changes:
+        return version, set()
+    latest = changes[-1][0]
+    if len(changes) > MAX_CHANGE_SETS or any(ids is None for _, ids in changes):
+        return latest, None
+    return latest, set().union(*(ids for _, ids in changes))
+
+
+def _install(index, version):
+    """
+    Make `index`, up to date as of change set `version`, this process's
+    index unless a newer one was installed meanwhile
+    """
+    with _lock:
+        if _memo['index'] is None or version >= _memo['version']:
+            _memo.update(index=index, version=version, synced_at=time.monotonic())
+        return _memo['index']
+
+
+def get_match_index():
+    """
+    Return this process's MatchIndex, first updating the rows of
+    candidates that changed since it was built. Builds the index if the
+    process has none; otherwise a rebuild runs in the background and the
+    current index is returned meanwhile.
+    """
+    with _lock:
+        index, version, synced_at = _memo['index'], _memo['version'], _memo['synced_at']
+    if index is not None and time.monotonic() - synced_at < CHANGES_TIMEOUT:
+        latest, changed = _changed_since(version)
+        limit = max(MIN_UPDATE_LIMIT, MAX_UPDATE_FRACTION * len(index.candidate_ids))
+        if changed is not None and len(changed) <= limit:
+            if changed:
+                existing = Candidate.objects.filter(id__in=changed).values_list('id', flat=True)
+                index = index.updated(changed, _documents(changed), list(existing))
+            return _install(index, latest)
+    # Inside a transaction, as under TestCase, another connection would not
+    # see its rows, so build in this thread
+    if index is None or connection.in_atomic_block:
+        version = _latest_change()
+        return _install(build_match_index(), version)
+    with _lock:
+        rebuilding, _memo['rebuilding'] = _memo['rebuilding'], True
+    if not rebuilding:
+        threading.Thread(target=_rebuild, name='match-index-rebuild', daemon=True).start()
+    return index
+
+
+def _rebuild():
+    try:
+        version = _latest_change()
+        _install(build_match_index(), version)
+    except Exception:
+        logger.exception("Rebuilding the match index failed")
+    finally:
+        with _lock:
+            _memo['rebuilding'] = False
+        # Connections are per thread, so this only closes the rebuild's own
+        connections.close_all()
+
+
+def reset_match_index():
+    """
+    Drop this process's index, so that the next use builds it afresh
+    """
+    with _lock:
+        _memo.update(index=None, version=0, synced_at=0.0)
+
+
+def record_changes(candidate_ids):
+    """
+    Publish a change set so that every process updates the rows of
+    `candidate_ids` the next time it uses its index, and prune change sets
+    old enough that no process still reads them. Called by
+    candidates.indexing once the changes are committed.
+    """
+    candidate_ids = sorted(set(candidate_ids))
+    if not candidate_ids:
+        return
+    MatchIndexChange.objects.create(candidate_ids=candidate_ids)
+    pruned = timezone.now() - timedelta(seconds=CHANGES_TIMEOUT)
+    MatchIndexChange.objects.filter(created_at__lt=pruned).delete()
+
+
+def invalidate_match_index():
+    """
+    Make every process rebuild its match index once the current
+    transaction commits, for bulk changes that bypass signals
+    """
+    MatchIndexChange.objects.create(candidate_ids=None)
+
+
+def job_document(job):
+    return f"{job.title}\n{job.requirements}"
+
+
+def rank_candidates(job, candidate_ids=None, limit=None):
+    """
+    Return [(candidate_id, score)] best first for a job, over all candidates
+    or only the given ones. Scores are cosine similarities between 0 and 1.
+    """
+    return get_match_index().rank(job_document(job), candidate_ids, limit)
+
+
+def rank_jobs(candidate_id, jobs, limit=None):
+    """
+    Return [(job, score)] best first for one candidate over the given jobs
+    """
+    jobs = list(jobs)
+    index = get_match_index()
+    rows = index.rows_for([candidate_id])
+    if not jobs or not len(rows):
+        return [(job, 0.0) for job in jobs[:limit]]
+    job_vectors = index.vectorize([job_document(job) for job in jobs])
+    scores = (job_vectors @ index.matrix[rows[0]].T).toarray().ravel()
+    return [(jobs[i], float(scores[i])) for i in _top(scores, limit)]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.7 on 2026-10-18 16:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('candidates', '0001_initial'),
+        ('jobs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='candidate',
+            index=models.Index(fields=['job', 'stage', 'created_at'], name='candidate_job_stage_created'),
+        ),
+        migrations.AddIndex(
+            model_name='candidate',
+            index=models.Index(fields=['stage', 'created_at'], name='candidate_stage_created'),
+        ),
+        migrations.AddIndex(
+            model_name='candidate',
+            index=models.Index(fields=['created_at', 'id'], name='candidate_created_id'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.7 on 2026-10-18 16:43
+
+from django.db import migrations, models
+
+from candidates.parsing import content_hash
+
+
+def hash_existing_resumes(apps, schema_editor):
+    Candidate = apps.get_model('candidates', 'Candidate')
+    for candidate in Candidate.objects.filter(resume_hash='').exclude(resume='').iterator():
+        try:
+            with candidate.resume.open('rb') as resume:
+                candidate.resume_hash = content_hash(resume.chunks())
+        except OSError:
+            continue
+        candidate.save(update_fields=['resume_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('candidates', '0003_resume_parse_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='candidate',
+            name='resume_hash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64),
+        ),
+        migrations.CreateModel(
+            name='ResumeParseCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64)),
+                ('parser_version', models.CharField(max_length=20)),
+                ('text', models.TextField(blank=True)),
+                ('entities', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('content_hash', 'parser_version'), name='unique_parse_cache_entry')],
+            },
+        ),
+        migrations.RunPython(hash_existing_resumes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.7 on 2026-10-18 16:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('candidates', '0004_resume_hash_parse_cache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchPosting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.FloatField()),
+                ('candidate', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_postings', to='candidates.candidate')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', '-weight'], name='searchposting_term_weight')],
+            },
+        ),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 5.1.7 on 2026-10-18 16:51
+
+import django.db.models.deletion
+import django.utils.timezone
+from collections import Counter
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+from django.utils import timezone
+
+
+def log_current_stages(apps, schema_editor):
+    # Existing candidates have no history: record their current stage as
+    # entered when they applied, and treat their last update as the time
+    # they reached it
+    Candidate = apps.get_model('candidates', 'Candidate')
+    StageTransition = apps.get_model('candidates', 'StageTransition')
+    StageDailyCount = apps.get_model('candidates', 'StageDailyCount')
+    Candidate.objects.update(stage_changed_at=F('updated_at'))
+
+    transitions = []
+    daily = Counter()
+    for candidate_id, job_id, stage, created_at in Candidate.objects.values_list(
+        'id', 'job_id', 'stage', 'created_at',
+    ).iterator():
+        transitions.append(StageTransition(candidate_id=candidate_id, job_id=job_id, to_stage=stage, created_at=created_at))
+        daily[job_id, stage, timezone.localdate(created_at)] += 1
+    StageTransition.objects.bulk_create(transitions, batch_size=1000)
+    StageDailyCount.objects.bulk_create(
+        [StageDailyCount(job_id=job_id, stage=stage, day=day, entered=n) for (job_id, stage, day), n in daily.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('candidates', '0005_search_posting'),
+        ('jobs', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='candidate',
+            name='stage_changed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.CreateModel(
+            name='StageDailyCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stage', models.CharField(choices=[('new', 'New'), ('screening', 'Screening'), ('interview', 'Interview'), ('technical', 'Technical Assessment'), ('final', 'Final Interview'), ('offer', 'Offer'), ('hired', 'Hired'), ('rejected', 'Rejected')], max_length=20)),
+                ('day', models.DateField()),
+                ('entered', models.PositiveIntegerField(default=0)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stage_daily_counts', to='jobs.jobpost')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day', 'stage'], name='stagedaily_day_stage')],
+                'constraints': [models.UniqueConstraint(fields=('job', 'stage', 'day'), name='unique_stage_daily_count')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StageDurationBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stage', models.CharField(choices=[('new', 'New'), ('screening', 'Screening'), ('interview', 'Interview'), ('technical', 'Technical Assessment'), ('final', 'Final Interview'), ('offer', 'Offer'), ('hired', 'Hired'), ('rejected', 'Rejected')], max_length=20)),
+                ('bucket', models.PositiveSmallIntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stage_duration_buckets', to='jobs.jobpost')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('job', 'stage', 'bucket'), name='unique_stage_duration_bucket')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StageTransition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_stage', models.CharField(blank=True, choices=[('new', 'New'), ('screening', 'Screening'), ('interview', 'Interview'), ('technical', 'Technical Assessment'), ('final', 'Final Interview'), ('offer', 'Offer'), ('hired', 'Hired'), ('rejected', 'Rejected')], max_length=20)),
+                ('to_stage', models.CharField(choices=[('new', 'New'), ('screening', 'Screening'), ('interview', 'Interview'), ('technical', 'Technical Assessment'), ('final', 'Final Interview'), ('offer', 'Offer'), ('hired', 'Hired'), ('rejected', 'Rejected')], max_length=20)),
+                ('time_in_stage', models.DurationField(blank=True, help_text='Time spent in from_stage', null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('candidate', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stage_transitions', to='candidates.candidate')),
+                ('changed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stage_transitions', to='jobs.jobpost')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['job', 'created_at'], name='transition_job_created'), models.Index(fields=['candidate', 'created_at'], name='transition_candidate_created')],
+            },
+        ),
+        migrations.RunPython(log_current_stages, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('candidates', '0006_stage_transitions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CandidateBlockingKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('email', 'Normalised email'), ('phone', 'Phone suffix'), ('name', 'Name phonetics'), ('resume', 'Resume hash')], max_length=10)),
+                ('key', models.CharField(max_length=254)),
+                ('candidate', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='blocking_keys', to='candidates.candidate')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'key'], name='blockingkey_kind_key')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DuplicateCandidate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('reasons', models.CharField(max_length=100)),
+                ('status', models.CharField(choices=[('open', 'Open'), ('dismissed', 'Not a duplicate')], default='open', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('candidate', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='duplicate_matches', to='candidates.candidate')),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='candidates.candidate')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', '-score'], name='duplicate_status_score')],
+                'constraints': [models.UniqueConstraint(fields=('candidate', 'other'), name='unique_duplicate_pair')],
+            },
+        ),
+    ]
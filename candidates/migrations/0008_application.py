@@ -0,0 +1,122 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:22
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def create_applications(apps, schema_editor):
+    """
+    Turn each candidate's job and stage into their first application and
+    attach the stage history to it
+    """
+    Application = apps.get_model('candidates', 'Application')
+    Candidate = apps.get_model('candidates', 'Candidate')
+    StageTransition = apps.get_model('candidates', 'StageTransition')
+    rows = Candidate.objects.order_by('id').values_list('id', 'job_id', 'stage', 'stage_changed_at', 'created_at')
+    batch = []
+    for candidate_id, job_id, stage, stage_changed_at, created_at in rows.iterator(chunk_size=1000):
+        batch.append(Application(
+            candidate_id=candidate_id, job_id=job_id, stage=stage, stage_changed_at=stage_changed_at,
+            created_at=created_at,
+        ))
+        if len(batch) == 1000:
+            Application.objects.bulk_create(batch)
+            batch = []
+    Application.objects.bulk_create(batch)
+    StageTransition.objects.update(application_id=Subquery(
+        Application.objects.filter(candidate_id=OuterRef('candidate_id')).values('id')[:1]
+    ))
+
+
+def restore_candidate_jobs(apps, schema_editor):
+    """
+    Copy each candidate's first application back onto the candidate
+    """
+    Application = apps.get_model('candidates', 'Application')
+    Candidate = apps.get_model('candidates', 'Candidate')
+    unplaced = Candidate.objects.filter(applications__isnull=True).values_list('id', flat=True)[:10]
+    if unplaced:
+        raise RuntimeError(
+            "Candidates without an application cannot get a job back; add one or delete them first: "
+            + ', '.join(str(candidate_id) for candidate_id in unplaced)
+        )
+    first = Application.objects.filter(candidate_id=OuterRef('id')).order_by('created_at', 'id')
+    Candidate.objects.update(
+        job_id=Subquery(first.values('job_id')[:1]),
+        stage=Subquery(first.values('stage')[:1]),
+        stage_changed_at=Subquery(first.values('stage_changed_at')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('candidates', '0007_duplicate_detection'),
+        ('jobs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Application',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stage', models.CharField(choices=[('new', 'New'), ('screening', 'Screening'), ('interview', 'Interview'), ('technical', 'Technical Assessment'), ('final', 'Final Interview'), ('offer', 'Offer'), ('hired', 'Hired'), ('rejected', 'Rejected')], default='new', max_length=20)),
+                ('stage_changed_at', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('candidate', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='applications', to='candidates.candidate')),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='applications', to='jobs.jobpost')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='stagetransition',
+            name='application',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transitions', to='candidates.application'),
+        ),
+        migrations.AddIndex(
+            model_name='application',
+            index=models.Index(fields=['job', 'stage', 'created_at'], name='application_job_stage_created'),
+        ),
+        migrations.AddIndex(
+            model_name='application',
+            index=models.Index(fields=['stage', 'created_at'], name='application_stage_created'),
+        ),
+        migrations.AddIndex(
+            model_name='application',
+            index=models.Index(fields=['created_at', 'id'], name='application_created_id'),
+        ),
+        migrations.AddConstraint(
+            model_name='application',
+            constraint=models.UniqueConstraint(fields=('candidate', 'job'), name='unique_application'),
+        ),
+        # Nullable while the data moves, so that migrating back can add the
+        # column to existing rows before restore_candidate_jobs fills it
+        migrations.AlterField(
+            model_name='candidate',
+            name='job',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='candidates', to='jobs.jobpost'),
+        ),
+        migrations.RunPython(create_applications, restore_candidate_jobs),
+        migrations.RemoveIndex(
+            model_name='candidate',
+            name='candidate_job_stage_created',
+        ),
+        migrations.RemoveIndex(
+            model_name='candidate',
+            name='candidate_stage_created',
+        ),
+        migrations.RemoveField(
+            model_name='candidate',
+            name='job',
+        ),
+        migrations.RemoveField(
+            model_name='candidate',
+            name='stage',
+        ),
+        migrations.RemoveField(
+            model_name='candidate',
+            name='stage_changed_at',
+        ),
+    ]
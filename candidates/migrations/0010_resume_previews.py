@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('candidates', '0009_resume_upload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='candidate',
+            name='resume_preview',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='candidate',
+            name='resume_thumbnail',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+    ]
@@ -1,16 +1,83 @@
 # candidates/models.py
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 from jobs.models import JobPost
+from .parsing import content_hash
 import uuid
 import os
 
+def sharded_resume_name(key, extension):
+    """
+    resumes/ab/cd/abcd....ext: two levels of 256 subdirectories keep each
+    directory small however many resumes are stored
+    """
+    return os.path.join('resumes', key[:2], key[2:4], f"{key}.{extension.lower()}")
+
 def resume_file_path(instance, filename):
-    # Generate a unique filename for uploaded resumes
+    # Name uploads after their content hash (Candidate.save computes it
+    # first), falling back to a random name
     ext = filename.split('.')[-1]
-    filename = f"{uuid.uuid4()}.{ext}"
-    return os.path.join('resumes', filename)
+    return sharded_resume_name(instance.resume_hash or uuid.uuid4().hex, ext)
 
 class Candidate(models.Model):
+    """
+    A person. Their applications to individual jobs, and where each one is in
+    that job's pipeline, are Application rows.
+    """
+    first_name = models.CharField(max_length=100)
+    last_name = models.CharField(max_length=100)
+    email = models.EmailField(unique=True)
+    phone = models.CharField(max_length=20, blank=True)
+    resume = models.FileField(upload_to=resume_file_path)
+    resume_hash = models.CharField(max_length=64, blank=True, db_index=True, editable=False)
+    # Filled in by the resume worker, see candidates.previews
+    resume_thumbnail = models.CharField(max_length=255, blank=True, editable=False)
+    resume_preview = models.TextField(blank=True, editable=False)
+    cover_letter = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='candidate_created_id'),
+        ]
+    
+    def __str__(self):
+        return f"{self.first_name} {self.last_name}"
+    
+    def save(self, *args, **kwargs):
+        # Hash new uploads before they are written, so they are stored under
+        # their hash and identical files are recognised. A file that is
+        # already stored is only hashed when the candidate is created; those
+        # of existing candidates, such as imported ones, are left to the
+        # resume worker rather than read again on every save.
+        uploaded = self.resume and not self.resume._committed
+        if uploaded:
+            # Previews of the previous file no longer apply
+            self.resume_thumbnail = ''
+            self.resume_preview = ''
+        if uploaded or (self.resume and self._state.adding and not self.resume_hash):
+            try:
+                self.resume_hash = content_hash(self.resume.chunks())
+            except OSError:
+                self.resume_hash = ''
+            finally:
+                if self.resume._committed:
+                    self.resume.close()
+        if uploaded and self.resume_hash:
+            name = self.resume.field.generate_filename(self, self.resume.name)
+            if self.resume.storage.exists(name):
+                # The same file is already stored: point at it, and share its
+                # thumbnail, rather than store a copy under a suffixed name
+                self.resume = name
+        super().save(*args, **kwargs)
+
+class Application(models.Model):
+    """
+    A candidate's application to one job and its stage in that job's
+    pipeline. Change stages with candidates.pipeline.change_stage().
+    """
     STAGE_CHOICES = [
         ('new', 'New'),
         ('screening', 'Screening'),
@@ -22,19 +89,27 @@ class Candidate(models.Model):
         ('rejected', 'Rejected'),
     ]
     
-    first_name = models.CharField(max_length=100)
-    last_name = models.CharField(max_length=100)
-    email = models.EmailField(unique=True)
-    phone = models.CharField(max_length=20, blank=True)
-    resume = models.FileField(upload_to=resume_file_path)
-    cover_letter = models.TextField(blank=True)
-    job = models.ForeignKey(JobPost, on_delete=models.CASCADE, related_name='candidates')
+    candidate = models.ForeignKey(Candidate, on_delete=models.CASCADE, related_name='applications')
+    job = models.ForeignKey(JobPost, on_delete=models.CASCADE, related_name='applications')
     stage = models.CharField(max_length=20, choices=STAGE_CHOICES, default='new')
-    created_at = models.DateTimeField(auto_now_add=True)
+    stage_changed_at = models.DateTimeField(default=timezone.now, editable=False)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['candidate', 'job'], name='unique_application'),
+        ]
+        indexes = [
+            # Keyset pagination of the application list, with and without
+            # filters, and the per-job pipeline
+            models.Index(fields=['job', 'stage', 'created_at'], name='application_job_stage_created'),
+            models.Index(fields=['stage', 'created_at'], name='application_stage_created'),
+            models.Index(fields=['created_at', 'id'], name='application_created_id'),
+        ]
+    
     def __str__(self):
-        return f"{self.first_name} {self.last_name}"
+        return f"{self.candidate} for {self.job}"
 
 class CandidateSkill(models.Model):
     candidate = models.ForeignKey(Candidate, on_delete=models.CASCADE, related_name='skills')
@@ -64,4 +139,241 @@ class CandidateWorkExperience(models.Model):
     description = models.TextField(blank=True)
     
     def __str__(self):
-        return f"{self.position} at {self.company}"
\ No newline at end of file
+        return f"{self.position} at {self.company}"
+
+class ResumeParseJob(models.Model):
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    candidate = models.ForeignKey(Candidate, on_delete=models.CASCADE, related_name='parse_jobs')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='parsejob_status_created'),
+        ]
+    
+    def __str__(self):
+        return f"Resume parse for {self.candidate} ({self.status})"
+
+
+class ResumeUpload(models.Model):
+    """
+    A resume being uploaded in chunks (see candidates.uploads). The bytes
+    received so far live in a part file under MEDIA_ROOT/uploads/; once all
+    `size` bytes are in, the file moves to its sharded place under resumes/
+    and `stored_name` is set.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='resume_uploads')
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    received = models.PositiveBigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True)
+    stored_name = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at'], name='resumeupload_updated'),
+        ]
+
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size} bytes)"
+
+    @property
+    def complete(self):
+        return self.completed_at is not None
+
+
+class ResumeParseCache(models.Model):
+    """
+    Parsed text and entities for a resume file, keyed by its content hash and
+    the parser version that produced them
+    """
+    content_hash = models.CharField(max_length=64)
+    parser_version = models.CharField(max_length=20)
+    text = models.TextField(blank=True)
+    entities = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['content_hash', 'parser_version'], name='unique_parse_cache_entry'),
+        ]
+    
+    def __str__(self):
+        return f"{self.content_hash[:12]} (parser v{self.parser_version})"
+    
+    def as_result(self):
+        return {'text': self.text, 'parser_version': self.parser_version, **self.entities}
+
+class SearchPosting(models.Model):
+    """
+    One entry of the candidate full-text index: a term and its precomputed
+    BM25 weight in a candidate's cover letter, resume text, notes and skills
+    """
+    candidate = models.ForeignKey(Candidate, on_delete=models.CASCADE, related_name='search_postings')
+    term = models.CharField(max_length=64)
+    weight = models.FloatField()
+    
+    class Meta:
+        indexes = [
+            # Serves "top postings for a term" straight from the index
+            models.Index(fields=['term', '-weight'], name='searchposting_term_weight'),
+        ]
+    
+    def __str__(self):
+        return f"{self.term} -> {self.candidate_id} ({self.weight:.3f})"
+
+
+class MatchIndexChange(models.Model):
+    """
+    A change set for the match index, read by every process that holds one
+    (see candidates.matching): the ids of candidates whose skills or work
+    history changed, or none when every row has to be rebuilt
+    """
+    candidate_ids = models.JSONField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        if self.candidate_ids is None:
+            return f"#{self.id}: rebuild"
+        return f"#{self.id}: {len(self.candidate_ids)} candidates"
+
+
+class StageTransition(models.Model):
+    """
+    Append-only log of an application entering a pipeline stage. The first
+    entry of each application has an empty from_stage. Use
+    candidates.pipeline to change stages so the log and the rollup tables
+    stay in step.
+    """
+    candidate = models.ForeignKey(
+        Candidate, on_delete=models.SET_NULL, null=True, related_name='stage_transitions',
+    )
+    application = models.ForeignKey(
+        Application, on_delete=models.SET_NULL, null=True, blank=True, related_name='transitions',
+    )
+    job = models.ForeignKey(JobPost, on_delete=models.CASCADE, related_name='stage_transitions')
+    from_stage = models.CharField(max_length=20, choices=Application.STAGE_CHOICES, blank=True)
+    to_stage = models.CharField(max_length=20, choices=Application.STAGE_CHOICES)
+    time_in_stage = models.DurationField(null=True, blank=True, help_text="Time spent in from_stage")
+    changed_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['job', 'created_at'], name='transition_job_created'),
+            models.Index(fields=['candidate', 'created_at'], name='transition_candidate_created'),
+        ]
+    
+    def __str__(self):
+        return f"{self.candidate_id}: {self.from_stage or '-'} -> {self.to_stage}"
+
+
+class StageDailyCount(models.Model):
+    """
+    Rollup of StageTransition: how many candidates of a job entered a stage on
+    a given day
+    """
+    job = models.ForeignKey(JobPost, on_delete=models.CASCADE, related_name='stage_daily_counts')
+    stage = models.CharField(max_length=20, choices=Application.STAGE_CHOICES)
+    day = models.DateField()
+    entered = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'stage', 'day'], name='unique_stage_daily_count'),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'stage'], name='stagedaily_day_stage'),
+        ]
+    
+    def __str__(self):
+        return f"{self.job_id}/{self.stage}/{self.day}: {self.entered}"
+
+
+class StageDurationBucket(models.Model):
+    """
+    Rollup of StageTransition: a histogram of how long candidates of a job
+    spent in a stage before leaving it, in logarithmic buckets (see
+    candidates.pipeline.DURATION_BUCKET_HOURS)
+    """
+    job = models.ForeignKey(JobPost, on_delete=models.CASCADE, related_name='stage_duration_buckets')
+    stage = models.CharField(max_length=20, choices=Application.STAGE_CHOICES)
+    bucket = models.PositiveSmallIntegerField()
+    count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'stage', 'bucket'], name='unique_stage_duration_bucket'),
+        ]
+    
+    def __str__(self):
+        return f"{self.job_id}/{self.stage}/bucket {self.bucket}: {self.count}"
+
+
+class CandidateBlockingKey(models.Model):
+    """
+    A blocking key of a candidate for duplicate detection. Candidates that
+    share a key are compared; everyone else is never looked at.
+    """
+    KIND_CHOICES = [
+        ('email', 'Normalised email'),
+        ('phone', 'Phone suffix'),
+        ('name', 'Name phonetics'),
+        ('resume', 'Resume hash'),
+    ]
+
+    candidate = models.ForeignKey(Candidate, on_delete=models.CASCADE, related_name='blocking_keys')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    key = models.CharField(max_length=254)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'key'], name='blockingkey_kind_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}:{self.key} -> {self.candidate_id}"
+
+
+class DuplicateCandidate(models.Model):
+    """
+    A pair of candidates that probably belong to the same person, stored
+    with the lower id first
+    """
+    STATUS_CHOICES = [
+        ('open', 'Open'),
+        ('dismissed', 'Not a duplicate'),
+    ]
+
+    candidate = models.ForeignKey(Candidate, on_delete=models.CASCADE, related_name='duplicate_matches')
+    other = models.ForeignKey(Candidate, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    reasons = models.CharField(max_length=100)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='open')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['candidate', 'other'], name='unique_duplicate_pair'),
+        ]
+        indexes = [
+            models.Index(fields=['status', '-score'], name='duplicate_status_score'),
+        ]
+
+    def __str__(self):
+        return f"{self.candidate_id} ~ {self.other_id} ({self.score:.2f})"
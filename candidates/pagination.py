@@ -0,0 +1,99 @@
+# candidates/pagination.py
+import base64
+import binascii
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+def encode_cursor(obj):
+    """
+    Encode the (created_at, id) position of a row as an opaque URL-safe token
+    """
+    raw = f"{obj.created_at.isoformat()}|{obj.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """
+    Decode a cursor produced by encode_cursor, returning (created_at, id) or None
+    """
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        timestamp, pk = raw.rsplit('|', 1)
+        created_at = parse_datetime(timestamp)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if created_at is None:
+        return None
+    return created_at, pk
+
+
+class KeysetPage:
+    """
+    One page of a keyset-paginated queryset, newest rows first
+    """
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def paginate_keyset(queryset, after=None, before=None, per_page=25):
+    """
+    Return a KeysetPage of `queryset` ordered by (-created_at, -id).
+
+    Instead of an OFFSET, each page seeks directly to the rows on either side
+    of a cursor, so fetching a deep page costs the same as fetching the first
+    one as long as the filter columns and created_at are covered by an index.
+    """
+    after = decode_cursor(after)
+    before = decode_cursor(before) if after is None else None
+
+    if before is not None:
+        created_at, pk = before
+        rows = list(
+            queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk))
+            .order_by('created_at', 'pk')[:per_page + 1]
+        )
+        has_previous = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        has_next = True
+    else:
+        if after is not None:
+            created_at, pk = after
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+        rows = list(queryset.order_by('-created_at', '-pk')[:per_page + 1])
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        has_previous = after is not None
+
+    if not rows:
+        return KeysetPage([])
+    return KeysetPage(
+        rows,
+        next_cursor=encode_cursor(rows[-1]) if has_next else None,
+        previous_cursor=encode_cursor(rows[0]) if has_previous else None,
+    )
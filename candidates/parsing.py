@@ -0,0 +1,298 @@
+# candidates/parsing.py
+"""
+Resume text extraction and entity detection.
+
+Everything in this module is plain Python with no database access, so it can
+run inside worker processes (see candidates.tasks). Results are returned as
+JSON-serialisable dicts with ISO formatted dates.
+"""
+import hashlib
+import re
+import zipfile
+from datetime import date
+from pathlib import Path
+from xml.etree import ElementTree
+
+# Bump whenever extraction or detection changes in a way that should cause
+# previously parsed resumes to be parsed again.
+PARSER_VERSION = '1'
+
+SKILL_VOCABULARY = [
+    'Python', 'Django', 'Flask', 'FastAPI', 'Java', 'Spring', 'Kotlin', 'Scala', 'Go', 'Rust',
+    'C', 'C++', 'C#', '.NET', 'Ruby', 'Rails', 'PHP', 'Laravel', 'Perl', 'Swift', 'Objective-C',
+    'JavaScript', 'TypeScript', 'Node.js', 'React', 'Angular', 'Vue', 'Svelte', 'HTML', 'CSS',
+    'Sass', 'jQuery', 'Bootstrap', 'GraphQL', 'REST', 'SQL', 'PostgreSQL', 'MySQL', 'SQLite',
+    'Oracle', 'MongoDB', 'Redis', 'Elasticsearch', 'Cassandra', 'Kafka', 'RabbitMQ', 'Celery',
+    'Spark', 'Hadoop', 'Airflow', 'Pandas', 'NumPy', 'SciPy', 'scikit-learn', 'TensorFlow',
+    'PyTorch', 'Keras', 'Machine Learning', 'Deep Learning', 'NLP', 'Computer Vision',
+    'Data Analysis', 'Statistics', 'R', 'MATLAB', 'Tableau', 'Power BI', 'Excel', 'AWS', 'Azure',
+    'GCP', 'Docker', 'Kubernetes', 'Terraform', 'Ansible', 'Jenkins', 'CI/CD', 'Git', 'Linux',
+    'Bash', 'Agile', 'Scrum', 'Jira', 'Figma', 'Photoshop', 'Selenium', 'Cypress', 'Android', 'iOS',
+    'Project Management', 'Product Management', 'Salesforce', 'SAP', 'Accounting', 'Marketing',
+    'SEO', 'Communication', 'Leadership',
+]
+
+DEGREE_PATTERN = re.compile(
+    r"\b(ph\.?\s?d|doctor(?:ate)? of [a-z ]+|m\.?b\.?a|master(?:'s)?(?: of [a-z ]+)?|"
+    r"bachelor(?:'s)?(?: of [a-z ]+)?|associate(?:'s)? degree|b\.?\s?sc|m\.?\s?sc|b\.?\s?tech|"
+    r"m\.?\s?tech|b\.?\s?e|m\.?\s?e|b\.?a|m\.?a|b\.?s|m\.?s|diploma)\b\.?",
+    re.IGNORECASE,
+)
+INSTITUTION_PATTERN = re.compile(
+    r"([A-Z][\w&.'-]*(?:\s+(?:of|and|for|the|[A-Z][\w&.'-]*))*\s+"
+    r"(?:University|College|Institute|School|Academy|Polytechnic)"
+    r"(?:\s+of(?:\s+[A-Z][\w&.'-]*)+)?"
+    r"|(?:University|College|Institute|School|Academy)\s+of(?:\s+[A-Z][\w&.'-]*)+)"
+)
+FIELD_PATTERN = re.compile(r"\b(?:in|of)\s+([A-Z][A-Za-z&]*(?:\s+[A-Z][A-Za-z&]*)*)")
+
+MONTHS = {
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12,
+}
+_MONTH = r"(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?"
+_POINT = rf"(?:{_MONTH}\s+\d{{4}}|\d{{1,2}}/\d{{4}}|\d{{4}})"
+DATE_RANGE_PATTERN = re.compile(
+    rf"(?P<start>{_POINT})\s*(?:-|–|—|to|until)\s*(?P<end>{_POINT}|present|current|now|today)",
+    re.IGNORECASE,
+)
+SINGLE_YEAR_PATTERN = re.compile(r"\b(19[5-9]\d|20\d\d)\b")
+YEARS_PATTERN = re.compile(r"(\d{1,2})\+?\s*(?:years?|yrs?)\b", re.IGNORECASE)
+PARENTHETICAL = re.compile(r"\([^)]*\)")
+ROLE_SEPARATOR = re.compile(r"\s+(?:at|@)\s+|\s*[|,]\s*|\s+[-–—]\s+")
+
+
+class ResumeParseError(Exception):
+    """Raised when a resume cannot be read or converted to text."""
+
+
+def content_hash(chunks):
+    """
+    Return the SHA-256 hex digest of an iterable of byte chunks
+    """
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def extract_text(path):
+    """
+    Return the plain text of a PDF, DOCX or text resume
+    """
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix == '.pdf':
+        return _extract_pdf_text(path)
+    if suffix == '.docx':
+        return _extract_docx_text(path)
+    if suffix in ('.txt', '.md'):
+        return path.read_text(errors='ignore')
+    raise ResumeParseError(f"Unsupported resume format: {suffix or 'no extension'}")
+
+
+def _extract_pdf_text(path):
+    try:
+        from pypdf import PdfReader
+        from pypdf.errors import PdfReadError
+    except ImportError as exc:
+        raise ResumeParseError("PDF parsing requires the 'pypdf' package") from exc
+    try:
+        reader = PdfReader(str(path))
+        return '\n'.join(page.extract_text() or '' for page in reader.pages)
+    except (PdfReadError, OSError, ValueError) as exc:
+        raise ResumeParseError(f"Could not read PDF: {exc}") from exc
+
+
+def _extract_docx_text(path):
+    # A .docx file is a zip archive; the body text lives in word/document.xml
+    # as <w:t> runs grouped into <w:p> paragraphs.
+    namespace = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+    try:
+        with zipfile.ZipFile(path) as archive:
+            root = ElementTree.fromstring(archive.read('word/document.xml'))
+    except (zipfile.BadZipFile, KeyError, ElementTree.ParseError, OSError) as exc:
+        raise ResumeParseError(f"Could not read DOCX: {exc}") from exc
+    paragraphs = []
+    for paragraph in root.iter(f'{namespace}p'):
+        paragraphs.append(''.join(node.text or '' for node in paragraph.iter(f'{namespace}t')))
+    return '\n'.join(paragraphs)
+
+
+SKILL_ALIASES = {
+    'HTML5': 'HTML', 'CSS3': 'CSS', 'React.js': 'React', 'ReactJS': 'React', 'Vue.js': 'Vue',
+    'AngularJS': 'Angular', 'NodeJS': 'Node.js', 'Golang': 'Go', 'Postgres': 'PostgreSQL',
+    'K8s': 'Kubernetes', 'sklearn': 'scikit-learn', 'Amazon Web Services': 'AWS',
+    'Google Cloud': 'GCP', 'Ruby on Rails': 'Rails',
+}
+
+
+def _build_skill_pattern():
+    alternatives = sorted([*SKILL_VOCABULARY, *SKILL_ALIASES], key=len, reverse=True)
+    body = '|'.join(re.escape(skill) for skill in alternatives)
+    return re.compile(rf"(?<![\w+#.])({body})(?![\w+#])", re.IGNORECASE)
+
+
+SKILL_PATTERN = _build_skill_pattern()
+CANONICAL_SKILLS = {skill.lower(): skill for skill in SKILL_VOCABULARY}
+CANONICAL_SKILLS.update({alias.lower(): skill for alias, skill in SKILL_ALIASES.items()})
+SECTION_HEADINGS = {
+    'experience', 'work experience', 'employment', 'employment history', 'education',
+    'skills', 'summary', 'projects', 'certifications', 'languages', 'interests',
+}
+
+
+def detect_skills(text):
+    """
+    Return [{'skill', 'years_experience'}] for vocabulary skills found in the text.
+    Years are taken from an "N years" phrase on the same line, if any.
+    """
+    found = {}
+    for line in text.splitlines():
+        matches = SKILL_PATTERN.findall(line)
+        if not matches:
+            continue
+        years = [int(value) for value in YEARS_PATTERN.findall(line)]
+        line_years = max(years) if years else 0
+        for match in matches:
+            skill = CANONICAL_SKILLS[match.lower()]
+            # Short names like "C", "R" or "Go" only count when capitalised as listed
+            if len(match) <= 2 and match != skill:
+                continue
+            found[skill] = max(found.get(skill, 0), line_years)
+    return [{'skill': skill, 'years_experience': years} for skill, years in found.items()]
+
+
+def _parse_point(value, end=False):
+    value = value.strip().lower().rstrip('.')
+    if value in ('present', 'current', 'now', 'today'):
+        return None
+    if '/' in value:
+        month, year = value.split('/')
+        return date(int(year), max(1, min(int(month), 12)), 1)
+    parts = value.split()
+    if len(parts) == 2:
+        return date(int(parts[1]), MONTHS.get(parts[0][:3], 1), 1)
+    return date(int(value), 12 if end else 1, 1)
+
+
+def _date_range(line):
+    match = DATE_RANGE_PATTERN.search(line)
+    if match:
+        try:
+            return _parse_point(match.group('start')), _parse_point(match.group('end'), end=True), match
+        except ValueError:
+            return None
+    return None
+
+
+def detect_education(text):
+    """
+    Return [{'institution', 'degree', 'field_of_study', 'from_date', 'to_date'}]
+    for lines (or adjacent line pairs) naming both a degree and an institution
+    """
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    entries = []
+    seen = set()
+    for i, line in enumerate(lines):
+        degree_match = DEGREE_PATTERN.search(line)
+        if not degree_match:
+            continue
+        # The institution is usually on the degree line, otherwise on the
+        # line just after or before it unless that line names its own degree
+        neighbours = [lines[j] for j in (i + 1, i - 1) if 0 <= j < len(lines)]
+        institution_match = None
+        window = line
+        for source in [line] + [other for other in neighbours if not DEGREE_PATTERN.search(other)]:
+            institution_match = INSTITUTION_PATTERN.search(source)
+            if institution_match:
+                window = line if source is line else f'{line} {source}'
+                break
+        if not institution_match:
+            continue
+        institution = institution_match.group(0).strip()
+
+        degree = degree_match.group(0).strip()
+        field = ''
+        if ' in ' in degree:
+            degree, field = (part.strip() for part in degree.split(' in ', 1))
+        else:
+            field_match = FIELD_PATTERN.search(line[degree_match.end():])
+            if field_match and field_match.group(1) not in institution:
+                field = field_match.group(1).strip()
+        if (degree.lower(), institution.lower()) in seen:
+            continue
+        seen.add((degree.lower(), institution.lower()))
+
+        dates = _date_range(window)
+        if dates:
+            from_date, to_date = dates[0], dates[1]
+        else:
+            years = SINGLE_YEAR_PATTERN.findall(window)
+            if not years:
+                continue
+            from_date = to_date = date(int(years[0]), 1, 1)
+        entries.append({
+            'institution': institution[:200],
+            'degree': degree[:200],
+            'field_of_study': field[:200],
+            'from_date': from_date.isoformat(),
+            'to_date': to_date.isoformat() if to_date else None,
+        })
+    return entries
+
+
+def detect_work_experience(text):
+    """
+    Return [{'company', 'position', 'from_date', 'to_date', 'description'}] for
+    lines carrying a date range, reading "Position at Company" style headings
+    from the same or the preceding line and the following lines as description
+    """
+    lines = [line.strip() for line in text.splitlines()]
+    entries = []
+    for i, line in enumerate(lines):
+        dates = _date_range(line)
+        if not dates or DEGREE_PATTERN.search(line):
+            continue
+        from_date, to_date, match = dates
+        heading = PARENTHETICAL.sub('', line[:match.start()] + ' ' + line[match.end():]).strip(' ,|-–—')
+        if not heading and i > 0:
+            heading = lines[i - 1].strip(' ,|-–—')
+        parts = [part.strip() for part in ROLE_SEPARATOR.split(heading, maxsplit=1) if part.strip()]
+        if len(parts) == 2:
+            position, company = parts
+        elif len(parts) == 1 and i > 1 and lines[i - 2] and lines[i - 2].lower() not in SECTION_HEADINGS:
+            # LinkedIn style: company, then title, then the dates on their own lines
+            position, company = parts[0], lines[i - 2]
+        else:
+            continue
+
+        description = []
+        for follow in lines[i + 1:i + 6]:
+            if not follow or _date_range(follow) or follow.lower().rstrip(':') in SECTION_HEADINGS:
+                break
+            description.append(follow.lstrip('•*- '))
+        entries.append({
+            'company': company[:200],
+            'position': position[:200],
+            'from_date': from_date.isoformat(),
+            'to_date': to_date.isoformat() if to_date else None,
+            'description': '\n'.join(description),
+        })
+    return entries
+
+
+def extract_entities(text):
+    return {
+        'skills': detect_skills(text),
+        'education': detect_education(text),
+        'work_experience': detect_work_experience(text),
+    }
+
+
+def parse_resume_file(path):
+    """
+    Extract text and entities from a resume file. Safe to call in a subprocess.
+    """
+    text = extract_text(path)
+    return {'text': text, 'parser_version': PARSER_VERSION, **extract_entities(text)}
@@ -0,0 +1,349 @@
+# candidates/pipeline.py
+"""
+Pipeline stage changes and the analytics rollups they maintain.
+
+Stages belong to applications. Every stage change goes through
+change_stage(), which appends a StageTransition row and, in the same
+transaction, increments two rollup tables: StageDailyCount (candidates
+entering each stage of a job per day) and StageDurationBucket (a histogram
+of time spent in each stage). The pipeline dashboard reads only the
+rollups, so its cost depends on the number of jobs, stages and days shown
+rather than on the number of candidates.
+
+The same transaction also moves the applicant counters on JobPost (the total
+and one column per stage), and deleting an application decrements them, so
+the job board shows live funnel numbers without aggregate queries.
+reconcile_job_counters() recounts them from the applications if they ever
+drift. These writes bypass signals, so they move the cache stamps of the
+job board and of the jobs and candidates involved themselves.
+"""
+from bisect import bisect_right
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Case, Count, F, Sum, Value, When
+from django.utils import timezone
+
+from ats_project.caching import JOB_BOARD, candidate_stamp, job_stamp, touch
+from jobs.models import JobPost
+from .exporting import chunked
+from .models import Application, StageDailyCount, StageDurationBucket, StageTransition
+
+# Upper edges, in hours, of the time-in-stage histogram buckets. The last
+# bucket is open-ended.
+DURATION_BUCKET_HOURS = [1, 4, 12, 24, 48, 72, 24 * 7, 24 * 14, 24 * 30, 24 * 60, 24 * 90, 24 * 180]
+# Applications moved per statement by bulk_change_stage()
+BULK_CHUNK_SIZE = 1000
+# Rollup rows or jobs per counter statement, well inside SQLite's limit on
+# query parameters
+COUNTER_CHUNK_SIZE = 200
+
+
+def duration_bucket(duration):
+    """
+    Index of the histogram bucket a time-in-stage falls into
+    """
+    return bisect_right(DURATION_BUCKET_HOURS, duration / timedelta(hours=1))
+
+
+def counter_field(stage):
+    """
+    The JobPost column counting a job's applications in `stage`
+    """
+    return f'{stage}_count'
+
+
+def record_stage_entries(applications, user=None):
+    """
+    Log the initial stage of newly created applications
+    """
+    transitions = [
+        StageTransition(
+            candidate_id=application.candidate_id, application_id=application.id, job_id=application.job_id,
+            to_stage=application.stage, changed_by=user, created_at=application.stage_changed_at,
+        )
+        for application in applications
+    ]
+    with transaction.atomic():
+        StageTransition.objects.bulk_create(transitions)
+        _update_rollups(transitions)
+    return transitions
+
+
+def change_stage(application_ids, to_stage, user=None):
+    """
+    Move applications to `to_stage`, logging each transition and updating
+    the rollups. Applications already in that stage are left alone. Returns
+    the list of StageTransition rows written.
+    """
+    if to_stage not in dict(Application.STAGE_CHOICES):
+        raise ValueError(f"Unknown stage: {to_stage!r}")
+    now = timezone.now()
+    with transaction.atomic():
+        moving = list(
+            Application.objects.select_for_update()
+            .filter(id__in=application_ids).exclude(stage=to_stage)
+            .only('id', 'candidate_id', 'job_id', 'stage', 'stage_changed_at')
+        )
+        if not moving:
+            return []
+        transitions = [
+            StageTransition(
+                candidate_id=application.candidate_id, application_id=application.id,
+                job_id=application.job_id, from_stage=application.stage, to_stage=to_stage,
+                time_in_stage=max(now - application.stage_changed_at, timedelta(0)),
+                changed_by=user, created_at=now,
+            )
+            for application in moving
+        ]
+        Application.objects.filter(id__in=[application.id for application in moving]).update(
+            stage=to_stage, stage_changed_at=now, updated_at=now,
+        )
+        StageTransition.objects.bulk_create(transitions)
+        _update_rollups(transitions)
+    return transitions
+
+
+@transaction.atomic
+def bulk_change_stage(applications, to_stage, user=None, chunk_size=BULK_CHUNK_SIZE):
+    """
+    change_stage() for every application in the `applications` queryset,
+    however many there are, in one transaction. Applications are moved
+    `chunk_size` at a time, so each chunk costs one UPDATE and one INSERT
+    of transitions whatever its size, and no statement outgrows the
+    database's limit on query parameters. Returns the transitions written.
+    """
+    application_ids = list(applications.order_by('id').values_list('id', flat=True))
+    transitions = []
+    for chunk in chunked(application_ids, chunk_size):
+        transitions += change_stage(chunk, to_stage, user)
+    return transitions
+
+
+def _update_rollups(transitions):
+    entered = Counter(
+        (transition.job_id, transition.to_stage, timezone.localdate(transition.created_at))
+        for transition in transitions
+    )
+    _increment(StageDailyCount, 'entered', [
+        ({'job_id': job_id, 'stage': stage, 'day': day}, count)
+        for (job_id, stage, day), count in entered.items()
+    ])
+
+    durations = Counter(
+        (transition.job_id, transition.from_stage, duration_bucket(transition.time_in_stage))
+        for transition in transitions if transition.time_in_stage is not None
+    )
+    _increment(StageDurationBucket, 'count', [
+        ({'job_id': job_id, 'stage': stage, 'bucket': bucket}, count)
+        for (job_id, stage, bucket), count in durations.items()
+    ])
+
+    counters = defaultdict(Counter)
+    for transition in transitions:
+        if transition.from_stage:
+            counters[transition.job_id][counter_field(transition.from_stage)] -= 1
+        else:
+            counters[transition.job_id]['applicant_count'] += 1
+        counters[transition.job_id][counter_field(transition.to_stage)] += 1
+    _adjust_job_counters(counters)
+    _touch_pages(transitions)
+
+
+def _adjust_job_counters(counters):
+    """
+    Apply {job_id: {counter field: delta}} with one UPDATE per
+    COUNTER_CHUNK_SIZE jobs, moving each column by a CASE over the job ids
+    """
+    job_ids = sorted(job_id for job_id, deltas in counters.items() if any(deltas.values()))
+    for chunk in chunked(job_ids, COUNTER_CHUNK_SIZE):
+        fields = sorted({field for job_id in chunk for field, delta in counters[job_id].items() if delta})
+        JobPost.objects.filter(id__in=chunk).update(**{
+            field: F(field) + Case(
+                *(
+                    When(id=job_id, then=Value(counters[job_id][field]))
+                    for job_id in chunk if counters[job_id][field]
+                ),
+                default=Value(0),
+            )
+            for field in fields
+        })
+
+
+def remove_from_job_counters(applications):
+    """
+    Take deleted applications out of their jobs' counters
+    """
+    counters = defaultdict(Counter)
+    for application in applications:
+        counters[application.job_id]['applicant_count'] -= 1
+        counters[application.job_id][counter_field(application.stage)] -= 1
+    _adjust_job_counters(counters)
+    _touch_pages(applications)
+
+
+def _touch_pages(rows):
+    """
+    Move the cache stamps of the job board and of the jobs and candidates of
+    changed applications or their transitions
+    """
+    touch(
+        JOB_BOARD,
+        *{job_stamp(row.job_id) for row in rows},
+        *{candidate_stamp(row.candidate_id) for row in rows},
+    )
+
+
+def _increment(model, field, amounts):
+    """
+    Add to counter rows given as [(lookup, amount)] with one upsert per
+    COUNTER_CHUNK_SIZE rows: missing rows are inserted holding their amount
+    and existing ones have it added in the same statement, so a concurrent
+    writer can neither make the insert fail nor lose an increment. Django's
+    bulk_create() can only overwrite on conflict, hence the SQL, which
+    SQLite (3.24+) and PostgreSQL both accept.
+    """
+    if not amounts:
+        return
+    quote = connection.ops.quote_name
+    lookup_fields = [model._meta.get_field(name) for name in amounts[0][0]]
+    table = quote(model._meta.db_table)
+    counter = quote(model._meta.get_field(field).column)
+    columns = ', '.join(quote(lookup_field.column) for lookup_field in lookup_fields)
+    row = f"({', '.join(['%s'] * (len(lookup_fields) + 1))})"
+    # Rows in key order, so concurrent writers lock them in the same order
+    amounts = sorted(amounts, key=lambda entry: [str(value) for value in entry[0].values()])
+    with connection.cursor() as cursor:
+        for chunk in chunked(amounts, COUNTER_CHUNK_SIZE):
+            params = []
+            for lookup, amount in chunk:
+                params += [
+                    lookup_field.get_db_prep_value(lookup[lookup_field.attname], connection)
+                    for lookup_field in lookup_fields
+                ]
+                params.append(amount)
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}, {counter}) VALUES {', '.join([row] * len(chunk))} "
+                f"ON CONFLICT ({columns}) DO UPDATE SET {counter} = {table}.{counter} + excluded.{counter}",
+                params,
+            )
+
+
+@transaction.atomic
+def rebuild_rollups():
+    """
+    Recompute both rollup tables from the transition log
+    """
+    StageDailyCount.objects.all().delete()
+    StageDurationBucket.objects.all().delete()
+    daily = Counter()
+    durations = Counter()
+    for job_id, from_stage, to_stage, time_in_stage, created_at in StageTransition.objects.values_list(
+        'job_id', 'from_stage', 'to_stage', 'time_in_stage', 'created_at',
+    ).iterator(chunk_size=5000):
+        daily[job_id, to_stage, timezone.localdate(created_at)] += 1
+        if time_in_stage is not None:
+            durations[job_id, from_stage, duration_bucket(time_in_stage)] += 1
+    StageDailyCount.objects.bulk_create(
+        [StageDailyCount(job_id=job_id, stage=stage, day=day, entered=n)
+         for (job_id, stage, day), n in daily.items()],
+        batch_size=1000,
+    )
+    StageDurationBucket.objects.bulk_create(
+        [StageDurationBucket(job_id=job_id, stage=stage, bucket=bucket, count=n)
+         for (job_id, stage, bucket), n in durations.items()],
+        batch_size=1000,
+    )
+    return len(daily), len(durations)
+
+
+def reconcile_job_counters(chunk_size=500, progress=None):
+    """
+    Recount every job's applicant counters from the applications and fix
+    the ones that drifted. Each chunk of jobs is locked while it is
+    recounted, so stage changes running at the same time are neither lost
+    nor counted twice. Returns the number of jobs corrected.
+    """
+    fields = ['applicant_count'] + [counter_field(stage) for stage, _ in Application.STAGE_CHOICES]
+    corrected = 0
+    checked = 0
+    for chunk in chunked(JobPost.objects.order_by('id').values_list('id', flat=True), chunk_size):
+        with transaction.atomic():
+            jobs = list(
+                JobPost.objects.select_for_update().filter(id__in=chunk).order_by('id').only('id', *fields)
+            )
+            counts = defaultdict(Counter)
+            per_stage = Application.objects.filter(job_id__in=chunk).values('job_id', 'stage').annotate(
+                n=Count('id'),
+            )
+            for job_id, stage, n in per_stage.values_list('job_id', 'stage', 'n'):
+                counts[job_id]['applicant_count'] += n
+                counts[job_id][counter_field(stage)] += n
+            drifted = []
+            for job in jobs:
+                if any(getattr(job, field) != counts[job.id][field] for field in fields):
+                    for field in fields:
+                        setattr(job, field, counts[job.id][field])
+                    drifted.append(job)
+            JobPost.objects.bulk_update(drifted, fields)
+            if drifted:
+                touch(JOB_BOARD, *(job_stamp(job.id) for job in drifted))
+        corrected += len(drifted)
+        checked += len(jobs)
+        if progress:
+            progress(checked, corrected)
+    return corrected
+
+
+def histogram_percentile(counts, percentile):
+    """
+    Estimate a percentile, in hours, from {bucket: count} by interpolating
+    linearly inside the bucket that contains it. Returns None for an empty
+    histogram; values in the open-ended last bucket are reported as its
+    lower edge.
+    """
+    total = sum(counts.values())
+    if not total:
+        return None
+    target = total * percentile / 100
+    seen = 0
+    for bucket in sorted(counts):
+        count = counts[bucket]
+        if count and seen + count >= target:
+            lower = DURATION_BUCKET_HOURS[bucket - 1] if bucket else 0
+            if bucket >= len(DURATION_BUCKET_HOURS):
+                return lower
+            upper = DURATION_BUCKET_HOURS[bucket]
+            return lower + (upper - lower) * (target - seen) / count
+        seen += count
+    return DURATION_BUCKET_HOURS[-1]
+
+
+def funnel(since=None, job_id=None):
+    """
+    Return {stage: candidates who entered it} from the daily rollup
+    """
+    rows = StageDailyCount.objects.all()
+    if since is not None:
+        rows = rows.filter(day__gte=since)
+    if job_id is not None:
+        rows = rows.filter(job_id=job_id)
+    return dict(rows.values('stage').annotate(n=Sum('entered')).values_list('stage', 'n'))
+
+
+def time_in_stage(job_id=None, percentiles=(50, 90)):
+    """
+    Return {stage: {'count': n, percentile: hours, ...}} from the duration rollup
+    """
+    rows = StageDurationBucket.objects.all()
+    if job_id is not None:
+        rows = rows.filter(job_id=job_id)
+    histograms = {}
+    totals = rows.values('stage', 'bucket').annotate(n=Sum('count'))
+    for stage, bucket, count in totals.values_list('stage', 'bucket', 'n'):
+        histograms.setdefault(stage, {})[bucket] = count
+    return {
+        stage: {'count': sum(counts.values()), **{p: histogram_percentile(counts, p) for p in percentiles}}
+        for stage, counts in histograms.items()
+    }
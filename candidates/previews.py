@@ -0,0 +1,77 @@
+# candidates/previews.py
+"""
+Resume thumbnails and text previews.
+
+The resume worker (candidates.tasks) renders the first page of each PDF
+resume to a small PNG stored next to the file, as <resume>.thumb.png, and
+keeps the start of the extracted text on the candidate, so the list and
+detail pages can show both without fetching the resume. Identical files
+are stored once, under their content hash, so they share one thumbnail.
+
+Like candidates.parsing, this module has no database access and is safe to
+call in worker processes. Rendering needs the optional 'pypdfium2' and
+'Pillow' packages.
+"""
+import os
+import re
+
+THUMBNAIL_WIDTH = 240
+PREVIEW_LENGTH = 1000
+BLANK_LINES = re.compile(r'\n\s*\n+')
+SPACES = re.compile(r'[ \t\r\f\v]+')
+
+
+class ResumePreviewError(Exception):
+    """Raised when a thumbnail cannot be rendered."""
+
+
+def thumbnail_name(resume_name):
+    """
+    The storage name of the thumbnail for a resume, or '' for formats that
+    get none
+    """
+    stem, extension = os.path.splitext(resume_name)
+    if extension.lower() != '.pdf':
+        return ''
+    return f'{stem}.thumb.png'
+
+
+def text_preview(text, length=PREVIEW_LENGTH):
+    """
+    The start of a resume's text, with runs of spaces and blank lines
+    collapsed, cut at a word boundary
+    """
+    text = BLANK_LINES.sub('\n', SPACES.sub(' ', text or '')).strip()
+    if len(text) <= length:
+        return text
+    cut = text.rfind(' ', 0, length)
+    return text[:cut if cut > length // 2 else length].rstrip() + '…'
+
+
+def render_thumbnail(source, destination, width=THUMBNAIL_WIDTH):
+    """
+    Render the first page of the PDF at `source` as a PNG `width` pixels
+    wide at `destination`, unless that file already exists
+    """
+    if os.path.exists(destination):
+        return
+    try:
+        import PIL  # noqa: F401, used by to_pil()
+        import pypdfium2
+    except ImportError as exc:
+        raise ResumePreviewError("Resume thumbnails require the 'pypdfium2' and 'Pillow' packages") from exc
+    try:
+        document = pypdfium2.PdfDocument(source)
+        try:
+            if len(document) == 0:
+                raise ResumePreviewError("The PDF has no pages")
+            page = document[0]
+            image = page.render(scale=width / page.get_width()).to_pil()
+        finally:
+            document.close()
+    except (pypdfium2.PdfiumError, OSError, ValueError) as exc:
+        raise ResumePreviewError(f"Could not render PDF: {exc}") from exc
+    # Write under a temporary name so a half-written thumbnail is never served
+    partial = f'{destination}.{os.getpid()}.part'
+    image.save(partial, format='PNG', optimize=True)
+    os.replace(partial, destination)
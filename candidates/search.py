@@ -0,0 +1,183 @@
+# candidates/search.py
+"""
+Full-text candidate search over cover letters, parsed resume text, recruiter
+notes and skills.
+
+The index is an inverted index stored in the SearchPosting table: one row per
+(candidate, term) holding a BM25 weight computed when the candidate is
+indexed. A query reads only the highest-weighted postings of each term (a
+"champion list") through the (term, -weight) index, so its cost depends on the
+number of query terms rather than on the number of indexed candidates.
+"""
+import math
+import re
+from collections import Counter, defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Prefetch
+
+from .models import Application, Candidate, CandidateSkill, ResumeParseCache, SearchPosting
+from .parsing import PARSER_VERSION
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#]*(?:\.[a-z0-9]+)*")
+STOP_WORDS = frozenset("""
+    a about above after again all am an and any are as at be because been before being below between both
+    but by can could did do does doing down during each few for from further had has have having he her
+    here hers him his how i if in into is it its itself just me more most my no nor not now of off on once
+    only or other our ours out over own same she should so some such than that the their theirs them then
+    there these they this those through to too under until up very was we were what when where which
+    while who whom why will with would you your yours
+""".split())
+
+# Relative importance of each source field when computing term frequencies
+FIELD_BOOSTS = {'skills': 3.0, 'cover_letter': 1.0, 'resume': 1.0, 'notes': 1.0}
+
+# BM25 parameters. Document length is normalised against a fixed average so
+# that weights can be computed once at index time.
+BM25_K1 = 1.2
+BM25_B = 0.75
+AVERAGE_DOCUMENT_LENGTH = 400.0
+
+CHAMPION_LIST_SIZE = 1000
+MAX_QUERY_TERMS = 8
+STATS_CACHE_TIMEOUT = 600
+
+
+def tokenize(text):
+    """
+    Lower-case word tokens with stop words removed. Keeps technology names
+    such as "c++", "c#" and "node.js" intact.
+    """
+    return [
+        token for token in TOKEN_PATTERN.findall(text.lower())
+        if token not in STOP_WORDS and len(token) <= 64
+    ]
+
+
+def document_weights(fields):
+    """
+    Map each term of a document, given as {field name: text}, to its BM25 weight
+    """
+    frequencies = Counter()
+    for field, text in fields.items():
+        boost = FIELD_BOOSTS[field]
+        for token in tokenize(text):
+            frequencies[token] += boost
+    length = sum(frequencies.values())
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * length / AVERAGE_DOCUMENT_LENGTH)
+    return {term: tf * (BM25_K1 + 1) / (tf + norm) for term, tf in frequencies.items()}
+
+
+def index_candidates(candidate_ids):
+    """
+    (Re)build the postings of the given candidates with a fixed number of
+    queries regardless of how many ids are passed. Ids of deleted candidates
+    simply have their postings removed.
+    """
+    candidate_ids = list(candidate_ids)
+    if not candidate_ids:
+        return
+    candidates = list(Candidate.objects.filter(id__in=candidate_ids).only('id', 'cover_letter', 'resume_hash'))
+
+    skills = defaultdict(list)
+    for candidate_id, skill in CandidateSkill.objects.filter(candidate_id__in=candidate_ids).values_list('candidate_id', 'skill'):
+        skills[candidate_id].append(skill)
+
+    # Imported here because recruiters.models depends on this app's models
+    from recruiters.models import Note
+    notes = defaultdict(list)
+    for candidate_id, content in Note.objects.filter(candidate_id__in=candidate_ids).values_list('candidate_id', 'content'):
+        notes[candidate_id].append(content)
+
+    resume_texts = dict(
+        ResumeParseCache.objects.filter(
+            content_hash__in={candidate.resume_hash for candidate in candidates if candidate.resume_hash},
+            parser_version=PARSER_VERSION,
+        ).values_list('content_hash', 'text')
+    )
+
+    postings = []
+    for candidate in candidates:
+        weights = document_weights({
+            'skills': '\n'.join(skills[candidate.id]),
+            'cover_letter': candidate.cover_letter,
+            'resume': resume_texts.get(candidate.resume_hash, ''),
+            'notes': '\n'.join(notes[candidate.id]),
+        })
+        postings.extend(
+            SearchPosting(candidate_id=candidate.id, term=term, weight=weight)
+            for term, weight in weights.items()
+        )
+
+    with transaction.atomic():
+        SearchPosting.objects.filter(candidate_id__in=candidate_ids).delete()
+        SearchPosting.objects.bulk_create(postings, batch_size=2000)
+
+
+def _corpus_statistics(terms):
+    """
+    Return (number of indexed candidates, {term: document frequency}). Both
+    change slowly and only affect relative term weights, so they are cached.
+    """
+    keys = {term: f'candidate-search:df:{term}' for term in terms}
+    cached = cache.get_many([*keys.values(), 'candidate-search:total'])
+    total = cached.get('candidate-search:total')
+    if total is None:
+        total = Candidate.objects.count()
+        cache.set('candidate-search:total', total, STATS_CACHE_TIMEOUT)
+
+    frequencies = {term: cached[key] for term, key in keys.items() if key in cached}
+    missing = [term for term in terms if term not in frequencies]
+    if missing:
+        counted = dict(
+            SearchPosting.objects.filter(term__in=missing).values('term')
+            .annotate(n=Count('id')).values_list('term', 'n')
+        )
+        fresh = {term: counted.get(term, 0) for term in missing}
+        cache.set_many({keys[term]: n for term, n in fresh.items()}, STATS_CACHE_TIMEOUT)
+        frequencies.update(fresh)
+    return total, frequencies
+
+
+def search_candidate_ids(query, limit=50):
+    """
+    Return [(candidate_id, score)] for the best matches of `query`, best first
+    """
+    terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+    if not terms:
+        return []
+    total, frequencies = _corpus_statistics(terms)
+
+    scores = defaultdict(float)
+    for term in terms:
+        # A cached frequency may predate the term's first posting, so a zero
+        # only lowers confidence in the weight; it never skips the lookup
+        df = max(frequencies.get(term, 0), 1)
+        idf = math.log(1 + (max(total, df) - df + 0.5) / (df + 0.5))
+        champions = (
+            SearchPosting.objects.filter(term=term).order_by('-weight')
+            .values_list('candidate_id', 'weight')[:CHAMPION_LIST_SIZE]
+        )
+        for candidate_id, weight in champions:
+            scores[candidate_id] += idf * weight
+
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    return ranked[:limit]
+
+
+def search_candidates(query, limit=50):
+    """
+    Return matching Candidate objects, best first, each with a `search_score`
+    """
+    ranked = search_candidate_ids(query, limit)
+    candidates = Candidate.objects.prefetch_related(
+        Prefetch('applications', queryset=Application.objects.select_related('job').order_by('-created_at')),
+    ).in_bulk([candidate_id for candidate_id, _ in ranked])
+    results = []
+    for candidate_id, score in ranked:
+        candidate = candidates.get(candidate_id)
+        if candidate is not None:
+            candidate.search_score = score
+            results.append(candidate)
+    return results
@@ -0,0 +1,72 @@
+# candidates/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from ats_project.caching import candidate_stamp, job_stamp, touch
+from .dedup import IDENTITY_FIELDS, refresh_duplicates_on_commit
+from .indexing import mark_stale
+from .models import Application, Candidate, CandidateEducation, CandidateSkill, CandidateWorkExperience
+from .pipeline import record_stage_entries, remove_from_job_counters
+
+# Candidate fields that feed the search index
+INDEXED_CANDIDATE_FIELDS = {'cover_letter', 'resume', 'resume_hash'}
+# Candidate fields shown on the pages of the jobs they applied for
+LISTED_CANDIDATE_FIELDS = {'first_name', 'last_name', 'email'}
+
+
+@receiver(post_save, sender=Candidate)
+def index_saved_candidate(sender, instance, created, update_fields, **kwargs):
+    if created or update_fields is None or INDEXED_CANDIDATE_FIELDS & set(update_fields):
+        mark_stale(instance.pk)
+    if created or update_fields is None or set(IDENTITY_FIELDS) & set(update_fields):
+        refresh_duplicates_on_commit([instance.pk], created)
+
+
+@receiver(post_save, sender=Application)
+def log_new_application(sender, instance, created, **kwargs):
+    if created:
+        record_stage_entries([instance])
+
+
+@receiver(post_delete, sender=Application)
+def uncount_deleted_application(sender, instance, **kwargs):
+    remove_from_job_counters([instance])
+
+
+@receiver(post_delete, sender=Candidate)
+def unindex_deleted_candidate(sender, instance, **kwargs):
+    mark_stale(instance.pk)
+
+
+@receiver(post_save, sender=CandidateSkill)
+@receiver(post_delete, sender=CandidateSkill)
+@receiver(post_save, sender=CandidateWorkExperience)
+@receiver(post_delete, sender=CandidateWorkExperience)
+@receiver(post_save, sender='recruiters.Note')
+@receiver(post_delete, sender='recruiters.Note')
+def index_candidate_of_related_row(sender, instance, **kwargs):
+    mark_stale(instance.candidate_id)
+
+
+@receiver(post_save, sender=Candidate)
+def touch_saved_candidate(sender, instance, created, update_fields, **kwargs):
+    names = [candidate_stamp(instance.pk)]
+    if not created and (update_fields is None or LISTED_CANDIDATE_FIELDS & set(update_fields)):
+        names += [
+            job_stamp(job_id)
+            for job_id in Application.objects.filter(candidate=instance).values_list('job_id', flat=True)
+        ]
+    touch(*names)
+
+
+@receiver(post_delete, sender=Candidate)
+@receiver(post_save, sender=CandidateSkill)
+@receiver(post_delete, sender=CandidateSkill)
+@receiver(post_save, sender=CandidateEducation)
+@receiver(post_delete, sender=CandidateEducation)
+@receiver(post_save, sender=CandidateWorkExperience)
+@receiver(post_delete, sender=CandidateWorkExperience)
+@receiver(post_save, sender='recruiters.Note')
+@receiver(post_delete, sender='recruiters.Note')
+def touch_candidate_page(sender, instance, **kwargs):
+    touch(candidate_stamp(instance.pk if sender is Candidate else instance.candidate_id))
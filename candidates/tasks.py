@@ -0,0 +1,311 @@
+# candidates/tasks.py
+"""
+Background resume parsing.
+
+Web requests only enqueue a ResumeParseJob row. The process_resumes management
+command claims queued jobs, runs the CPU-bound text extraction and thumbnail
+rendering in a process pool so it scales across cores, and writes the
+detected entities and the resume previews back in bulk.
+Results are cached by resume content hash, so re-uploads of the same file are
+not parsed again.
+"""
+import logging
+from concurrent.futures import Future, as_completed
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from ats_project.caching import candidate_stamp, touch
+
+from .models import (
+    Candidate, CandidateEducation, CandidateSkill, CandidateWorkExperience, ResumeParseCache, ResumeParseJob,
+)
+from .dedup import refresh_duplicates_on_commit
+from .exporting import chunked
+from .indexing import mark_stale
+from .parsing import PARSER_VERSION, ResumeParseError, content_hash, parse_resume_file
+from .previews import ResumePreviewError, render_thumbnail, text_preview, thumbnail_name
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ('queued', 'running')
+MAX_ATTEMPTS = 3
+HASH_BLOCK_SIZE = 64 * 1024
+
+
+def enqueue_resume_parse(candidate):
+    """
+    Queue a parse of the candidate's resume unless one is already pending
+    """
+    job = candidate.parse_jobs.filter(status__in=ACTIVE_STATUSES).first()
+    if job is None:
+        job = ResumeParseJob.objects.create(candidate=candidate)
+    return job
+
+
+def enqueue_missing_previews(batch_size=1000):
+    """
+    Queue a parse, which also builds the previews, for every candidate with
+    a resume but no text preview and no pending parse. Returns the number
+    of jobs queued.
+    """
+    candidates = Candidate.objects.exclude(resume='').filter(resume_preview='').exclude(
+        parse_jobs__status__in=ACTIVE_STATUSES,
+    ).order_by('id').values_list('id', flat=True)
+    queued = 0
+    for candidate_ids in chunked(candidates.iterator(chunk_size=batch_size), batch_size):
+        ResumeParseJob.objects.bulk_create([ResumeParseJob(candidate_id=pk) for pk in candidate_ids])
+        queued += len(candidate_ids)
+    return queued
+
+
+def claim_jobs(limit):
+    """
+    Atomically move up to `limit` queued jobs to running and return them.
+    Each row is claimed with a conditional UPDATE, so several workers can
+    poll the same table without picking up the same job twice.
+    """
+    now = timezone.now()
+    queued = ResumeParseJob.objects.filter(status='queued').order_by('created_at')
+    claimed = [
+        job_id for job_id in queued.values_list('id', flat=True)[:limit]
+        if ResumeParseJob.objects.filter(id=job_id, status='queued').update(
+            status='running', started_at=now, attempts=F('attempts') + 1,
+        )
+    ]
+    return list(ResumeParseJob.objects.filter(id__in=claimed).select_related('candidate'))
+
+
+def requeue_stale_jobs(older_than=timedelta(minutes=30)):
+    """
+    Return jobs left running by a worker that died back to the queue
+    """
+    cutoff = timezone.now() - older_than
+    stale = ResumeParseJob.objects.filter(status='running', started_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=MAX_ATTEMPTS).update(
+        status='failed', finished_at=timezone.now(), error='Worker stopped responding',
+    )
+    return stale.update(status='queued') + failed
+
+
+def run_parse_jobs(jobs, executor=None):
+    """
+    Parse the resumes for claimed jobs, and render thumbnails of those that
+    have none yet, in `executor` when one is given (normally a
+    ProcessPoolExecutor) or inline otherwise.
+
+    Resumes whose content hash has already been parsed by the current parser
+    version are served from ResumeParseCache, and identical files within the
+    batch are only parsed once.
+    """
+    groups = {}
+    hashed = []
+    for job in jobs:
+        try:
+            path = job.candidate.resume.path
+        except (ValueError, NotImplementedError) as exc:
+            fail_job(job, f"Resume file is not available: {exc}", retry=False)
+            continue
+        if not job.candidate.resume_hash:
+            # Imported candidates point at stored files without passing
+            # through Candidate.save(), which hashes uploads
+            try:
+                with open(path, 'rb') as resume:
+                    job.candidate.resume_hash = content_hash(iter(lambda: resume.read(HASH_BLOCK_SIZE), b''))
+            except OSError:
+                pass
+            else:
+                hashed.append(job.candidate)
+        key = job.candidate.resume_hash or path
+        groups.setdefault(key, (path, job.candidate.resume_hash, []))[2].append(job)
+    if hashed:
+        Candidate.objects.bulk_update(hashed, ['resume_hash'])
+        # bulk_update sends no post_save, so add their resume blocking keys
+        refresh_duplicates_on_commit([candidate.id for candidate in hashed])
+
+    # Started first so they render while the batch is parsed. Identical
+    # files are stored once, so a thumbnail may exist from another candidate.
+    thumbnails = {}
+    for key, (path, _, group) in groups.items():
+        name = thumbnail_name(group[0].candidate.resume.name)
+        if not name:
+            continue
+        if group[0].candidate.resume_thumbnail == name or default_storage.exists(name):
+            thumbnails[key] = (name, None)
+        else:
+            thumbnails[key] = (name, _submit(executor, render_thumbnail, path, default_storage.path(name)))
+
+    cached = ResumeParseCache.objects.filter(
+        content_hash__in=[resume_hash for _, resume_hash, _ in groups.values() if resume_hash],
+        parser_version=PARSER_VERSION,
+    )
+    for entry in cached:
+        _, _, group = groups.pop(entry.content_hash)
+        result = entry.as_result()
+        thumbnail = _thumbnail(thumbnails.get(entry.content_hash))
+        for job in group:
+            save_parse_result(job, result, thumbnail)
+
+    futures = {
+        _submit(executor, parse_resume_file, path): (group, resume_hash, key)
+        for key, (path, resume_hash, group) in groups.items()
+    }
+    for future in as_completed(futures):
+        group, resume_hash, key = futures[future]
+        _finish(group, resume_hash, future.result, _thumbnail(thumbnails.get(key)))
+
+
+def _submit(executor, function, *args):
+    """
+    executor.submit(), or a call made straight away with its outcome
+    wrapped in a Future when there is no executor
+    """
+    if executor is not None:
+        return executor.submit(function, *args)
+    future = Future()
+    try:
+        future.set_result(function(*args))
+    except Exception as exc:
+        future.set_exception(exc)
+    return future
+
+
+def _thumbnail(pending):
+    """
+    The storage name of a thumbnail started by run_parse_jobs(), or '' if
+    there is none. A thumbnail that fails does not fail the parse.
+    """
+    if pending is None:
+        return ''
+    name, future = pending
+    if future is None:
+        # Rendered before
+        return name
+    try:
+        future.result()
+    except ResumePreviewError as exc:
+        logger.warning("No thumbnail for %s: %s", name, exc)
+        return ''
+    except Exception:
+        logger.exception("Rendering the thumbnail %s crashed", name)
+        return ''
+    return name
+
+
+def _finish(group, resume_hash, get_result, thumbnail=''):
+    try:
+        result = get_result()
+    except ResumeParseError as exc:
+        for job in group:
+            fail_job(job, str(exc), retry=False)
+    except Exception as exc:
+        logger.exception("Resume parse for job(s) %s crashed", [job.id for job in group])
+        for job in group:
+            fail_job(job, repr(exc), retry=True)
+    else:
+        if resume_hash:
+            cache_parse_result(resume_hash, result)
+        for job in group:
+            save_parse_result(job, result, thumbnail)
+
+
+def cache_parse_result(resume_hash, result):
+    entities = {key: value for key, value in result.items() if key not in ('text', 'parser_version')}
+    ResumeParseCache.objects.bulk_create(
+        [ResumeParseCache(
+            content_hash=resume_hash,
+            parser_version=result['parser_version'],
+            text=result['text'],
+            entities=entities,
+        )],
+        ignore_conflicts=True,
+    )
+
+
+def purge_stale_parse_cache():
+    """
+    Delete cache entries written by other parser versions
+    """
+    deleted, _ = ResumeParseCache.objects.exclude(parser_version=PARSER_VERSION).delete()
+    return deleted
+
+
+def fail_job(job, error, retry=False):
+    if retry and job.attempts < MAX_ATTEMPTS:
+        job.status = 'queued'
+    else:
+        job.status = 'failed'
+        job.finished_at = timezone.now()
+    job.error = error
+    job.save(update_fields=['status', 'finished_at', 'error'])
+
+
+@transaction.atomic
+def save_parse_result(job, result, thumbnail=''):
+    """
+    Store detected skills, education and work history for the job's candidate
+    with one bulk INSERT per table, skipping entries the profile already has,
+    along with the resume's text preview and `thumbnail`
+    """
+    candidate = job.candidate
+    candidate.resume_preview = text_preview(result['text'])
+    candidate.resume_thumbnail = thumbnail
+    Candidate.objects.filter(pk=candidate.pk).update(
+        resume_preview=candidate.resume_preview, resume_thumbnail=thumbnail,
+    )
+
+    known_skills = {skill.lower() for skill in candidate.skills.values_list('skill', flat=True)}
+    CandidateSkill.objects.bulk_create([
+        CandidateSkill(candidate=candidate, skill=entry['skill'], years_experience=entry['years_experience'])
+        for entry in result['skills']
+        if entry['skill'].lower() not in known_skills
+    ])
+
+    known_education = {
+        (institution.lower(), degree.lower())
+        for institution, degree in candidate.education.values_list('institution', 'degree')
+    }
+    CandidateEducation.objects.bulk_create([
+        CandidateEducation(
+            candidate=candidate,
+            institution=entry['institution'],
+            degree=entry['degree'],
+            field_of_study=entry['field_of_study'],
+            from_date=parse_date(entry['from_date']),
+            to_date=parse_date(entry['to_date']) if entry['to_date'] else None,
+        )
+        for entry in result['education']
+        if (entry['institution'].lower(), entry['degree'].lower()) not in known_education
+    ])
+
+    known_experience = {
+        (company.lower(), position.lower())
+        for company, position in candidate.work_experience.values_list('company', 'position')
+    }
+    CandidateWorkExperience.objects.bulk_create([
+        CandidateWorkExperience(
+            candidate=candidate,
+            company=entry['company'],
+            position=entry['position'],
+            from_date=parse_date(entry['from_date']),
+            to_date=parse_date(entry['to_date']) if entry['to_date'] else None,
+            description=entry['description'],
+        )
+        for entry in result['work_experience']
+        if (entry['company'].lower(), entry['position'].lower()) not in known_experience
+    ])
+
+    touch(candidate_stamp(candidate.pk))
+
+    job.status = 'completed'
+    job.error = ''
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'finished_at'])
+
+    # bulk_create sends no signals, so queue the search and match indexes
+    # explicitly
+    mark_stale(candidate.id)
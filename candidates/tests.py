@@ -1,3 +1,1194 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from importlib.util import find_spec
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.storage import default_storage
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from ats_project.query_budget import QueryBudgetTestMixin
+from jobs.models import Department, JobPost
+from recruiters.models import Interview, Note, OutboundEmail
+from .models import (
+    Application, Candidate, CandidateBlockingKey, CandidateEducation, CandidateSkill, CandidateWorkExperience,
+    DuplicateCandidate, ResumeParseCache, ResumeParseJob, ResumeUpload, StageDailyCount, StageDurationBucket,
+    StageTransition,
+)
+from .dedup import (
+    blocking_keys, find_duplicates_of, merge_candidates, normalize_email, normalize_phone, score_pair, soundex,
+)
+from .importing import CandidateImporter, write_error_report
+from .indexing import drain_stale
+from .matching import (
+    get_match_index, invalidate_match_index, rank_candidates, rank_jobs, record_changes, reset_match_index,
+)
+from .pipeline import bulk_change_stage, change_stage, funnel, histogram_percentile, rebuild_rollups, time_in_stage
+from .parsing import PARSER_VERSION, content_hash
+from .previews import text_preview
+from .search import index_candidates, search_candidate_ids
+from .tasks import (
+    claim_jobs, enqueue_missing_previews, enqueue_resume_parse, purge_stale_parse_cache, run_parse_jobs,
+)
+from .uploads import UploadError, UploadOffsetConflict, append_chunk, part_path, purge_stale_uploads
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def tearDownModule():
+    shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class CandidateViewQueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('recruiter', 'recruiter@example.com', 'password', is_staff=True)
+        cls.jobs = []
+        for i in range(3):
+            department = Department.objects.create(name=f'Department {i}')
+            cls.jobs.append(JobPost.objects.create(
+                title=f'Engineer {i}', department=department, location='Remote',
+                description='Build things', requirements='Python, Django',
+                responsibilities='Ship features', status='published', created_by=cls.user,
+            ))
+        cls.candidates = [
+            Candidate.objects.create(
+                first_name='Candidate', last_name=str(i), email=f'candidate{i}@example.com',
+                resume='resumes/resume.pdf',
+            )
+            for i in range(6)
+        ]
+        cls.applications = [
+            Application.objects.create(candidate=candidate, job=cls.jobs[i % 3])
+            for i, candidate in enumerate(cls.candidates)
+        ]
+        cls.candidate = cls.candidates[0]
+        cls.application = cls.applications[0]
+        for i in range(3):
+            CandidateSkill.objects.create(candidate=cls.candidate, skill=f'Skill {i}', years_experience=i)
+            CandidateEducation.objects.create(
+                candidate=cls.candidate, institution=f'University {i}', degree='BSc', from_date='2010-09-01',
+            )
+            CandidateWorkExperience.objects.create(
+                candidate=cls.candidate, company=f'Company {i}', position='Developer', from_date='2015-01-01',
+            )
+            Note.objects.create(candidate=cls.candidate, author=cls.user, content=f'Note {i}')
+            interview = Interview.objects.create(
+                candidate=cls.candidate, job=cls.jobs[i], scheduled_at=timezone.now(), duration=30,
+            )
+            interview.interviewers.add(cls.user)
+
+    def setUp(self):
+        # Rendered pages must not outlive the rolled-back data of a test
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_candidate_list(self):
+        Application.objects.create(candidate=self.candidate, job=self.jobs[1])
+        response = self.assertWithinQueryBudget(reverse('candidate_list'))
+        self.assertEqual(len(response.context['applications']), 7)
+        self.assertWithinQueryBudget(reverse('candidate_list'), data={'job': self.jobs[0].id, 'stage': 'new'})
+
+    def test_candidate_detail(self):
+        response = self.assertWithinQueryBudget(reverse('candidate_detail', args=[self.candidate.id]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_candidate_create(self):
+        self.assertWithinQueryBudget(reverse('candidate_create'))
+        self.assertWithinQueryBudget(reverse('candidate_create_for_job', args=[self.jobs[0].id]))
+        data = {
+            'first_name': 'New', 'last_name': 'Person', 'email': 'new.person@example.com', 'phone': '',
+            'cover_letter': '', 'job': self.jobs[0].id, 'stage': 'new',
+            'resume': SimpleUploadedFile('resume.pdf', b'%PDF-1.4 resume', content_type='application/pdf'),
+            'skills-TOTAL_FORMS': '2', 'skills-INITIAL_FORMS': '0',
+            'skills-0-skill': 'Python', 'skills-0-years_experience': '3',
+            'skills-1-skill': 'Django', 'skills-1-years_experience': '2',
+            'education-TOTAL_FORMS': '0', 'education-INITIAL_FORMS': '0',
+            'experience-TOTAL_FORMS': '0', 'experience-INITIAL_FORMS': '0',
+        }
+        response = self.assertWithinQueryBudget(reverse('candidate_create'), method='post', data=data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(CandidateSkill.objects.filter(candidate__email='new.person@example.com').count(), 2)
+        application = Application.objects.get(candidate__email='new.person@example.com')
+        self.assertEqual((application.job, application.stage), (self.jobs[0], 'new'))
+        self.assertEqual(application.transitions.get().to_stage, 'new')
+
+    def test_candidate_create_is_one_transaction(self):
+        data = {
+            'first_name': 'New', 'last_name': 'Person', 'email': 'new.person@example.com', 'phone': '',
+            'cover_letter': '', 'job': self.jobs[0].id, 'stage': 'new',
+            'resume': SimpleUploadedFile('resume.pdf', b'%PDF-1.4 resume', content_type='application/pdf'),
+            'skills-TOTAL_FORMS': '0', 'skills-INITIAL_FORMS': '0',
+            'education-TOTAL_FORMS': '1', 'education-INITIAL_FORMS': '0',
+            'education-0-institution': 'MIT', 'education-0-degree': 'BSc', 'education-0-field_of_study': 'CS',
+            'education-0-from_date': '2010-09-01', 'education-0-to_date': '2014-06-30',
+            'experience-TOTAL_FORMS': '0', 'experience-INITIAL_FORMS': '0',
+        }
+        counts = JobPost.objects.values('applicant_count', 'new_count').get(id=self.jobs[0].id)
+        rollups = list(StageDailyCount.objects.values_list('job_id', 'stage', 'day', 'entered'))
+        # Fails after the application and its counters are written
+        with mock.patch.object(CandidateEducation.objects, 'bulk_create', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.client.post(reverse('candidate_create'), data)
+        self.assertFalse(Candidate.objects.filter(email='new.person@example.com').exists())
+        self.assertEqual(JobPost.objects.values('applicant_count', 'new_count').get(id=self.jobs[0].id), counts)
+        self.assertEqual(list(StageDailyCount.objects.values_list('job_id', 'stage', 'day', 'entered')), rollups)
+
+    def test_parse_resume(self):
+        self.assertWithinQueryBudget(reverse('parse_resume', args=[self.candidate.id]))
+
+    def test_update_stage(self):
+        url = reverse('update_stage', args=[self.application.id])
+        self.assertWithinQueryBudget(url, method='post', data={'stage': 'screening'})
+        self.application.refresh_from_db()
+        self.assertEqual(self.application.stage, 'screening')
+        self.assertWithinQueryBudget(url, method='post', data={'stage': 'bogus'})
+        self.application.refresh_from_db()
+        self.assertEqual(self.application.stage, 'screening')
+
+    def test_bulk_update_stage(self):
+        url = reverse('bulk_update_stage')
+        selected = self.applications[:2]
+        response = self.assertWithinQueryBudget(url, method='post', data={
+            'application': [application.id for application in selected], 'to_stage': 'screening',
+        })
+        self.assertRedirects(response, reverse('candidate_list'), fetch_redirect_response=False)
+        self.assertEqual(
+            sorted(Application.objects.filter(stage='screening').values_list('id', flat=True)),
+            [application.id for application in selected],
+        )
+        self.assertEqual(StageTransition.objects.filter(to_stage='screening', changed_by=self.user).count(), 2)
+        self.jobs[0].refresh_from_db()
+        self.assertEqual((self.jobs[0].new_count, self.jobs[0].screening_count), (1, 1))
+
+    def test_bulk_reject_and_email_everyone_matching(self):
+        filters = f'job={self.jobs[0].id}'
+        change_stage([self.applications[0].id], 'rejected')
+        response = self.assertWithinQueryBudget(reverse('bulk_update_stage'), method='post', data={
+            'all_matching': 'on', 'filters': filters, 'to_stage': 'rejected', 'send_email': 'on',
+            'subject': 'Your application', 'body': 'Dear {{ candidate.first_name }}, thank you for applying to {{ job.title }}.',
+        })
+        self.assertRedirects(response, f"{reverse('candidate_list')}?{filters}", fetch_redirect_response=False)
+        self.assertFalse(Application.objects.filter(job=self.jobs[0]).exclude(stage='rejected').exists())
+        # Only the candidate who moved is emailed
+        email = OutboundEmail.objects.get()
+        self.assertEqual(email.to_email, self.applications[3].candidate.email)
+        self.assertEqual(email.body, 'Dear Candidate, thank you for applying to Engineer 0.')
+
+    def test_bulk_update_stage_validation(self):
+        url = reverse('bulk_update_stage')
+        for data in [
+            {'to_stage': 'screening'},
+            {'application': [self.application.id], 'to_stage': 'bogus'},
+            {'application': [self.application.id], 'to_stage': 'rejected', 'send_email': 'on'},
+        ]:
+            with self.subTest(data):
+                response = self.client.post(url, data, follow=True)
+                self.assertEqual(len(list(response.context['messages'])), 1)
+        self.assertFalse(StageTransition.objects.exclude(from_stage='').exists())
+        self.assertFalse(OutboundEmail.objects.exists())
+
+    def test_bulk_change_stage_in_chunks(self):
+        transitions = bulk_change_stage(Application.objects.filter(stage='new'), 'interview', chunk_size=4)
+        self.assertEqual(len(transitions), 6)
+        self.assertEqual(Application.objects.filter(stage='interview').count(), 6)
+
+    def test_add_application(self):
+        url = reverse('add_application', args=[self.candidate.id])
+        response = self.assertWithinQueryBudget(url, method='post', data={'job': self.jobs[1].id, 'stage': 'screening'})
+        self.assertRedirects(response, reverse('candidate_detail', args=[self.candidate.id]))
+        self.assertEqual(
+            sorted(self.candidate.applications.values_list('job_id', 'stage')),
+            [(self.jobs[0].id, 'new'), (self.jobs[1].id, 'screening')],
+        )
+        # A second application to the same job is refused
+        self.assertWithinQueryBudget(url, method='post', data={'job': self.jobs[1].id, 'stage': 'new'})
+        self.assertEqual(self.candidate.applications.count(), 2)
+
+    def test_add_and_edit_skill(self):
+        self.assertWithinQueryBudget(
+            reverse('add_skill', args=[self.candidate.id]), method='post',
+            data={'skill': 'Go', 'years_experience': 1},
+        )
+        skill = self.candidate.skills.first()
+        self.assertWithinQueryBudget(
+            reverse('edit_skill', args=[skill.id]), method='post', data={'skill': 'Rust', 'years_experience': 2},
+        )
+
+    def test_add_note(self):
+        url = f'/candidates/{self.candidate.id}/add-note/'
+        self.assertWithinQueryBudget(url)
+        self.assertWithinQueryBudget(url, method='post', data={'content': 'Strong candidate'})
+
+
+RESUME_TEXT = """Jane Doe
+Experience
+Senior Software Engineer at Acme Corp, Jan 2019 - Present
+Built Python and Django services, 5 years of Python.
+Education
+Bachelor of Science in Computer Science, University of Toronto, 2012 - 2016
+"""
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ResumeParsingTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('recruiter', 'recruiter@example.com', 'password')
+        department = Department.objects.create(name='Engineering')
+        self.job = JobPost.objects.create(
+            title='Engineer', department=department, location='Remote', description='Build things',
+            requirements='Python', responsibilities='Ship features', created_by=user,
+        )
+        self.candidate = self.create_candidate('jane@example.com')
+
+    def create_candidate(self, email):
+        candidate = Candidate(first_name='Jane', last_name='Doe', email=email)
+        candidate.resume.save('resume.txt', ContentFile(RESUME_TEXT.encode()))
+        return candidate
+
+    def test_enqueue_is_idempotent_while_pending(self):
+        self.assertEqual(enqueue_resume_parse(self.candidate), enqueue_resume_parse(self.candidate))
+        self.assertEqual(ResumeParseJob.objects.count(), 1)
+
+    def test_parse_job_writes_entities(self):
+        CandidateSkill.objects.create(candidate=self.candidate, skill='python', years_experience=2)
+        job = enqueue_resume_parse(self.candidate)
+        run_parse_jobs(claim_jobs(10))
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'completed')
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(
+            sorted(self.candidate.skills.values_list('skill', flat=True)), ['Django', 'python'],
+        )
+        education = self.candidate.education.get()
+        self.assertEqual((education.degree, education.institution), ('Bachelor of Science', 'University of Toronto'))
+        experience = self.candidate.work_experience.get()
+        self.assertEqual((experience.position, experience.company), ('Senior Software Engineer', 'Acme Corp'))
+        self.assertIsNone(experience.to_date)
+        self.assertEqual(claim_jobs(10), [])
+
+    def test_unsupported_format_fails_without_retry(self):
+        self.candidate.resume.save('resume.odt', ContentFile(b'binary'))
+        job = enqueue_resume_parse(self.candidate)
+        run_parse_jobs(claim_jobs(10))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('Unsupported resume format', job.error)
+
+    def test_worker_command_uses_process_pool(self):
+        job = enqueue_resume_parse(self.candidate)
+        call_command('process_resumes', workers=2, once=True, stdout=open(os.devnull, 'w'))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'completed')
+        self.assertTrue(self.candidate.skills.filter(skill='Django').exists())
+
+    def test_resume_hash_is_stored(self):
+        self.assertEqual(self.candidate.resume_hash, content_hash([RESUME_TEXT.encode()]))
+
+    def test_worker_hashes_imported_resumes(self):
+        # bulk_create, as the importer uses, skips Candidate.save()
+        imported, = Candidate.objects.bulk_create([Candidate(
+            first_name='Jane', last_name='Doe', email='imported@example.com', resume=self.candidate.resume.name,
+        )])
+        self.assertEqual(imported.resume_hash, '')
+        enqueue_resume_parse(imported)
+        with self.captureOnCommitCallbacks(execute=True):
+            run_parse_jobs(claim_jobs(10))
+        imported.refresh_from_db()
+        self.assertEqual(imported.resume_hash, self.candidate.resume_hash)
+        self.assertEqual(ResumeParseCache.objects.get().content_hash, self.candidate.resume_hash)
+        # So that copies of the same resume are found as duplicates
+        self.assertTrue(CandidateBlockingKey.objects.filter(
+            candidate=imported, kind='resume', key=imported.resume_hash,
+        ).exists())
+
+    def test_profile_edits_leave_imported_resumes_unread(self):
+        imported, = Candidate.objects.bulk_create([Candidate(
+            first_name='Jane', last_name='Doe', email='imported@example.com', resume=self.candidate.resume.name,
+        )])
+        imported = Candidate.objects.get(id=imported.id)
+        imported.phone = '555 0100'
+        with mock.patch('candidates.models.content_hash') as hash_file:
+            imported.save()
+        hash_file.assert_not_called()
+        self.assertEqual(imported.resume_hash, '')
+
+    def test_duplicate_resume_is_served_from_cache(self):
+        enqueue_resume_parse(self.candidate)
+        run_parse_jobs(claim_jobs(10))
+        self.assertEqual(ResumeParseCache.objects.get().content_hash, self.candidate.resume_hash)
+
+        duplicate = self.create_candidate('jane.doe@example.com')
+        job = enqueue_resume_parse(duplicate)
+        with mock.patch('candidates.tasks.parse_resume_file') as parse:
+            run_parse_jobs(claim_jobs(10))
+        parse.assert_not_called()
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'completed')
+        self.assertTrue(duplicate.skills.filter(skill='Django').exists())
+
+    def test_parse_job_stores_text_preview(self):
+        enqueue_resume_parse(self.candidate)
+        run_parse_jobs(claim_jobs(10))
+        self.candidate.refresh_from_db()
+        self.assertTrue(self.candidate.resume_preview.startswith('Jane Doe\nExperience\nSenior Software Engineer'))
+        # Only PDFs get a thumbnail
+        self.assertEqual(self.candidate.resume_thumbnail, '')
+
+    @skipUnless(find_spec('pypdfium2') and find_spec('PIL') and find_spec('pypdf'), 'PDF packages are not installed')
+    def test_parse_job_renders_thumbnail(self):
+        from pypdf import PdfWriter
+        document = io.BytesIO()
+        writer = PdfWriter()
+        writer.add_blank_page(width=200, height=300)
+        writer.write(document)
+        self.candidate.resume.save('resume.pdf', ContentFile(document.getvalue()))
+        enqueue_resume_parse(self.candidate)
+        run_parse_jobs(claim_jobs(10))
+        self.candidate.refresh_from_db()
+        stem = os.path.splitext(self.candidate.resume.name)[0]
+        self.assertEqual(self.candidate.resume_thumbnail, f'{stem}.thumb.png')
+
+        from PIL import Image
+        with Image.open(os.path.join(MEDIA_ROOT, self.candidate.resume_thumbnail)) as thumbnail:
+            self.assertEqual(thumbnail.size, (240, 360))
+
+        user = User.objects.get()
+        self.client.force_login(user)
+        response = self.client.get(reverse('candidate_resume_thumbnail', args=[self.candidate.id]))
+        self.assertEqual((response.status_code, response['Content-Type']), (200, 'image/png'))
+        response = self.client.get(reverse('candidate_detail', args=[self.candidate.id]))
+        self.assertContains(response, reverse('candidate_resume_thumbnail', args=[self.candidate.id]))
+
+    def test_thumbnail_failure_does_not_fail_the_parse(self):
+        self.candidate.resume.save('resume.pdf', ContentFile(b'%PDF-1.4 not really a pdf'))
+        job = enqueue_resume_parse(self.candidate)
+        with mock.patch('candidates.tasks.parse_resume_file', return_value={
+            'text': 'Jane Doe', 'parser_version': PARSER_VERSION, 'skills': [], 'education': [],
+            'work_experience': [],
+        }):
+            run_parse_jobs(claim_jobs(10))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'completed')
+        self.candidate.refresh_from_db()
+        self.assertEqual((self.candidate.resume_thumbnail, self.candidate.resume_preview), ('', 'Jane Doe'))
+
+    def test_identical_files_share_one_copy_and_thumbnail(self):
+        content = b'%PDF-1.4 the same resume'
+        first = Candidate.objects.create(
+            first_name='Jane', last_name='Doe', email='first@example.com',
+            resume=SimpleUploadedFile('jane.pdf', content),
+        )
+        second = Candidate.objects.create(
+            first_name='Jane', last_name='Doe', email='second@example.com',
+            resume=SimpleUploadedFile('other-name.pdf', content),
+        )
+        self.assertEqual(second.resume.name, first.resume.name)
+
+        result = {'text': 'Jane Doe', 'parser_version': PARSER_VERSION, 'skills': [], 'education': [],
+                  'work_experience': []}
+        enqueue_resume_parse(first)
+        with mock.patch('candidates.tasks.parse_resume_file', return_value=result), \
+                mock.patch('candidates.tasks.render_thumbnail') as render:
+            run_parse_jobs(claim_jobs(10))
+            render.assert_called_once()
+            # Stand in for the file the mock did not write
+            default_storage.save(Candidate.objects.get(pk=first.pk).resume_thumbnail, ContentFile(b'png'))
+            enqueue_resume_parse(second)
+            run_parse_jobs(claim_jobs(10))
+            render.assert_called_once()
+        second.refresh_from_db()
+        self.assertEqual(second.resume_thumbnail, f'{os.path.splitext(first.resume.name)[0]}.thumb.png')
+
+    def test_queue_missing_previews(self):
+        enqueue_resume_parse(self.candidate)
+        self.create_candidate('john@example.com')
+        call_command('queue_resume_previews', stdout=io.StringIO())
+        # Only the candidate without a pending parse gets a new job
+        self.assertEqual(ResumeParseJob.objects.count(), 2)
+        run_parse_jobs(claim_jobs(10))
+        self.assertEqual(enqueue_missing_previews(), 0)
+
+    def test_text_preview(self):
+        self.assertEqual(text_preview('  Jane   Doe\n\n\n  Engineer  '), 'Jane Doe\n Engineer')
+        self.assertEqual(text_preview('one two three four', length=12), 'one two…')
+
+    def test_other_parser_versions_are_ignored_and_purged(self):
+        ResumeParseCache.objects.create(
+            content_hash=self.candidate.resume_hash, parser_version='0', text='',
+            entities={'skills': [{'skill': 'COBOL', 'years_experience': 9}], 'education': [], 'work_experience': []},
+        )
+        enqueue_resume_parse(self.candidate)
+        run_parse_jobs(claim_jobs(10))
+        self.assertFalse(self.candidate.skills.filter(skill='COBOL').exists())
+        self.assertEqual(purge_stale_parse_cache(), 1)
+        self.assertEqual(ResumeParseCache.objects.count(), 1)
+
+
+class CandidateSearchTests(QueryBudgetTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('recruiter', 'recruiter@example.com', 'password')
+        department = Department.objects.create(name='Engineering')
+        job = JobPost.objects.create(
+            title='Engineer', department=department, location='Remote', description='Build things',
+            requirements='Python', responsibilities='Ship features', created_by=cls.user,
+        )
+        cls.backend = Candidate.objects.create(
+            first_name='Grace', last_name='Hopper', email='grace@example.com', resume='resumes/a.pdf',
+            cover_letter='I have built compilers and backend services.',
+        )
+        cls.frontend = Candidate.objects.create(
+            first_name='Alan', last_name='Kay', email='alan@example.com', resume='resumes/b.pdf',
+            cover_letter='Frontend developer who enjoys design systems.',
+        )
+        CandidateSkill.objects.create(candidate=cls.backend, skill='Django')
+        CandidateSkill.objects.create(candidate=cls.frontend, skill='React')
+        index_candidates([cls.backend.id, cls.frontend.id])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_ranks_candidates_by_matching_fields(self):
+        self.assertEqual([cid for cid, _ in search_candidate_ids('django compilers')], [self.backend.id])
+        self.assertEqual([cid for cid, _ in search_candidate_ids('react')], [self.frontend.id])
+        self.assertEqual(search_candidate_ids('the and of'), [])
+
+    def test_index_follows_notes_skills_and_deletes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            note = Note.objects.create(candidate=self.frontend, author=self.user, content='Strong Kubernetes experience')
+        # Writes only mark the candidate stale; the index catches up when drained
+        self.assertEqual(search_candidate_ids('kubernetes'), [])
+        self.assertGreaterEqual(drain_stale(), 1)
+        self.assertEqual([cid for cid, _ in search_candidate_ids('kubernetes')], [self.frontend.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            note.delete()
+            CandidateSkill.objects.filter(candidate=self.backend).delete()
+        drain_stale()
+        self.assertEqual(search_candidate_ids('kubernetes'), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.backend.delete()
+        drain_stale()
+        self.assertEqual(search_candidate_ids('compilers'), [])
+
+    def test_search_view(self):
+        response = self.assertWithinQueryBudget(reverse('candidate_search'), data={'q': 'react frontend developer'})
+        self.assertEqual(response.context['results'], [self.frontend])
+
+
+class CandidateMatchingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('recruiter', 'recruiter@example.com', 'password')
+        department = Department.objects.create(name='Engineering')
+        cls.backend_job = JobPost.objects.create(
+            title='Backend Engineer', department=department, location='Remote', description='APIs',
+            requirements='Python, Django and PostgreSQL', responsibilities='Ship features', created_by=cls.user,
+        )
+        cls.frontend_job = JobPost.objects.create(
+            title='Frontend Engineer', department=department, location='Remote', description='UI',
+            requirements='React and TypeScript', responsibilities='Ship features', created_by=cls.user,
+        )
+        cls.senior = cls.create_candidate('senior@example.com', [('Python', 8), ('Django', 6), ('PostgreSQL', 5)])
+        cls.junior = cls.create_candidate('junior@example.com', [('Python', 1)])
+        cls.frontend = cls.create_candidate('frontend@example.com', [('React', 4), ('TypeScript', 3)])
+        CandidateWorkExperience.objects.create(
+            candidate=cls.junior, company='Acme', position='Developer',
+            from_date='2022-01-01', description='Maintained Django services',
+        )
+
+    @classmethod
+    def create_candidate(cls, email, skills):
+        candidate = Candidate.objects.create(
+            first_name='Test', last_name='Candidate', email=email, resume='resumes/r.pdf',
+        )
+        for skill, years in skills:
+            CandidateSkill.objects.create(candidate=candidate, skill=skill, years_experience=years)
+        return candidate
+
+    def setUp(self):
+        # The index is memoised per process and would otherwise outlive the
+        # rolled-back change sets of an earlier test
+        reset_match_index()
+
+    def test_ranks_candidates_for_job(self):
+        ranked = rank_candidates(self.backend_job)
+        self.assertEqual([cid for cid, _ in ranked], [self.senior.id, self.junior.id, self.frontend.id])
+        self.assertEqual(ranked[-1][1], 0.0)
+        self.assertTrue(0 < ranked[0][1] <= 1)
+
+        ranked = rank_candidates(self.frontend_job, candidate_ids=[self.junior.id, self.frontend.id], limit=1)
+        self.assertEqual([cid for cid, _ in ranked], [self.frontend.id])
+
+    def test_ranks_jobs_for_candidate(self):
+        ranked = rank_jobs(self.frontend.id, JobPost.objects.order_by('id'))
+        self.assertEqual([job for job, _ in ranked], [self.frontend_job, self.backend_job])
+
+    def test_skill_changes_rebuild_the_index(self):
+        def junior_score():
+            return dict(rank_candidates(self.frontend_job))[self.junior.id]
+
+        self.assertEqual(junior_score(), 0.0)
+        with self.captureOnCommitCallbacks(execute=True):
+            CandidateSkill.objects.create(candidate=self.junior, skill='React', years_experience=2)
+        drain_stale()
+        self.assertGreater(junior_score(), 0.0)
+
+    def test_changes_update_only_their_rows(self):
+        rank_candidates(self.backend_job)
+        with self.captureOnCommitCallbacks(execute=True):
+            CandidateSkill.objects.create(candidate=self.frontend, skill='Rust', years_experience=1)
+            newcomer = self.create_candidate('newcomer@example.com', [('Django', 2)])
+            self.junior.delete()
+        drain_stale()
+        with mock.patch('candidates.matching.build_match_index', side_effect=AssertionError):
+            ranked = dict(rank_candidates(self.backend_job))
+            self.assertEqual(set(ranked), {self.senior.id, self.frontend.id, newcomer.id})
+            self.assertGreater(ranked[newcomer.id], 0.0)
+            self.assertGreater(dict(rank_candidates(self.frontend_job))[self.frontend.id], 0.0)
+            self.assertEqual(get_match_index().matched_terms('rust', [self.frontend.id]), {self.frontend.id: ['rust']})
+
+    def test_follows_changes_made_by_other_processes(self):
+        rank_candidates(self.frontend_job)
+        # As the resume worker would: rows written without this process's
+        # signals, then a change set published once they are committed
+        CandidateSkill.objects.bulk_create([CandidateSkill(candidate=self.junior, skill='React', years_experience=2)])
+        record_changes([self.junior.id])
+        with mock.patch('candidates.matching.build_match_index', side_effect=AssertionError):
+            self.assertGreater(dict(rank_candidates(self.frontend_job))[self.junior.id], 0.0)
+
+        # A bulk import makes every process rebuild
+        CandidateSkill.objects.bulk_create([CandidateSkill(candidate=self.senior, skill='React', years_experience=1)])
+        invalidate_match_index()
+        self.assertGreater(dict(rank_candidates(self.frontend_job))[self.senior.id], 0.0)
+
+
+class PipelineAnalyticsTests(QueryBudgetTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('recruiter', 'recruiter@example.com', 'password')
+        department = Department.objects.create(name='Engineering')
+        cls.job = JobPost.objects.create(
+            title='Engineer', department=department, location='Remote', description='Build things',
+            requirements='Python', responsibilities='Ship features', created_by=cls.user,
+        )
+        cls.applications = [
+            Application.objects.create(
+                candidate=Candidate.objects.create(
+                    first_name='Test', last_name=str(i), email=f'pipeline{i}@example.com', resume='resumes/r.pdf',
+                ),
+                job=cls.job,
+            )
+            for i in range(4)
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_stage_changes_are_logged_and_rolled_up(self):
+        ids = [application.id for application in self.applications]
+        Application.objects.filter(id__in=ids[:2]).update(stage_changed_at=timezone.now() - timedelta(days=3))
+        self.assertEqual(len(change_stage(ids, 'screening', user=self.user)), 4)
+        self.assertEqual(change_stage(ids[:1], 'screening'), [])
+        change_stage(ids[:1], 'interview')
+
+        transitions = StageTransition.objects.filter(application=self.applications[0]).order_by('id')
+        self.assertEqual([(t.from_stage, t.to_stage) for t in transitions], [('', 'new'), ('new', 'screening'), ('screening', 'interview')])
+        self.assertEqual(funnel(job_id=self.job.id), {'new': 4, 'screening': 4, 'interview': 1})
+
+        durations = time_in_stage(job_id=self.job.id)
+        self.assertEqual(durations['new']['count'], 4)
+        self.assertLessEqual(durations['new'][50], 1)
+        self.assertGreaterEqual(durations['new'][90], 72)
+
+        daily = list(StageDailyCount.objects.values_list('stage', 'entered').order_by('stage'))
+        buckets = list(StageDurationBucket.objects.values_list('stage', 'bucket', 'count').order_by('stage', 'bucket'))
+        rebuild_rollups()
+        self.assertEqual(list(StageDailyCount.objects.values_list('stage', 'entered').order_by('stage')), daily)
+        self.assertEqual(
+            list(StageDurationBucket.objects.values_list('stage', 'bucket', 'count').order_by('stage', 'bucket')), buckets,
+        )
+
+    def test_job_counters_follow_applications(self):
+        def counters():
+            job = JobPost.objects.get(id=self.job.id)
+            return job.applicant_count, {stage: count for stage, _, count in job.stage_counts() if count}
+
+        self.assertEqual(counters(), (4, {'new': 4}))
+        ids = [application.id for application in self.applications]
+        change_stage(ids[:3], 'screening')
+        change_stage(ids[:1], 'interview')
+        self.assertEqual(counters(), (4, {'new': 1, 'screening': 2, 'interview': 1}))
+
+        self.applications[1].candidate.delete()
+        self.assertEqual(counters(), (3, {'new': 1, 'screening': 1, 'interview': 1}))
+
+        JobPost.objects.filter(id=self.job.id).update(applicant_count=10, hired_count=2, new_count=0)
+        stdout = io.StringIO()
+        call_command('reconcile_job_counters', stdout=stdout)
+        self.assertIn('corrected 1 job(s)', stdout.getvalue())
+        self.assertEqual(counters(), (3, {'new': 1, 'screening': 1, 'interview': 1}))
+
+    def test_histogram_percentile(self):
+        self.assertIsNone(histogram_percentile({}, 50))
+        self.assertEqual(histogram_percentile({1: 2}, 50), 2.5)
+        self.assertEqual(histogram_percentile({0: 1, 12: 1}, 90), 24 * 180)
+
+    def test_dashboard(self):
+        change_stage([self.applications[0].id], 'hired')
+        response = self.assertWithinQueryBudget(reverse('pipeline_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        funnel_rows = {row['stage']: row for row in response.context['funnel_rows']}
+        self.assertEqual(funnel_rows['New']['entered'], 4)
+        self.assertEqual(funnel_rows['Hired']['rate'], 25)
+        self.assertEqual(response.context['job_rows'][0]['title'], 'Engineer')
+        self.assertWithinQueryBudget(reverse('pipeline_dashboard'), data={'job': self.job.id, 'days': 7})
+
+
+IMPORT_CSV = """first_name,last_name,email,phone,stage,job,resume,skills,education,experience
+Ada,Lovelace,ada@example.com,555-0100,,Engineer,resumes/ada.pdf,Python:5; SQL,Cambridge University | BSc | Mathematics | 2010-09-01 | 2013-06-30,Acme | Developer | 2014-01-01 | | Built APIs
+Bad,Email,not-an-email,,,,,,,
+Ada,Again,ADA@example.com,,,,,,,
+Unknown,Job,unknown@example.com,,,Astronaut,,,,
+Bad,Skill,badskill@example.com,,,,,Python:many,,
+Existing,Person,existing@example.com,,screening,,,,,
+,,,,,,,,,
+Grace,Hopper,grace@example.com,,interview,{job_id},,Django:2,,
+"""
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class CandidateImportTests(QueryBudgetTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('recruiter', 'recruiter@example.com', 'password')
+        department = Department.objects.create(name='Engineering')
+        cls.job = JobPost.objects.create(
+            title='Engineer', department=department, location='Remote', description='Build things',
+            requirements='Python', responsibilities='Ship features', created_by=cls.user,
+        )
+        Application.objects.create(
+            candidate=Candidate.objects.create(
+                first_name='Existing', last_name='Person', email='existing@example.com', resume='resumes/e.pdf',
+            ),
+            job=cls.job,
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def write_file(self, name, content):
+        path = os.path.join(MEDIA_ROOT, name)
+        with open(path, 'w') as file:
+            file.write(content.format(job_id=self.job.id))
+        return path
+
+    def test_imports_valid_rows_and_reports_the_rest(self):
+        report = io.StringIO()
+        importer = CandidateImporter(default_job=self.job, batch_size=3, report=write_error_report(report))
+        with self.captureOnCommitCallbacks(execute=True):
+            result = importer.run(self.write_file('import.csv', IMPORT_CSV))
+        drain_stale()
+
+        self.assertEqual((result.created, result.failed), (2, 5))
+        ada = Candidate.objects.get(email='ada@example.com')
+        self.assertEqual(ada.resume.name, 'resumes/ada.pdf')
+        self.assertEqual(sorted(ada.skills.values_list('skill', 'years_experience')), [('Python', 5), ('SQL', 0)])
+        self.assertEqual(ada.education.get().field_of_study, 'Mathematics')
+        self.assertEqual(ada.work_experience.get().description, 'Built APIs')
+        self.assertTrue(ada.parse_jobs.exists())
+        self.assertEqual(Application.objects.get(candidate__email='grace@example.com').stage, 'interview')
+        self.assertEqual(StageTransition.objects.filter(candidate__email='grace@example.com').get().to_stage, 'interview')
+        self.assertEqual([cid for cid, _ in search_candidate_ids('django')], [Candidate.objects.get(email='grace@example.com').id])
+
+        rows = list(csv.reader(io.StringIO(report.getvalue())))
+        self.assertEqual(rows[0], ['row', 'field', 'error'])
+        reported = {(row, field) for row, field, _ in rows[1:]}
+        self.assertEqual(reported, {('3', 'email'), ('4', 'email'), ('5', 'job'), ('6', 'skills'), ('7', 'email')})
+
+    def test_existing_candidates_apply_to_other_jobs(self):
+        other = JobPost.objects.create(
+            title='Designer', department=self.job.department, location='Remote', description='Draw things',
+            requirements='Figma', responsibilities='Ship designs', created_by=self.user,
+        )
+        path = self.write_file('apply.csv', (
+            'first_name,last_name,email,job,stage\n'
+            'Existing,Person,EXISTING@example.com,Designer,screening\n'
+            'Ada,Lovelace,ada@example.com,Engineer,\n'
+            'Ada,Lovelace,ada@example.com,Designer,\n'
+        ))
+        with self.captureOnCommitCallbacks(execute=True):
+            result = CandidateImporter().run(path)
+        self.assertEqual((result.created, result.failed), (3, 0))
+        self.assertEqual(Candidate.objects.filter(email__in=['existing@example.com', 'ada@example.com']).count(), 2)
+        self.assertEqual(
+            Application.objects.get(candidate__email='existing@example.com', job=other).stage, 'screening',
+        )
+        self.assertEqual(Application.objects.filter(candidate__email='ada@example.com').count(), 2)
+
+    def test_imports_xlsx(self):
+        from openpyxl import Workbook
+        workbook = Workbook()
+        workbook.active.append(['First_Name', 'Last_Name', 'Email', 'Job', 'Skills'])
+        workbook.active.append(['Linus', 'T', 'linus@example.com', self.job.id, 'C:20'])
+        path = os.path.join(MEDIA_ROOT, 'import.xlsx')
+        workbook.save(path)
+
+        result = CandidateImporter().run(path)
+        self.assertEqual((result.created, result.failed), (1, 0))
+        self.assertEqual(Candidate.objects.get(email='linus@example.com').skills.get().years_experience, 20)
+
+    def test_import_command_writes_error_report(self):
+        path = self.write_file('command.csv', IMPORT_CSV)
+        stdout = io.StringIO()
+        call_command('import_candidates', path, '--job', str(self.job.id), stdout=stdout)
+        self.assertIn('Imported 2 of 7 row(s)', stdout.getvalue())
+        with open(f'{path}.errors.csv') as report:
+            self.assertEqual(len(report.readlines()), 6)
+
+    def test_import_view(self):
+        upload = SimpleUploadedFile('candidates.csv', IMPORT_CSV.format(job_id=self.job.id).encode())
+        response = self.assertWithinQueryBudget(
+            reverse('candidate_import'), method='post', data={'file': upload, 'job': self.job.id},
+        )
+        self.assertEqual(response.context['result'].created, 2)
+        self.assertEqual(len(response.context['result'].errors), 5)
+
+        upload = SimpleUploadedFile('candidates.csv', IMPORT_CSV.format(job_id=self.job.id).encode())
+        response = self.client.post(reverse('candidate_import'), {'file': upload, 'download_errors': 'on'})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = response.content.decode().splitlines()
+        self.assertEqual(lines[0], 'row,field,error')
+        self.assertIn('2,email,This candidate has already applied for this job.', lines)
+
+
+class CandidateExportTests(QueryBudgetTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('recruiter', 'recruiter@example.com', 'password')
+        department = Department.objects.create(name='Engineering')
+        cls.job = JobPost.objects.create(
+            title='Engineer', department=department, location='Remote', description='Build things',
+            requirements='Python', responsibilities='Ship features', created_by=cls.user,
+        )
+        for i in range(5):
+            candidate = Candidate.objects.create(
+                first_name='Test', last_name=str(i), email=f'export{i}@example.com', resume='resumes/r.pdf',
+            )
+            Application.objects.create(candidate=candidate, job=cls.job, stage='screening' if i % 2 else 'new')
+            CandidateSkill.objects.create(candidate=candidate, skill='Python', years_experience=i)
+            CandidateEducation.objects.create(
+                candidate=candidate, institution='MIT', degree='BSc', from_date='2010-09-01', to_date='2014-06-30',
+            )
+            Note.objects.create(candidate=candidate, author=cls.user, content=f'Note; with | separators {i}')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def export(self, fmt, **params):
+        response = self.assertWithinQueryBudget(reverse('candidate_export', args=[fmt]), data=params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_jsonl_export_prefetches_per_chunk(self):
+        # One query for the candidates and one per prefetched relation, not
+        # one per candidate
+        response = self.client.get(reverse('candidate_export', args=['jsonl']))
+        with self.assertNumQueries(6):
+            content = b''.join(response.streaming_content)
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([row['email'] for row in rows], [f'export{i}@example.com' for i in range(5)])
+        self.assertEqual(rows[3]['skills'], [{'skill': 'Python', 'years_experience': 3}])
+        self.assertEqual(rows[0]['education'][0]['to_date'], '2014-06-30')
+        self.assertEqual(rows[0]['notes'][0]['author'], 'recruiter')
+        self.assertEqual(rows[1]['applications'][0]['job'], 'Engineer')
+        self.assertEqual(rows[1]['applications'][0]['stage'], 'screening')
+
+    def test_csv_export_applies_list_filters(self):
+        rows = list(csv.DictReader(io.StringIO(self.export('csv', stage='screening').decode())))
+        self.assertEqual([row['email'] for row in rows], ['export1@example.com', 'export3@example.com'])
+        self.assertEqual(json.loads(rows[0]['notes'])[0]['content'], 'Note; with | separators 1')
+
+    def test_parquet_export(self):
+        import pyarrow.parquet as pq
+        table = pq.read_table(io.BytesIO(self.export('parquet', job=self.job.id)))
+        self.assertEqual(table.num_rows, 5)
+        self.assertEqual(table.column('skills').to_pylist()[4], [{'skill': 'Python', 'years_experience': 4}])
+
+    def test_unknown_format(self):
+        self.assertEqual(self.client.get(reverse('candidate_export', args=['xml'])).status_code, 404)
+
+
+class DuplicateCandidateTests(QueryBudgetTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('recruiter', 'recruiter@example.com', 'password')
+        department = Department.objects.create(name='Engineering')
+        cls.jobs = [
+            JobPost.objects.create(
+                title=f'Engineer {i}', department=department, location='Remote', description='Build things',
+                requirements='Python', responsibilities='Ship features', created_by=cls.user,
+            )
+            for i in range(2)
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def create(self, first_name, last_name, email, phone='', job=0):
+        with self.captureOnCommitCallbacks(execute=True):
+            candidate = Candidate.objects.create(
+                first_name=first_name, last_name=last_name, email=email, phone=phone, resume='resumes/r.pdf',
+            )
+            Application.objects.create(candidate=candidate, job=self.jobs[job])
+        return candidate
+
+    def test_normalisation(self):
+        self.assertEqual(normalize_email(' Jane.Doe+jobs@GoogleMail.com'), 'janedoe@gmail.com')
+        self.assertEqual(normalize_email('jane.doe@example.com'), 'jane.doe@example.com')
+        self.assertEqual(normalize_phone('+1 (415) 555-0100'), '4155550100')
+        self.assertEqual(normalize_phone('555'), '')
+        self.assertEqual((soundex('Robert'), soundex('Rupert'), soundex('Tymczak')), ('R163', 'R163', 'T522'))
+        keys = blocking_keys({
+            'first_name': 'José', 'last_name': 'Núñez', 'email': 'jose@example.com', 'phone': '', 'resume_hash': '',
+        })
+        self.assertEqual(keys, [('email', 'jose@example.com'), ('name', 'N520:J200')])
+
+    def test_scoring_needs_more_than_a_name(self):
+        jane = {'first_name': 'Jane', 'last_name': 'Doe', 'email': 'jane@a.com', 'phone': '', 'resume_hash': ''}
+        namesake = dict(jane, email='jane@b.com')
+        self.assertLess(score_pair(jane, namesake)[0], 0.65)
+        same_phone = dict(namesake, phone='0044 20 7946 0958')
+        self.assertEqual(score_pair(dict(jane, phone='+44 20 7946 0958'), same_phone)[1], ['phone', 'name'])
+
+    def test_detects_duplicates_on_create_and_update(self):
+        jane = self.create('Jane', 'Doe', 'jane.doe@gmail.com', phone='+1 415 555 0100')
+        self.create('John', 'Smith', 'john@example.com')
+        again = self.create('Jane', 'Doe', 'janedoe+jobs@gmail.com', job=1)
+        duplicate = DuplicateCandidate.objects.get()
+        self.assertEqual((duplicate.candidate_id, duplicate.other_id), (jane.id, again.id))
+        self.assertIn('email', duplicate.reasons)
+        self.assertEqual([match.match for match in find_duplicates_of(again)], [jane])
+
+        # A matching phone number and a similar name is enough on its own
+        jayne = self.create('Jayne', 'Doe', 'jayne@example.com', phone='415-555-0100')
+        self.assertTrue(DuplicateCandidate.objects.filter(candidate=jane, other=jayne).exists())
+
+        # Changing identifying fields re-scores the candidate
+        with self.captureOnCommitCallbacks(execute=True):
+            jayne.phone = ''
+            jayne.save()
+        self.assertFalse(DuplicateCandidate.objects.filter(other=jayne).exists())
+
+    def test_dismissed_pairs_stay_dismissed(self):
+        jane = self.create('Jane', 'Doe', 'jane.doe@gmail.com')
+        again = self.create('Jane', 'Doe', 'janedoe@gmail.com')
+        duplicate = DuplicateCandidate.objects.get()
+        self.assertWithinQueryBudget(reverse('dismiss_duplicate', args=[duplicate.id]), method='post')
+        with self.captureOnCommitCallbacks(execute=True):
+            again.save()
+        call_command('rebuild_duplicate_index', stdout=io.StringIO())
+        self.assertEqual(DuplicateCandidate.objects.get().status, 'dismissed')
+        self.assertEqual(find_duplicates_of(jane), [])
+
+    def test_rebuild_command_rescans_blocks(self):
+        jane = self.create('Jane', 'Doe', 'jane.doe@gmail.com')
+        again = self.create('Jane', 'Doe', 'janedoe@gmail.com')
+        CandidateBlockingKey.objects.all().delete()
+        DuplicateCandidate.objects.all().delete()
+        stdout = io.StringIO()
+        call_command('rebuild_duplicate_index', '--chunk-size', '2', stdout=stdout)
+        self.assertIn('found 1 likely duplicate pair(s)', stdout.getvalue())
+        self.assertEqual(CandidateBlockingKey.objects.filter(candidate=again).count(), 2)
+        self.assertTrue(DuplicateCandidate.objects.filter(candidate=jane, other=again).exists())
+
+    def test_import_detects_duplicates(self):
+        jane = self.create('Jane', 'Doe', 'jane.doe@gmail.com')
+        path = os.path.join(MEDIA_ROOT, 'duplicates.csv')
+        with open(path, 'w') as file:
+            file.write(f'first_name,last_name,email,job\nJane,Doe,JaneDoe@gmail.com,{self.jobs[1].id}\n')
+        with self.captureOnCommitCallbacks(execute=True):
+            CandidateImporter().run(path)
+        self.assertEqual(DuplicateCandidate.objects.get().candidate, jane)
+
+    def test_merge_moves_related_rows(self):
+        keep = self.create('Jane', 'Doe', 'jane.doe@gmail.com')
+        duplicate = self.create('Jane', 'Doe', 'janedoe@gmail.com', phone='415 555 0100', job=1)
+        CandidateSkill.objects.create(candidate=keep, skill='Python', years_experience=3)
+        CandidateSkill.objects.create(candidate=duplicate, skill='python', years_experience=1)
+        CandidateSkill.objects.create(candidate=duplicate, skill='SQL', years_experience=2)
+        Note.objects.create(candidate=duplicate, author=self.user, content='Great call')
+        interview = Interview.objects.create(
+            candidate=duplicate, job=self.jobs[1], scheduled_at=timezone.now(), duration=30,
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            merge_candidates(keep, duplicate, self.user)
+        self.assertFalse(Candidate.objects.filter(id=duplicate.id).exists())
+        keep.refresh_from_db()
+        self.assertEqual(keep.phone, '415 555 0100')
+        self.assertEqual(sorted(keep.skills.values_list('skill', 'years_experience')), [('Python', 3), ('SQL', 2)])
+        interview.refresh_from_db()
+        self.assertEqual(interview.candidate, keep)
+        self.assertEqual(keep.notes.count(), 2)
+        self.assertIn('Engineer 1', keep.notes.exclude(content='Great call').get().content)
+        self.assertEqual(StageTransition.objects.filter(candidate=keep).count(), 2)
+        self.assertFalse(DuplicateCandidate.objects.exists())
+        with self.assertRaises(ValueError):
+            merge_candidates(keep, keep, self.user)
+
+    def test_views(self):
+        jane = self.create('Jane', 'Doe', 'jane.doe@gmail.com')
+        again = self.create('Jane', 'Doe', 'janedoe@gmail.com')
+        response = self.assertWithinQueryBudget(reverse('duplicate_list'))
+        self.assertEqual(len(response.context['duplicates']), 1)
+        response = self.assertWithinQueryBudget(reverse('candidate_detail', args=[again.id]))
+        self.assertContains(response, 'Possible Duplicates')
+        url = reverse('candidate_merge', args=[jane.id, again.id])
+        self.assertWithinQueryBudget(url)
+        response = self.assertWithinQueryBudget(url, method='post')
+        self.assertRedirects(response, reverse('candidate_detail', args=[jane.id]))
+        self.assertFalse(Candidate.objects.filter(id=again.id).exists())
+        self.assertEqual(self.client.get(reverse('candidate_merge', args=[jane.id, jane.id])).status_code, 404)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, RESUME_UPLOAD_CHUNK_SIZE=8)
+class ResumeUploadTests(QueryBudgetTestMixin, TestCase):
+    CONTENT = b'%PDF-1.4 chunked resume'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('recruiter', 'recruiter@example.com', 'password')
+        cls.job = JobPost.objects.create(
+            title='Engineer', department=Department.objects.create(name='Engineering'), location='Remote',
+            description='Build things', requirements='Python', responsibilities='Ship features',
+            status='published', created_by=cls.user,
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def start(self, filename='resume.pdf', size=None):
+        return self.assertWithinQueryBudget(
+            reverse('resume_upload_start'), method='post',
+            data={'filename': filename, 'size': len(self.CONTENT) if size is None else size},
+        )
+
+    def send(self, upload_id, offset, chunk):
+        return self.assertWithinQueryBudget(
+            reverse('resume_upload_chunk', args=[upload_id]), method='patch', data=chunk,
+            content_type='application/octet-stream', headers={'Upload-Offset': str(offset)},
+        )
+
+    def upload(self):
+        upload_id = self.start().json()['id']
+        for offset in range(0, len(self.CONTENT), 8):
+            state = self.send(upload_id, offset, self.CONTENT[offset:offset + 8]).json()
+        self.assertTrue(state['complete'])
+        return upload_id
+
+    def test_chunks_are_stored_under_their_hash(self):
+        upload_id = self.upload()
+        upload = ResumeUpload.objects.get(pk=upload_id)
+        digest = content_hash([self.CONTENT])
+        self.assertEqual(upload.sha256, digest)
+        self.assertEqual(upload.stored_name, os.path.join('resumes', digest[:2], digest[2:4], f'{digest}.pdf'))
+        with open(os.path.join(MEDIA_ROOT, upload.stored_name), 'rb') as stored:
+            self.assertEqual(stored.read(), self.CONTENT)
+        self.assertFalse(os.path.exists(part_path(upload)))
+
+    def test_resume_after_a_lost_chunk(self):
+        upload_id = self.start().json()['id']
+        self.send(upload_id, 0, self.CONTENT[:8])
+        # A retry of a chunk that did arrive, or one that skips ahead, is
+        # answered with the offset to carry on from
+        response = self.send(upload_id, 0, self.CONTENT[:8])
+        self.assertEqual((response.status_code, response.json()['offset']), (409, 8))
+        self.assertEqual(self.send(upload_id, 16, self.CONTENT[16:]).status_code, 409)
+        state = self.assertWithinQueryBudget(reverse('resume_upload_chunk', args=[upload_id])).json()
+        self.assertEqual(state['offset'], 8)
+        for offset in range(8, len(self.CONTENT), 8):
+            self.send(upload_id, offset, self.CONTENT[offset:offset + 8])
+        self.assertEqual(ResumeUpload.objects.get(pk=upload_id).sha256, content_hash([self.CONTENT]))
+
+    def test_late_duplicate_chunk_leaves_the_file_alone(self):
+        upload_id = self.start().json()['id']
+        stale = ResumeUpload.objects.get(pk=upload_id)
+        self.send(upload_id, 0, self.CONTENT[:8])
+        self.send(upload_id, 8, self.CONTENT[8:16])
+        # A retry of the first chunk arriving after the second was written
+        with self.assertRaises(UploadOffsetConflict):
+            append_chunk(stale, 0, io.BytesIO(b'XXXXXXXX'), 8)
+        with open(part_path(stale), 'rb') as part:
+            self.assertEqual(part.read(), self.CONTENT[:16])
+
+    def test_interleaved_appends_at_the_same_offset(self):
+        upload_id = self.start().json()['id']
+        first = ResumeUpload.objects.get(pk=upload_id)
+        second = ResumeUpload.objects.get(pk=upload_id)
+        conflicts = []
+
+        class Interleaved(io.BytesIO):
+            # Starts the duplicate while the first request is mid-chunk
+            def read(self, size=-1):
+                if not conflicts:
+                    with self.test.assertRaises(UploadOffsetConflict) as raised:
+                        append_chunk(second, 0, io.BytesIO(b'XXXXXXXX'), 8)
+                    conflicts.append(raised.exception.offset)
+                return super().read(size)
+
+        stream = Interleaved(self.CONTENT[:8])
+        stream.test = self
+        append_chunk(first, 0, stream, 8)
+        self.assertEqual(conflicts, [0])
+        self.assertEqual(ResumeUpload.objects.get(pk=upload_id).received, 8)
+        with open(part_path(first), 'rb') as part:
+            self.assertEqual(part.read(), self.CONTENT[:8])
+        # Once the first request is done, the duplicate is told to move on
+        with self.assertRaises(UploadOffsetConflict) as raised:
+            append_chunk(second, 0, io.BytesIO(b'XXXXXXXX'), 8)
+        self.assertEqual(raised.exception.offset, 8)
+
+    def test_short_body_is_not_counted(self):
+        upload = ResumeUpload.objects.get(pk=self.start().json()['id'])
+        with self.assertRaises(UploadError):
+            append_chunk(upload, 0, io.BytesIO(b'%PDF'), 8)
+        upload.refresh_from_db()
+        self.assertEqual(upload.received, 0)
+        # The running digest is lost with the failed chunk, so the finished
+        # file is hashed from disk
+        for offset in range(0, len(self.CONTENT), 8):
+            chunk = self.CONTENT[offset:offset + 8]
+            append_chunk(upload, offset, io.BytesIO(chunk), len(chunk))
+        self.assertEqual(upload.sha256, content_hash([self.CONTENT]))
+
+    def test_rejected_uploads(self):
+        self.assertEqual(self.start(filename='resume.exe').status_code, 400)
+        self.assertEqual(self.start(size=0).status_code, 400)
+        self.assertEqual(self.start(size=10 ** 9).status_code, 400)
+        upload_id = self.start().json()['id']
+        # Chunks over the size limit or past the end
+        self.assertEqual(self.send(upload_id, 0, b'x' * 9).status_code, 400)
+        other = User.objects.create_user('other', 'other@example.com', 'password')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(reverse('resume_upload_chunk', args=[upload_id])).status_code, 404)
+
+    def test_candidate_create_with_upload(self):
+        upload_id = self.upload()
+        stored_name = ResumeUpload.objects.get(pk=upload_id).stored_name
+        data = {
+            'first_name': 'New', 'last_name': 'Person', 'email': 'new.person@example.com', 'phone': '',
+            'cover_letter': '', 'job': self.job.id, 'stage': 'new', 'resume_upload': upload_id,
+            'skills-TOTAL_FORMS': '0', 'skills-INITIAL_FORMS': '0',
+            'education-TOTAL_FORMS': '0', 'education-INITIAL_FORMS': '0',
+            'experience-TOTAL_FORMS': '0', 'experience-INITIAL_FORMS': '0',
+        }
+        response = self.assertWithinQueryBudget(reverse('candidate_create'), method='post', data=data)
+        self.assertEqual(response.status_code, 302)
+        candidate = Candidate.objects.get(email='new.person@example.com')
+        self.assertEqual(candidate.resume.name, stored_name)
+        self.assertEqual(candidate.resume_hash, content_hash([self.CONTENT]))
+        self.assertFalse(ResumeUpload.objects.filter(pk=upload_id).exists())
+
+        # Neither a file nor a finished upload
+        data['email'] = 'another@example.com'
+        data['resume_upload'] = self.start().json()['id']
+        response = self.client.post(reverse('candidate_create'), data)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('resume_upload', response.context['form'].errors)
+        del data['resume_upload']
+        response = self.client.post(reverse('candidate_create'), data)
+        self.assertIn('resume', response.context['form'].errors)
+
+    def test_purge_stale_uploads(self):
+        upload = ResumeUpload.objects.get(pk=self.start().json()['id'])
+        self.assertEqual(purge_stale_uploads(), 0)
+        ResumeUpload.objects.filter(pk=upload.pk).update(updated_at=timezone.now() - timedelta(days=2))
+        call_command('purge_resume_uploads', stdout=io.StringIO())
+        self.assertFalse(ResumeUpload.objects.exists())
+        self.assertFalse(os.path.exists(part_path(upload)))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ResumeDownloadTests(QueryBudgetTestMixin, TestCase):
+    CONTENT = b'%PDF-1.4 ' + bytes(range(256)) * 4
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('recruiter', 'recruiter@example.com', 'password')
+        cls.candidate = Candidate.objects.create(
+            first_name='Jane', last_name='Doe', email='jane@example.com',
+            resume=ContentFile(cls.CONTENT, name='resume.pdf'),
+        )
+        cls.url = reverse('candidate_resume', args=[cls.candidate.id])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_login_required(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+    def test_whole_file_and_etag(self):
+        response = self.assertWithinQueryBudget(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.CONTENT)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(response['Content-Length'], str(len(self.CONTENT)))
+        self.assertEqual(response['ETag'], f'"{self.candidate.resume_hash}"')
+        self.assertIn('inline', response['Content-Disposition'])
+        self.assertIn('private', response['Cache-Control'])
+
+        response = self.assertWithinQueryBudget(self.url, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    def test_ranges(self):
+        size = len(self.CONTENT)
+        for header, (first, last) in [
+            ('bytes=0-99', (0, 99)), ('bytes=1000-', (1000, size - 1)), ('bytes=-10', (size - 10, size - 1)),
+            ('bytes=1000-99999', (1000, size - 1)),
+        ]:
+            with self.subTest(header):
+                response = self.assertWithinQueryBudget(self.url, headers={'Range': header})
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response['Content-Range'], f'bytes {first}-{last}/{size}')
+                self.assertEqual(b''.join(response.streaming_content), self.CONTENT[first:last + 1])
+
+        response = self.client.get(self.url, headers={'Range': f'bytes={size}-'})
+        self.assertEqual((response.status_code, response['Content-Range']), (416, f'bytes */{size}'))
+        # Several ranges, or a range of an older version, get the whole file
+        for headers in [{'Range': 'bytes=0-1,5-6'}, {'Range': 'bytes=0-1', 'If-Range': '"stale"'}]:
+            self.assertEqual(self.client.get(self.url, headers=headers).status_code, 200)
+
+    @override_settings(RESUME_SENDFILE='x-accel-redirect', RESUME_SENDFILE_PREFIX='/protected-media/')
+    def test_accel_redirect(self):
+        response = self.client.get(self.url, headers={'Range': 'bytes=0-9'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.candidate.resume.name}')
+        self.assertEqual(response.content, b'')
+
+    @override_settings(RESUME_SENDFILE='x-sendfile')
+    def test_sendfile(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Sendfile'], os.path.join(MEDIA_ROOT, self.candidate.resume.name))
+
+    def test_missing_file(self):
+        Candidate.objects.filter(pk=self.candidate.pk).update(resume='resumes/gone.pdf')
+        self.assertEqual(self.client.get(self.url).status_code, 404)
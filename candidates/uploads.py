@@ -0,0 +1,218 @@
+# candidates/uploads.py
+"""
+Chunked, resumable resume uploads.
+
+A client starts an upload by declaring the file name and size, then sends
+the bytes in order as raw request bodies, each tagged with the offset it
+starts at. If a request fails, the client asks for the current offset and
+carries on from there, so a dropped connection costs at most one chunk.
+
+Chunks are streamed from the request straight into a part file under
+MEDIA_ROOT/uploads/ in fixed-size blocks, so memory use does not depend on
+the chunk or file size. The SHA-256 of the content is computed as the bytes
+arrive; the running digest of each upload is kept in process memory, and an
+upload resumed in another process is hashed from disk once at the end
+instead. Finished files are named after their hash and sharded as
+resumes/ab/cd/<hash>.<ext>, so a file that is already stored is kept once.
+
+Each chunk is written under an exclusive lock on the part file, and the
+offset is checked again once the lock is held, so two requests racing to
+write the same chunk can neither both count it nor overwrite bytes the
+other has already confirmed. Locking the file rather than the upload row
+keeps a slow client from holding a database lock while its chunk arrives.
+"""
+import fcntl
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from .models import ResumeUpload, sharded_resume_name
+
+UPLOAD_DIR = 'uploads'
+RESUME_EXTENSIONS = {'pdf', 'docx', 'doc', 'txt', 'md', 'rtf', 'odt'}
+BLOCK_SIZE = 64 * 1024
+# Running digests kept per process for uploads in progress
+MAX_DIGESTS = 256
+
+_lock = threading.Lock()
+_digests = OrderedDict()
+
+
+class UploadError(Exception):
+    """Raised for an upload request that can never succeed."""
+
+
+class UploadOffsetConflict(Exception):
+    """Raised when a chunk does not start where the upload stands."""
+
+    def __init__(self, offset):
+        self.offset = offset
+        super().__init__(f"The upload is at byte {offset}")
+
+
+def max_upload_size():
+    return getattr(settings, 'RESUME_UPLOAD_MAX_SIZE', 20 * 1024 * 1024)
+
+
+def max_chunk_size():
+    return getattr(settings, 'RESUME_UPLOAD_CHUNK_SIZE', 5 * 1024 * 1024)
+
+
+def part_path(upload):
+    return default_storage.path(os.path.join(UPLOAD_DIR, f'{upload.pk}.part'))
+
+
+def start_upload(user, filename, size):
+    """
+    Validate a new upload and create its empty part file
+    """
+    filename = os.path.basename(filename or '').strip()
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension not in RESUME_EXTENSIONS:
+        raise UploadError(f"Resumes must be one of: {', '.join(sorted(RESUME_EXTENSIONS))}")
+    if size <= 0 or size > max_upload_size():
+        raise UploadError(f"Resumes must be between 1 byte and {max_upload_size()} bytes")
+    upload = ResumeUpload.objects.create(created_by=user, filename=filename[:255], size=size)
+    path = part_path(upload)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+    _remember_digest(upload.pk, 0, hashlib.sha256())
+    return upload
+
+
+def _remember_digest(upload_id, offset, digest):
+    with _lock:
+        _digests[upload_id] = (offset, digest)
+        _digests.move_to_end(upload_id)
+        while len(_digests) > MAX_DIGESTS:
+            _digests.popitem(last=False)
+
+
+def _take_digest(upload_id, offset):
+    """
+    The running digest of an upload if this process has hashed exactly its
+    first `offset` bytes
+    """
+    with _lock:
+        entry = _digests.pop(upload_id, None)
+    if entry is not None and entry[0] == offset:
+        return entry[1]
+    return None
+
+
+def append_chunk(upload, offset, stream, length):
+    """
+    Write `length` bytes read from `stream` at `offset` and advance the
+    upload. Returns the upload, completed if that was the last chunk.
+
+    The part file is locked for the whole write and the offset is read again
+    under the lock, so a late or duplicate request for an offset the upload
+    has moved past is refused before it touches the file. A request that
+    finds another one writing to the same upload is refused straight away
+    rather than made to wait.
+    """
+    if length <= 0 or length > max_chunk_size():
+        raise UploadError(f"Chunks must be between 1 byte and {max_chunk_size()} bytes")
+
+    try:
+        part = open(part_path(upload), 'r+b')
+    except FileNotFoundError:
+        # Finished, and moved to its place, since the request began
+        upload.refresh_from_db()
+        raise UploadOffsetConflict(upload.received)
+    with part:
+        try:
+            fcntl.flock(part, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            upload.refresh_from_db()
+            raise UploadOffsetConflict(upload.received)
+        try:
+            # Only requests holding the lock move the offset, so this is
+            # where the upload stands until the lock is released
+            upload.refresh_from_db()
+            if upload.complete or offset != upload.received:
+                raise UploadOffsetConflict(upload.received)
+            if offset + length > upload.size:
+                raise UploadError(f"The chunk runs past the declared size of {upload.size} bytes")
+
+            digest = _take_digest(upload.pk, offset)
+            written = 0
+            part.seek(offset)
+            while written < length:
+                block = stream.read(min(BLOCK_SIZE, length - written))
+                if not block:
+                    break
+                part.write(block)
+                if digest is not None:
+                    digest.update(block)
+                written += len(block)
+            # Drop anything past the confirmed offset, such as the rest of an
+            # earlier attempt at this chunk or the start of this short one
+            part.truncate(offset + length if written == length else offset)
+            if written != length:
+                raise UploadError(f"Expected {length} bytes but the request ended after {written}")
+
+            advanced = ResumeUpload.objects.filter(pk=upload.pk, received=offset).update(
+                received=offset + length, updated_at=timezone.now(),
+            )
+            if not advanced:
+                upload.refresh_from_db()
+                raise UploadOffsetConflict(upload.received)
+            upload.received = offset + length
+            if digest is not None:
+                _remember_digest(upload.pk, upload.received, digest)
+            if upload.received == upload.size:
+                finish_upload(upload)
+        finally:
+            fcntl.flock(part, fcntl.LOCK_UN)
+    return upload
+
+
+def finish_upload(upload):
+    """
+    Move a fully received part file to its content-addressed place
+    """
+    path = part_path(upload)
+    digest = _take_digest(upload.pk, upload.size)
+    if digest is None:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as part:
+            for block in iter(lambda: part.read(BLOCK_SIZE), b''):
+                digest.update(block)
+    upload.sha256 = digest.hexdigest()
+    upload.stored_name = sharded_resume_name(upload.sha256, upload.filename.rsplit('.', 1)[-1])
+    destination = default_storage.path(upload.stored_name)
+    if os.path.exists(destination):
+        os.remove(path)
+    else:
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        os.replace(path, destination)
+    upload.completed_at = timezone.now()
+    upload.save(update_fields=['sha256', 'stored_name', 'completed_at', 'updated_at'])
+    return upload
+
+
+def purge_stale_uploads(max_age=timedelta(days=1)):
+    """
+    Delete uploads, finished or not, that have not been touched for
+    `max_age` and were never attached to a candidate, with their part files.
+    Stored resume files are left alone, as another candidate may share one.
+    Returns the number of uploads deleted.
+    """
+    stale = ResumeUpload.objects.filter(updated_at__lt=timezone.now() - max_age)
+    deleted = 0
+    for upload in stale.iterator():
+        if not upload.complete:
+            try:
+                os.remove(part_path(upload))
+            except FileNotFoundError:
+                pass
+        upload.delete()
+        deleted += 1
+    return deleted
@@ -4,11 +4,24 @@ from . import views
 
 urlpatterns = [
     path('', views.candidate_list, name='candidate_list'),
+    path('search/', views.candidate_search, name='candidate_search'),
+    path('pipeline/', views.pipeline_dashboard, name='pipeline_dashboard'),
+    path('duplicates/', views.duplicate_list, name='duplicate_list'),
+    path('duplicates/<int:duplicate_id>/dismiss/', views.dismiss_duplicate, name='dismiss_duplicate'),
+    path('<int:candidate_id>/merge/<int:other_id>/', views.candidate_merge, name='candidate_merge'),
     path('<int:candidate_id>/', views.candidate_detail, name='candidate_detail'),
     path('create/', views.candidate_create, name='candidate_create'),
+    path('import/', views.candidate_import, name='candidate_import'),
+    path('uploads/', views.resume_upload_start, name='resume_upload_start'),
+    path('uploads/<uuid:upload_id>/', views.resume_upload_chunk, name='resume_upload_chunk'),
+    path('export/<str:fmt>/', views.candidate_export, name='candidate_export'),
     path('create/<int:job_id>/', views.candidate_create, name='candidate_create_for_job'),
+    path('<int:candidate_id>/resume/', views.candidate_resume, name='candidate_resume'),
+    path('<int:candidate_id>/resume/thumbnail/', views.candidate_resume_thumbnail, name='candidate_resume_thumbnail'),
     path('<int:candidate_id>/parse-resume/', views.parse_resume, name='parse_resume'),
-    path('<int:candidate_id>/update-stage/', views.update_stage, name='update_stage'),
+    path('<int:candidate_id>/add-application/', views.add_application, name='add_application'),
+    path('applications/<int:application_id>/update-stage/', views.update_stage, name='update_stage'),
+    path('applications/bulk-update-stage/', views.bulk_update_stage, name='bulk_update_stage'),
     
     # Add these new URL patterns
     path('<int:candidate_id>/add-skill/', views.add_skill, name='add_skill'),
@@ -1,38 +1,322 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from .models import Candidate, CandidateSkill, CandidateEducation, CandidateWorkExperience
-from .forms import CandidateForm, CandidateSkillFormSet, CandidateEducationFormSet, CandidateWorkExperienceFormSet
+from django.db import transaction
+from django.http import Http404, HttpResponse, JsonResponse, QueryDict
+from django.urls import reverse
+from django.views.decorators.http import require_http_methods, require_POST
+from django.db.models import Exists, OuterRef, Prefetch, Sum
+from .models import (
+    Application, Candidate, CandidateSkill, CandidateEducation, CandidateWorkExperience, DuplicateCandidate,
+    ResumeUpload, StageDailyCount,
+)
+from .forms import (
+    ApplicationForm, BulkStageForm, CandidateForm, CandidateSkillFormSet, CandidateEducationFormSet, CandidateWorkExperienceFormSet,
+    CandidateImportUploadForm,
+)
+from .dedup import find_duplicates_of, merge_candidates
+from .downloads import send_stored_file
+from .exporting import (
+    CANDIDATE_EXPORT_COLUMNS, ExportFormatError, candidate_export_queryset, candidate_rows, export_response,
+)
+from .importing import CandidateImporter, CandidateImportError, write_error_report
+from .pagination import paginate_keyset
+from .pipeline import bulk_change_stage, change_stage, funnel, time_in_stage
+from .search import search_candidates
+from .tasks import enqueue_resume_parse
+from .uploads import UploadError, UploadOffsetConflict, append_chunk, max_chunk_size, start_upload
+from ats_project.caching import CACHE_TIMEOUT, JOB_POSTS, cached, candidate_stamp, stamps
+from ats_project.query_budget import query_budget
 from jobs.models import JobPost
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.http import url_has_allowed_host_and_scheme
+from datetime import datetime, time, timedelta
+from urllib.parse import urlencode
 import pandas as pd
+import os
+import tempfile
 import re
 from recruiters.forms import NoteForm 
+from recruiters.mailer import queue_application_emails
+
+CANDIDATES_PER_PAGE = 25
+DUPLICATES_SHOWN = 100
+
+def _parse_day(value):
+    try:
+        return parse_date(value or '')
+    except ValueError:
+        return None
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+def _filter_applications(applications, params):
+    """
+    Apply the candidate list's job, stage and date filters from `params`,
+    returning the filtered Application queryset and the filters that were
+    applied
+    """
+    filters = {}
+
+    job_id = params.get('job', '')
+    if job_id.isdigit():
+        applications = applications.filter(job_id=int(job_id))
+        filters['job'] = int(job_id)
+
+    stage = params.get('stage', '')
+    if stage in dict(Application.STAGE_CHOICES):
+        applications = applications.filter(stage=stage)
+        filters['stage'] = stage
+
+    # Date filters are inclusive calendar days, compared as a plain range on
+    # created_at (not created_at__date) so the composite indexes still apply
+    date_from = _parse_day(params.get('date_from'))
+    if date_from:
+        applications = applications.filter(created_at__gte=_start_of_day(date_from))
+        filters['date_from'] = date_from.isoformat()
+    date_to = _parse_day(params.get('date_to'))
+    if date_to:
+        applications = applications.filter(created_at__lt=_start_of_day(date_to + timedelta(days=1)))
+        filters['date_to'] = date_to.isoformat()
+
+    return applications, filters
 
 @login_required
+@query_budget(5)
 def candidate_list(request):
-    candidates = Candidate.objects.all().order_by('-created_at')
-    return render(request, 'candidates/candidate_list.html', {'candidates': candidates})
+    applications, filters = _filter_applications(
+        Application.objects.select_related('candidate', 'job'), request.GET,
+    )
+    selected_job = filters.get('job')
+    selected_stage = filters.get('stage', '')
+
+    page_obj = paginate_keyset(
+        applications,
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        per_page=CANDIDATES_PER_PAGE,
+    )
+    jobs = JobPost.objects.only('id', 'title').order_by('title')
+
+    return render(request, 'candidates/candidate_list.html', {
+        'applications': page_obj.object_list,
+        'page_obj': page_obj,
+        'is_paginated': page_obj.has_other_pages,
+        'jobs': jobs,
+        'selected_job': selected_job,
+        'selected_stage': selected_stage,
+        'date_from': filters.get('date_from', ''),
+        'date_to': filters.get('date_to', ''),
+        'filter_query': urlencode(filters),
+        'bulk_form': BulkStageForm(initial={'filters': urlencode(filters)}),
+    })
 
 @login_required
+@query_budget(8)
+def candidate_export(request, fmt):
+    """
+    Stream candidates, with their skills, education, experience and notes,
+    as CSV, JSON Lines or Parquet. Accepts the candidate list's filters,
+    keeping candidates with at least one matching application. The body
+    costs six queries per EXPORT_CHUNK_SIZE candidates, one for the chunk
+    and one per prefetched relation; the budget covers one chunk.
+    """
+    applications, filters = _filter_applications(Application.objects.filter(candidate=OuterRef('pk')), request.GET)
+    candidates = Candidate.objects.filter(Exists(applications)) if filters else Candidate.objects.all()
+    try:
+        return export_response(
+            candidate_rows(candidate_export_queryset(candidates)),
+            CANDIDATE_EXPORT_COLUMNS, fmt, f'candidates-{timezone.localdate().isoformat()}',
+        )
+    except ExportFormatError as exc:
+        raise Http404(str(exc))
+
+@login_required
+@query_budget(13)
+def candidate_search(request):
+    query = request.GET.get('q', '').strip()
+    results = search_candidates(query) if query else []
+    return render(request, 'candidates/candidate_search.html', {
+        'query': query,
+        'results': results,
+    })
+
 @login_required
+@query_budget(31)
+def candidate_import(request):
+    """
+    Import candidates from an uploaded CSV or XLSX file. The query budget
+    covers one batch of rows: looking up the existing jobs and emails, then
+    one INSERT per table (candidates, skills, education, experience,
+    applications, stage log, parse jobs, blocking keys), the rollup and
+    counter upserts, the search postings and duplicate matches of the new
+    candidates, and the change set that rebuilds the match index. Large
+    files add the same fixed number per batch, never per row.
+    """
+    result = None
+    if request.method == 'POST':
+        form = CandidateImportUploadForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            suffix = os.path.splitext(upload.name)[1].lower()
+            report_file = tempfile.SpooledTemporaryFile(max_size=1024 * 1024, mode='w+', newline='')
+            with tempfile.NamedTemporaryFile(suffix=suffix) as source:
+                for chunk in upload.chunks():
+                    source.write(chunk)
+                source.flush()
+                importer = CandidateImporter(
+                    default_job=form.cleaned_data['job'], user=request.user,
+                    report=write_error_report(report_file),
+                )
+                try:
+                    result = importer.run(source.name)
+                except CandidateImportError as exc:
+                    form.add_error('file', str(exc))
+            if result is not None and result.failed and form.cleaned_data['download_errors']:
+                report_file.seek(0)
+                response = HttpResponse(report_file.read(), content_type='text/csv')
+                response['Content-Disposition'] = 'attachment; filename="import-errors.csv"'
+                report_file.close()
+                return response
+            report_file.close()
+            if result is not None:
+                messages.success(request, f'Imported {result.created} of {result.total} row(s).')
+    else:
+        form = CandidateImportUploadForm()
+    return render(request, 'candidates/candidate_import.html', {'form': form, 'result': result})
+
+DASHBOARD_WINDOWS = [7, 30, 90, 365]
+DASHBOARD_DAILY_DAYS = 14
+
+def _format_hours(hours):
+    if hours is None:
+        return '-'
+    if hours < 48:
+        return f'{hours:.1f}h'
+    return f'{hours / 24:.1f}d'
+
+@login_required
+@query_budget(7)
+def pipeline_dashboard(request):
+    """
+    Funnel, daily stage entries and time-in-stage percentiles, read only from
+    the rollup tables maintained by candidates.pipeline
+    """
+    try:
+        window = int(request.GET.get('days', 30))
+    except ValueError:
+        window = 30
+    if window not in DASHBOARD_WINDOWS:
+        window = 30
+    selected_job = request.GET.get('job', '')
+    job_id = int(selected_job) if selected_job.isdigit() else None
+
+    today = timezone.localdate()
+    since = today - timedelta(days=window - 1)
+    stages = Application.STAGE_CHOICES
+
+    entered = funnel(since=since, job_id=job_id)
+    applied = entered.get('new', 0)
+    funnel_rows = [
+        {
+            'stage': label,
+            'entered': entered.get(code, 0),
+            'rate': round(100 * entered.get(code, 0) / applied) if applied else None,
+        }
+        for code, label in stages
+    ]
+
+    durations = time_in_stage(job_id=job_id)
+    duration_rows = [
+        {
+            'stage': label,
+            'count': durations[code]['count'],
+            'median': _format_hours(durations[code][50]),
+            'p90': _format_hours(durations[code][90]),
+        }
+        for code, label in stages if code in durations
+    ]
+
+    daily_since = max(since, today - timedelta(days=DASHBOARD_DAILY_DAYS - 1))
+    daily_counts = StageDailyCount.objects.filter(day__gte=daily_since)
+    if job_id is not None:
+        daily_counts = daily_counts.filter(job_id=job_id)
+    by_day = {}
+    for day, stage, n in daily_counts.values('day', 'stage').annotate(n=Sum('entered')).values_list('day', 'stage', 'n'):
+        by_day.setdefault(day, {})[stage] = n
+    daily_rows = [
+        {'day': day, 'counts': [by_day.get(day, {}).get(code, 0) for code, _ in stages]}
+        for day in (today - timedelta(days=offset) for offset in range((today - daily_since).days + 1))
+    ]
+
+    job_rows = []
+    if job_id is None:
+        per_job = {}
+        for job, title, stage, n in (
+            StageDailyCount.objects.filter(day__gte=since)
+            .values('job', 'job__title', 'stage').annotate(n=Sum('entered'))
+            .values_list('job', 'job__title', 'stage', 'n')
+        ):
+            per_job.setdefault((job, title), {})[stage] = n
+        job_rows = [
+            {'id': job, 'title': title, 'counts': [counts.get(code, 0) for code, _ in stages]}
+            for (job, title), counts in sorted(per_job.items(), key=lambda item: item[0][1])
+        ]
+
+    return render(request, 'candidates/pipeline_dashboard.html', {
+        'stages': stages,
+        'funnel_rows': funnel_rows,
+        'duration_rows': duration_rows,
+        'daily_rows': daily_rows,
+        'job_rows': job_rows,
+        'jobs': JobPost.objects.only('id', 'title').order_by('title'),
+        'selected_job': selected_job,
+        'window': window,
+        'windows': DASHBOARD_WINDOWS,
+    })
+
+@login_required
+@query_budget(13)
 def candidate_detail(request, candidate_id):
-    candidate = get_object_or_404(
-        Candidate.objects.prefetch_related(
-            'interviews__interviewers',
-            'skills',
-            'education',
-            'work_experience',
-            'notes'
-        ), 
-        id=candidate_id
+    """
+    The candidate profile. The profile tabs are a cached fragment, so their
+    querysets are only evaluated when the candidate's stamp has moved; the
+    applications and forms in the sidebar are always rendered fresh.
+    """
+    page_stamp = stamps(JOB_POSTS, candidate_stamp(candidate_id))
+    candidate = cached(
+        f'candidate_detail:{candidate_id}:{page_stamp}', lambda: get_object_or_404(Candidate, id=candidate_id),
     )
-    stages = ['new', 'screening', 'interview', 'technical', 'final', 'offer', 'hired', 'rejected']
+    applications = list(candidate.applications.select_related('job__department').order_by('-created_at'))
+    stages = Application.STAGE_CHOICES
+    parse_job = candidate.parse_jobs.order_by('-created_at').first()
     return render(request, 'candidates/candidate_detail.html', {
         'candidate': candidate,
-        'stages': stages
+        'applications': applications,
+        'skills': candidate.skills.all(),
+        'education': candidate.education.all(),
+        'work_experience': candidate.work_experience.all(),
+        'notes': candidate.notes.select_related('author'),
+        'interviews': candidate.interviews.select_related('job').prefetch_related('interviewers'),
+        'stages': stages,
+        'parse_job': parse_job,
+        'duplicates': find_duplicates_of(candidate),
+        'application_form': ApplicationForm(candidate=candidate),
+        'page_stamp': page_stamp,
+        'cache_timeout': CACHE_TIMEOUT,
     })
 @login_required
+@query_budget(20)
 def candidate_create(request, job_id=None):
+    """
+    Add a candidate with their first application. The budget covers the
+    candidate and the application, with its stage log, rollup and counter
+    writes, one bulk INSERT each for skills, education and experience
+    however many rows the forms hold, the resume parse job and the duplicate
+    check, all in one transaction.
+    """
     job = None
     if job_id:
         job = get_object_or_404(JobPost, id=job_id)
@@ -41,36 +325,37 @@ def candidate_create(request, job_id=None):
     jobs = JobPost.objects.filter(status='published').order_by('-created_at')
     
     if request.method == 'POST':
-        form = CandidateForm(request.POST, request.FILES, initial={'job': job})
+        form = CandidateForm(request.POST, request.FILES, initial={'job': job}, user=request.user)
         skill_formset = CandidateSkillFormSet(request.POST, prefix='skills')
         education_formset = CandidateEducationFormSet(request.POST, prefix='education')
         experience_formset = CandidateWorkExperienceFormSet(request.POST, prefix='experience')
         
         if form.is_valid() and skill_formset.is_valid() and education_formset.is_valid() and experience_formset.is_valid():
-            candidate = form.save()
-            
-            # Save skills
-            skills = skill_formset.save(commit=False)
-            for skill in skills:
-                skill.candidate = candidate
-                skill.save()
-            
-            # Save education
-            educations = education_formset.save(commit=False)
-            for education in educations:
-                education.candidate = candidate
-                education.save()
-            
-            # Save work experience
-            experiences = experience_formset.save(commit=False)
-            for experience in experiences:
-                experience.candidate = candidate
-                experience.save()
-            
+            # One transaction, so a failure never leaves the job counting an
+            # applicant whose profile is half saved
+            with transaction.atomic():
+                candidate = form.save()
+                Application.objects.create(
+                    candidate=candidate, job=form.cleaned_data['job'], stage=form.cleaned_data['stage'],
+                )
+
+                # Save skills, education and work experience with one INSERT each
+                for formset, model in (
+                    (skill_formset, CandidateSkill),
+                    (education_formset, CandidateEducation),
+                    (experience_formset, CandidateWorkExperience),
+                ):
+                    rows = formset.save(commit=False)
+                    for row in rows:
+                        row.candidate = candidate
+                    model.objects.bulk_create(rows)
+
+                enqueue_resume_parse(candidate)
+
             messages.success(request, 'Candidate added successfully!')
             return redirect('candidate_detail', candidate_id=candidate.id)
     else:
-        form = CandidateForm(initial={'job': job})
+        form = CandidateForm(initial={'job': job}, user=request.user)
         skill_formset = CandidateSkillFormSet(prefix='skills')
         education_formset = CandidateEducationFormSet(prefix='education')
         experience_formset = CandidateWorkExperienceFormSet(prefix='experience')
@@ -84,39 +369,174 @@ def candidate_create(request, job_id=None):
         'jobs': jobs  # Add this line to pass jobs to the template
     })
 
+def _upload_state(upload, status=200):
+    return JsonResponse({
+        'id': str(upload.pk),
+        'offset': upload.received,
+        'size': upload.size,
+        'complete': upload.complete,
+        'chunk_size': max_chunk_size(),
+    }, status=status)
+
 @login_required
+@require_POST
+@query_budget(3)
+def resume_upload_start(request):
+    """
+    Start a chunked resume upload of `filename`, `size` bytes long
+    """
+    try:
+        size = int(request.POST.get('size', ''))
+    except ValueError:
+        return JsonResponse({'error': 'size must be a number of bytes'}, status=400)
+    try:
+        upload = start_upload(request.user, request.POST.get('filename', ''), size)
+    except UploadError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    return _upload_state(upload, status=201)
+
+@login_required
+@require_http_methods(['GET', 'HEAD', 'PATCH'])
+@query_budget(6)
+def resume_upload_chunk(request, upload_id):
+    """
+    GET or HEAD: where the upload stands. PATCH: append the request body,
+    which starts at byte Upload-Offset, and answer 409 with the current
+    offset if that is not where the upload stands.
+    """
+    upload = get_object_or_404(ResumeUpload, pk=upload_id, created_by=request.user)
+    if request.method != 'PATCH':
+        return _upload_state(upload)
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return JsonResponse({'error': 'Upload-Offset must be a number of bytes'}, status=400)
+    try:
+        append_chunk(upload, offset, request, length)
+    except UploadOffsetConflict as conflict:
+        return JsonResponse({'error': str(conflict), 'offset': conflict.offset}, status=409)
+    except UploadError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    return _upload_state(upload)
+
+@login_required
+@require_http_methods(['GET', 'HEAD'])
+@query_budget(3)
+def candidate_resume(request, candidate_id):
+    """
+    The candidate's resume, to logged-in users only
+    """
+    candidate = get_object_or_404(
+        Candidate.objects.only('id', 'first_name', 'last_name', 'resume', 'resume_hash'), id=candidate_id,
+    )
+    if not candidate.resume:
+        raise Http404("This candidate has no resume")
+    extension = os.path.splitext(candidate.resume.name)[1]
+    return send_stored_file(
+        request, candidate.resume.name, etag=candidate.resume_hash or None,
+        filename=f'{candidate.first_name} {candidate.last_name} resume{extension}',
+    )
+
+@login_required
+@require_http_methods(['GET', 'HEAD'])
+@query_budget(3)
+def candidate_resume_thumbnail(request, candidate_id):
+    """
+    A picture of the first page of the candidate's resume
+    """
+    candidate = get_object_or_404(
+        Candidate.objects.only('id', 'resume_hash', 'resume_thumbnail'), id=candidate_id,
+    )
+    if not candidate.resume_thumbnail:
+        raise Http404("This resume has no thumbnail")
+    return send_stored_file(
+        request, candidate.resume_thumbnail,
+        etag=f'{candidate.resume_hash}-thumbnail' if candidate.resume_hash else None,
+    )
+
+@login_required
+@query_budget(5)
 def parse_resume(request, candidate_id):
     candidate = get_object_or_404(Candidate, id=candidate_id)
     
-    # In a real implementation, this would use a resume parsing library or API
-    # For demonstration, we'll just simulate parsing with some basic logic
+    # Parsing happens in the process_resumes worker, off the request thread
+    enqueue_resume_parse(candidate)
     
-    # Read the resume file (assuming text or PDF that can be converted to text)
-    resume_text = "Sample resume text extracted from file"
-    
-    # Extract skills (simplified logic)
-    skills = ['Python', 'Django', 'JavaScript']
-    for skill in skills:
-        CandidateSkill.objects.create(
-            candidate=candidate,
-            skill=skill,
-            years_experience=1  # Default value
-        )
-    
-    messages.success(request, 'Resume parsed successfully!')
+    messages.success(request, 'Resume queued for parsing. Parsed details will appear shortly.')
     return redirect('candidate_detail', candidate_id=candidate.id)
 
 @login_required
-def update_stage(request, candidate_id):
-    candidate = get_object_or_404(Candidate, id=candidate_id)
+@query_budget(11)
+def update_stage(request, application_id):
+    application = get_object_or_404(
+        Application.objects.select_related('job').only('id', 'candidate_id', 'stage', 'job__title'), id=application_id,
+    )
     if request.method == 'POST':
         new_stage = request.POST.get('stage')
-        candidate.stage = new_stage
-        candidate.save()
-        messages.success(request, f'Stage updated to {candidate.get_stage_display()}')
+        if new_stage not in dict(Application.STAGE_CHOICES):
+            messages.error(request, 'Unknown stage.')
+        else:
+            change_stage([application.id], new_stage, user=request.user)
+            application.stage = new_stage
+            messages.success(request, f'{application.job.title}: stage updated to {application.get_stage_display()}')
+    return redirect('candidate_detail', candidate_id=application.candidate_id)
+
+@login_required
+@require_POST
+@query_budget(18)
+def bulk_update_stage(request):
+    """
+    Move many applications to one stage at once, from the candidate list,
+    and optionally queue an email to each candidate who moved, such as a
+    rejection
+    """
+    form = BulkStageForm(request.POST)
+    filters = QueryDict(form.data.get('filters', '')).urlencode()
+    redirect_url = reverse('candidate_list') + (f'?{filters}' if filters else '')
+    if not form.is_valid():
+        errors = [error for field_errors in form.errors.values() for error in field_errors]
+        messages.error(request, ' '.join(errors))
+        return redirect(redirect_url)
+
+    data = form.cleaned_data
+    if data['all_matching']:
+        applications, _ = _filter_applications(Application.objects.all(), QueryDict(data['filters']))
+    else:
+        applications = Application.objects.filter(id__in=data['application'])
+    with transaction.atomic():
+        transitions = bulk_change_stage(applications, data['to_stage'], user=request.user)
+        emailed = 0
+        if data['send_email'] and transitions:
+            emailed = queue_application_emails(
+                [(transition.candidate_id, transition.job_id) for transition in transitions],
+                data['subject'], template=data['template'], body=data['body'], sender=request.user,
+            )
+    stage = dict(Application.STAGE_CHOICES)[data['to_stage']]
+    message = f'Moved {len(transitions)} application(s) to {stage}.'
+    if emailed:
+        message += f' {emailed} email(s) queued for delivery.'
+    messages.success(request, message)
+    return redirect(redirect_url)
+
+@login_required
+@query_budget(11)
+def add_application(request, candidate_id):
+    """
+    Apply an existing candidate to another job
+    """
+    candidate = get_object_or_404(Candidate.objects.only('id'), id=candidate_id)
+    if request.method == 'POST':
+        form = ApplicationForm(request.POST, candidate=candidate)
+        if form.is_valid():
+            application = form.save()
+            messages.success(request, f'Application for {application.job.title} added.')
+        else:
+            messages.error(request, 'Choose a job this candidate has not applied for yet.')
     return redirect('candidate_detail', candidate_id=candidate.id)
 
 @login_required
+@query_budget(4)
 def add_skill(request, candidate_id):
     candidate = get_object_or_404(Candidate, id=candidate_id)
     if request.method == 'POST':
@@ -133,6 +553,7 @@ def add_skill(request, candidate_id):
     return render(request, 'candidates/add_skill.html', {'candidate': candidate})
 
 @login_required
+@query_budget(4)
 def edit_skill(request, skill_id):
     skill = get_object_or_404(CandidateSkill, id=skill_id)
     if request.method == 'POST':
@@ -140,41 +561,47 @@ def edit_skill(request, skill_id):
         skill.years_experience = request.POST.get('years_experience', 0)
         skill.save()
         messages.success(request, 'Skill updated successfully!')
-        return redirect('candidate_detail', candidate_id=skill.candidate.id)
+        return redirect('candidate_detail', candidate_id=skill.candidate_id)
     return render(request, 'candidates/edit_skill.html', {'skill': skill})
 
 # Similar implementations for education and experience views
 @login_required
+@query_budget(3)
 def add_education(request, candidate_id):
     candidate = get_object_or_404(Candidate, id=candidate_id)
     # Implementation similar to add_skill
     pass
 
 @login_required
+@query_budget(3)
 def edit_education(request, education_id):
     education = get_object_or_404(CandidateEducation, id=education_id)
     # Implementation similar to edit_skill
     pass
 
 @login_required
+@query_budget(3)
 def add_experience(request, candidate_id):
     candidate = get_object_or_404(Candidate, id=candidate_id)
     # Implementation similar to add_skill
     pass
 
 @login_required
+@query_budget(3)
 def edit_experience(request, experience_id):
     experience = get_object_or_404(CandidateWorkExperience, id=experience_id)
     # Implementation similar to edit_skill
     pass
 
 @login_required
+@query_budget(3)
 def send_email(request, candidate_id):
     candidate = get_object_or_404(Candidate, id=candidate_id)
     # Implementation for sending email
     pass
 
 @login_required
+@query_budget(4)
 def add_note(request, candidate_id):
     """
     Add a note to a candidate's profile
@@ -196,4 +623,67 @@ def add_note(request, candidate_id):
     return render(request, 'recruiters/note_form.html', {
         'form': form,
         'candidate': candidate
-    })
\ No newline at end of file
+    })
+
+@login_required
+@query_budget(5)
+def duplicate_list(request):
+    """
+    The most likely duplicate candidates that nobody has reviewed yet
+    """
+    applications = Application.objects.select_related('job').order_by('-created_at')
+    duplicates = DuplicateCandidate.objects.filter(status='open').select_related(
+        'candidate', 'other',
+    ).prefetch_related(
+        Prefetch('candidate__applications', queryset=applications),
+        Prefetch('other__applications', queryset=applications),
+    ).order_by('-score', 'id')[:DUPLICATES_SHOWN]
+    return render(request, 'candidates/duplicate_list.html', {
+        'duplicates': duplicates,
+        'shown': DUPLICATES_SHOWN,
+    })
+
+@login_required
+@query_budget(40)
+def candidate_merge(request, candidate_id, other_id):
+    """
+    Compare two candidates and, on POST, merge the second into the first.
+    The budget is large but does not depend on the size of either profile:
+    each kind of related row (applications, skills, education, experience,
+    notes, interviews, stage log, emails) moves with one UPDATE, and
+    deleting the duplicate collects and clears every table that refers to
+    it with one query each.
+    """
+    candidates = Candidate.objects.prefetch_related(
+        Prefetch('applications', queryset=Application.objects.select_related('job').order_by('-created_at')),
+    )
+    candidate = get_object_or_404(candidates, id=candidate_id)
+    other = get_object_or_404(candidates, id=other_id)
+    if candidate.id == other.id:
+        raise Http404("A candidate cannot be merged into itself")
+
+    if request.method == 'POST':
+        merge_candidates(candidate, other, request.user)
+        messages.success(request, f'Merged {other.first_name} {other.last_name} into this profile.')
+        return redirect('candidate_detail', candidate_id=candidate.id)
+
+    return render(request, 'candidates/candidate_merge.html', {
+        'candidate': candidate,
+        'other': other,
+    })
+
+@login_required
+@query_budget(4)
+def dismiss_duplicate(request, duplicate_id):
+    """
+    Mark a suggested pair as not being the same person
+    """
+    duplicate = get_object_or_404(DuplicateCandidate.objects.only('id', 'status'), id=duplicate_id)
+    if request.method == 'POST':
+        duplicate.status = 'dismissed'
+        duplicate.save(update_fields=['status'])
+        messages.success(request, 'Marked as not a duplicate.')
+    next_url = request.POST.get('next', '')
+    if url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        return redirect(next_url)
+    return redirect('duplicate_list')
@@ -0,0 +1,79 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:29
+
+from collections import Counter, defaultdict
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_applications(apps, schema_editor):
+    """
+    Fill the new counters from the existing applications
+    """
+    Application = apps.get_model('candidates', 'Application')
+    JobPost = apps.get_model('jobs', 'JobPost')
+    counts = defaultdict(Counter)
+    for job_id, stage, n in Application.objects.values('job_id', 'stage').annotate(n=Count('id')).values_list(
+        'job_id', 'stage', 'n',
+    ):
+        counts[job_id]['applicant_count'] += n
+        counts[job_id][f'{stage}_count'] += n
+    for job_id, fields in counts.items():
+        JobPost.objects.filter(id=job_id).update(**fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('candidates', '0008_application'),
+        ('jobs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobpost',
+            name='applicant_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='jobpost',
+            name='final_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='jobpost',
+            name='hired_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='jobpost',
+            name='interview_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='jobpost',
+            name='new_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='jobpost',
+            name='offer_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='jobpost',
+            name='rejected_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='jobpost',
+            name='screening_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='jobpost',
+            name='technical_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_applications, migrations.RunPython.noop),
+    ]
@@ -27,6 +27,26 @@ class JobPost(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     salary_min = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     salary_max = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
-    
+
+    # Applications to this job in total and per stage, kept up to date by
+    # candidates.pipeline in the same transaction as every change
+    applicant_count = models.IntegerField(default=0, editable=False)
+    new_count = models.IntegerField(default=0, editable=False)
+    screening_count = models.IntegerField(default=0, editable=False)
+    interview_count = models.IntegerField(default=0, editable=False)
+    technical_count = models.IntegerField(default=0, editable=False)
+    final_count = models.IntegerField(default=0, editable=False)
+    offer_count = models.IntegerField(default=0, editable=False)
+    hired_count = models.IntegerField(default=0, editable=False)
+    rejected_count = models.IntegerField(default=0, editable=False)
+
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return self.title
+
+    def stage_counts(self):
+        """
+        [(stage, label, applications in it)] for every pipeline stage
+        """
+        # Imported here because candidates.models depends on this module
+        from candidates.models import Application
+        return [(stage, label, getattr(self, f'{stage}_count')) for stage, label in Application.STAGE_CHOICES]
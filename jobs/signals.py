@@ -0,0 +1,16 @@
+# jobs/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from ats_project.caching import JOB_POSTS, touch
+from .models import Department, JobPost
+
+
+@receiver(post_save, sender=JobPost)
+@receiver(post_delete, sender=JobPost)
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+def touch_job_posts(sender, instance, **kwargs):
+    # Job titles and departments appear on the job board and on every
+    # candidate's applications, so any change moves the shared stamp
+    touch(JOB_POSTS)
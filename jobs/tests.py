@@ -1,3 +1,78 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from ats_project.query_budget import QueryBudgetTestMixin
+from candidates.matching import reset_match_index
+from candidates.models import Application, Candidate, CandidateSkill
+from .models import Department, JobPost
+
+
+class JobViewQueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('recruiter', 'recruiter@example.com', 'password', is_staff=True)
+        cls.jobs = []
+        for i in range(5):
+            department = Department.objects.create(name=f'Department {i}')
+            job = JobPost.objects.create(
+                title=f'Engineer {i}', department=department, location='Remote',
+                description='Build things', requirements='Python, Django',
+                responsibilities='Ship features', status='published', created_by=cls.user,
+            )
+            cls.jobs.append(job)
+        cls.candidates = [
+            Candidate.objects.create(
+                first_name='Candidate', last_name=str(i), email=f'candidate{i}@example.com',
+                resume='resumes/resume.pdf',
+            )
+            for i in range(5)
+        ]
+        for candidate in cls.candidates:
+            Application.objects.create(candidate=candidate, job=cls.jobs[0])
+
+    def setUp(self):
+        # Rendered pages must not outlive the rolled-back data of a test
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def job_data(self, **overrides):
+        data = {
+            'title': 'Data Engineer', 'department': self.jobs[0].department_id, 'location': 'Remote',
+            'description': 'Pipelines', 'requirements': 'SQL', 'responsibilities': 'ETL',
+            'status': 'draft', 'salary_min': '', 'salary_max': '',
+        }
+        data.update(overrides)
+        return data
+
+    def test_job_list(self):
+        response = self.assertWithinQueryBudget(reverse('job_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Department 4')
+        self.assertContains(response, '<strong>5</strong> applicants')
+        self.assertContains(response, 'New: 5')
+
+    def test_job_detail(self):
+        response = self.assertWithinQueryBudget(reverse('job_detail', args=[self.jobs[0].id]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_job_ranked_applicants(self):
+        reset_match_index()
+        CandidateSkill.objects.create(candidate=self.candidates[3], skill='Django', years_experience=3)
+        response = self.assertWithinQueryBudget(reverse('job_ranked_applicants', args=[self.jobs[0].id]))
+        applicants = response.context['applicants']
+        self.assertEqual(len(applicants), 5)
+        self.assertEqual(applicants[0].candidate, self.candidates[3])
+        self.assertEqual(applicants[0].matched_terms, ['django'])
+
+    def test_job_create(self):
+        self.assertWithinQueryBudget(reverse('job_create'))
+        response = self.assertWithinQueryBudget(reverse('job_create'), method='post', data=self.job_data())
+        self.assertEqual(response.status_code, 302)
+
+    def test_job_edit(self):
+        url = reverse('job_edit', args=[self.jobs[1].id])
+        self.assertWithinQueryBudget(url)
+        response = self.assertWithinQueryBudget(url, method='post', data=self.job_data(title='Renamed'))
+        self.assertEqual(response.status_code, 302)
@@ -4,19 +4,70 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from .models import JobPost, Department
 from .forms import JobPostForm
+from ats_project.caching import CACHE_TIMEOUT, JOB_BOARD, JOB_POSTS, cached, job_stamp, stamps
+from ats_project.query_budget import query_budget
+from candidates.matching import get_match_index, job_document
+
+RANKED_APPLICANTS_SHOWN = 100
 
 @login_required
+@query_budget(3)
 def job_list(request):
-    jobs = JobPost.objects.all().order_by('-created_at')
-    return render(request, 'jobs/job_list.html', {'jobs': jobs})
+    """
+    The job board. The queryset is only evaluated when the cached page
+    fragment is missing or its stamps have moved.
+    """
+    jobs = JobPost.objects.select_related('department').order_by('-created_at')
+    return render(request, 'jobs/job_list.html', {
+        'jobs': jobs, 'page_stamp': stamps(JOB_POSTS, JOB_BOARD), 'cache_timeout': CACHE_TIMEOUT,
+    })
 
 @login_required
+@query_budget(5)
 def job_detail(request, job_id):
-    job = get_object_or_404(JobPost, id=job_id)
-    candidates = job.candidates.all().order_by('-created_at')
-    return render(request, 'jobs/job_detail.html', {'job': job, 'candidates': candidates})
+    page_stamp = stamps(JOB_POSTS, job_stamp(job_id))
+    job = cached(
+        f'job_detail:{job_id}:{page_stamp}',
+        lambda: get_object_or_404(JobPost.objects.select_related('department', 'created_by'), id=job_id),
+    )
+    applications = job.applications.select_related('candidate').order_by('-created_at')
+    return render(request, 'jobs/job_detail.html', {
+        'job': job, 'applications': applications, 'page_stamp': page_stamp, 'cache_timeout': CACHE_TIMEOUT,
+    })
+
+@login_required
+@query_budget(9)
+def job_ranked_applicants(request, job_id):
+    """
+    Applicants for a job ordered by how well their skills and work history
+    match the job's requirements. The budget covers building the match
+    index, four queries, which only the first request of a process pays;
+    later ones make a single query for new change sets.
+    """
+    job = get_object_or_404(JobPost.objects.select_related('department'), id=job_id)
+    index = get_match_index()
+    document = job_document(job)
+    ranked = index.rank(
+        document, job.applications.values_list('candidate_id', flat=True), limit=RANKED_APPLICANTS_SHOWN,
+    )
+    ids = [candidate_id for candidate_id, _ in ranked]
+    applications = {
+        application.candidate_id: application
+        for application in job.applications.filter(candidate_id__in=ids).select_related('candidate')
+    }
+    matched_terms = index.matched_terms(document, ids)
+    applicants = []
+    for candidate_id, score in ranked:
+        application = applications.get(candidate_id)
+        if application is None:
+            continue
+        application.match_score = score
+        application.matched_terms = matched_terms.get(candidate_id, [])
+        applicants.append(application)
+    return render(request, 'jobs/job_ranked_applicants.html', {'job': job, 'applicants': applicants})
 
 @login_required
+@query_budget(5)
 def job_create(request):
     if request.method == 'POST':
         form = JobPostForm(request.POST)
@@ -31,6 +82,7 @@ def job_create(request):
     return render(request, 'jobs/job_form.html', {'form': form, 'title': 'Create Job Post'})
 
 @login_required
+@query_budget(7)
 def job_edit(request, job_id):
     job = get_object_or_404(JobPost, id=job_id)
     if request.method == 'POST':
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Note, Interview, EmailTemplate
+from .models import Note, Interview, EmailTemplate, EmailCampaign, OutboundEmail
 
 class NoteAdmin(admin.ModelAdmin):
     list_display = ('candidate', 'author', 'created_at', 'short_content')
@@ -47,6 +47,20 @@ class EmailTemplateAdmin(admin.ModelAdmin):
         }),
     )
 
+class EmailCampaignAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'job', 'stage', 'status', 'recipient_count', 'created_by', 'created_at')
+    list_filter = ('status', 'stage', 'created_at')
+    raw_id_fields = ('job', 'template', 'created_by')
+
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('to_email', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('to_email', 'subject')
+    raw_id_fields = ('candidate', 'campaign')
+    readonly_fields = ('claim_token', 'claimed_at', 'sent_at', 'last_error')
+
 admin.site.register(Note, NoteAdmin)
 admin.site.register(Interview, InterviewAdmin)
-admin.site.register(EmailTemplate, EmailTemplateAdmin)
\ No newline at end of file
+admin.site.register(EmailTemplate, EmailTemplateAdmin)
+admin.site.register(EmailCampaign, EmailCampaignAdmin)
+admin.site.register(OutboundEmail, OutboundEmailAdmin)
@@ -0,0 +1,148 @@
+# recruiters/calendar_feed.py
+"""
+iCalendar (RFC 5545) feeds of each interviewer's interviews.
+
+Calendar apps poll a secret per-user URL. Every change to an interview, to
+who conducts it, or to the candidate or job it shows, moves the changed_at of the affected users' CalendarFeed
+rows (see recruiters.signals), and the feed is served with an ETag and
+Last-Modified derived from that timestamp. A client polling an unchanged feed
+is answered with 304 Not Modified after a single indexed lookup of its token.
+
+Feeds are generated incrementally: each interview's VEVENT is cached under a
+key that includes the modification times of the interview, candidate and job
+it shows, so a changed feed only renders the events that actually changed.
+"""
+import secrets
+from datetime import timedelta, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import CalendarFeed, Interview
+
+# Bump to invalidate every cached event and ETag after changing the output
+FEED_VERSION = 1
+FEED_HISTORY = timedelta(days=90)
+EVENT_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+PRODUCT_ID = '-//ATS System//Interviews//EN'
+
+
+def new_token():
+    return secrets.token_urlsafe(32)
+
+
+def get_or_create_feed(user):
+    feed, _ = CalendarFeed.objects.get_or_create(user=user, defaults={'token': new_token()})
+    return feed
+
+
+def touch_calendars(user_ids=None, interview=None, interviews=None):
+    """
+    Mark the feeds of the given users, or of the interviewers of
+    `interview` or of any of the `interviews` queryset, as changed
+    """
+    feeds = CalendarFeed.objects.all()
+    if interview is not None:
+        feeds = feeds.filter(user__conducted_interviews=interview)
+    elif interviews is not None:
+        feeds = feeds.filter(user__conducted_interviews__in=interviews).distinct()
+    else:
+        feeds = feeds.filter(user_id__in=user_ids)
+    feeds.update(changed_at=timezone.now())
+
+
+def feed_etag(feed):
+    return f'"{feed.user_id}-{int(feed.changed_at.timestamp() * 1000000)}-{FEED_VERSION}"'
+
+
+def escape_text(value):
+    return (
+        value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def fold(line):
+    """
+    Split a content line into 75-octet pieces joined by CRLF and a space
+    """
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line
+    pieces = []
+    start = 0
+    limit = 75
+    while start < len(encoded):
+        end = min(start + limit, len(encoded))
+        # Never split a multi-byte character
+        while end < len(encoded) and (encoded[end] & 0xC0) == 0x80:
+            end -= 1
+        pieces.append(encoded[start:end].decode())
+        start = end
+        limit = 74
+    return '\r\n '.join(pieces)
+
+
+def format_utc(moment):
+    return moment.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def render_event(row):
+    """
+    Render one interview, given as a dict from interview_rows(), as a VEVENT
+    """
+    summary = f"Interview: {row['candidate__first_name']} {row['candidate__last_name']} ({row['job__title']})"
+    lines = [
+        'BEGIN:VEVENT',
+        f"UID:interview-{row['id']}@ats-system",
+        f"DTSTAMP:{format_utc(row['updated_at'])}",
+        f"LAST-MODIFIED:{format_utc(row['updated_at'])}",
+        f"DTSTART:{format_utc(row['scheduled_at'])}",
+        f"DTEND:{format_utc(row['scheduled_at'] + timedelta(minutes=row['duration']))}",
+        f"SUMMARY:{escape_text(summary)}",
+        f"STATUS:{'CANCELLED' if row['status'] == 'cancelled' else 'CONFIRMED'}",
+    ]
+    if row['location']:
+        lines.append(f"LOCATION:{escape_text(row['location'])}")
+    if row['notes']:
+        lines.append(f"DESCRIPTION:{escape_text(row['notes'])}")
+    lines.append('END:VEVENT')
+    return ''.join(fold(line) + '\r\n' for line in lines)
+
+
+def interview_rows(user_id, since):
+    return Interview.objects.filter(interviewers=user_id, scheduled_at__gte=since).order_by('scheduled_at', 'id').values(
+        'id', 'scheduled_at', 'duration', 'location', 'notes', 'status', 'updated_at',
+        'candidate__first_name', 'candidate__last_name', 'candidate__updated_at',
+        'job__title', 'job__updated_at',
+    )
+
+
+def _event_key(row):
+    stamps = '-'.join(
+        str(int(row[field].timestamp() * 1000000)) for field in ('updated_at', 'candidate__updated_at', 'job__updated_at')
+    )
+    return f"interview-calendar:v{FEED_VERSION}:event:{row['id']}:{stamps}"
+
+
+def render_feed(user_id, name='Interviews'):
+    """
+    Return the iCalendar text of a user's interviews from FEED_HISTORY ago
+    onwards, rendering only events missing from the cache
+    """
+    rows = list(interview_rows(user_id, timezone.now() - FEED_HISTORY))
+    keys = [_event_key(row) for row in rows]
+    events = cache.get_many(keys)
+    missing = {key: render_event(row) for key, row in zip(keys, rows) if key not in events}
+    if missing:
+        cache.set_many(missing, EVENT_CACHE_TIMEOUT)
+        events.update(missing)
+    header = [
+        'BEGIN:VCALENDAR', 'VERSION:2.0', f'PRODID:{PRODUCT_ID}', 'CALSCALE:GREGORIAN', 'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{escape_text(name)}',
+    ]
+    return (
+        ''.join(fold(line) + '\r\n' for line in header)
+        + ''.join(events[key] for key in keys)
+        + 'END:VCALENDAR\r\n'
+    )
@@ -0,0 +1,50 @@
+# recruiters/exporting.py
+"""
+Interview export rows; see candidates.exporting for the streaming formats
+"""
+from django.db.models import F
+
+from candidates.exporting import EXPORT_CHUNK_SIZE, chunked, prefetch_grouped
+from .models import Interview
+
+INTERVIEW_EXPORT_COLUMNS = [
+    ('id', 'int'),
+    ('candidate_id', 'int'),
+    ('candidate', 'string'),
+    ('candidate_email', 'string'),
+    ('job_id', 'int'),
+    ('job', 'string'),
+    ('scheduled_at', 'timestamp'),
+    ('duration', 'int'),
+    ('location', 'string'),
+    ('status', 'string'),
+    ('interviewers', [('username', 'string'), ('email', 'string')]),
+    ('notes', 'string'),
+]
+
+
+def interview_export_queryset(queryset=None):
+    if queryset is None:
+        queryset = Interview.objects.all()
+    return queryset.order_by('id')
+
+
+def interview_rows(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield one dict per interview, matching INTERVIEW_EXPORT_COLUMNS
+    """
+    interviews = queryset.values(
+        'id', 'candidate_id', 'candidate__first_name', 'candidate__last_name', 'job_id',
+        'scheduled_at', 'duration', 'location', 'status', 'notes',
+        candidate_email=F('candidate__email'), job_title=F('job__title'),
+    )
+    for chunk in chunked(interviews.iterator(chunk_size=chunk_size), chunk_size):
+        interviewers = prefetch_grouped(
+            chunk, Interview.interviewers.through.objects.order_by('id'), 'interview_id',
+            {'username': 'user__username', 'email': 'user__email'},
+        )
+        for row in chunk:
+            row['candidate'] = f"{row.pop('candidate__first_name')} {row.pop('candidate__last_name')}"
+            row['job'] = row.pop('job_title')
+            row['interviewers'] = interviewers.get(row['id'], [])
+            yield row
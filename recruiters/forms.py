@@ -1,10 +1,12 @@
 # recruiters/forms.py
 from django import forms
 from django.contrib.auth.models import User
-from .models import Note, Interview, EmailTemplate
-from candidates.models import Candidate
+from .models import Note, Interview, EmailTemplate, EmailCampaign
+from candidates.models import Application
 from jobs.models import JobPost
 from django.utils import timezone
+from .scheduling import WORKING_HOURS, describe_conflict, find_conflicts, free_slots, interview_interval
+from datetime import datetime, time, timedelta
 
 class NoteForm(forms.ModelForm):
     """
@@ -73,10 +75,97 @@ class InterviewForm(forms.ModelForm):
     
     def clean(self):
         cleaned_data = super().clean()
-        # You could add additional validation here
-        # For example, check if interviewers are available at the scheduled time
+        interviewers = cleaned_data.get('interviewers')
+        scheduled_at = cleaned_data.get('scheduled_at')
+        duration = cleaned_data.get('duration')
+        self.suggested_slots = []
+        if interviewers and scheduled_at and duration:
+            # Check that every interviewer is free for the whole slot
+            interviewer_ids = [user.id for user in interviewers]
+            start, end = interview_interval(scheduled_at, duration)
+            conflicts = find_conflicts(interviewer_ids, start, end, exclude_interview=self.instance.pk)
+            if conflicts:
+                self.suggested_slots = free_slots(interviewer_ids, duration, after=scheduled_at)
+                raise forms.ValidationError([describe_conflict(booking) + '.' for booking in conflicts])
         return cleaned_data
 
+class BatchInterviewForm(forms.Form):
+    """
+    Form for scheduling interviews for every waiting candidate of a job at once
+    """
+    stage = forms.ChoiceField(
+        choices=Application.STAGE_CHOICES,
+        initial='interview',
+        widget=forms.Select(attrs={'class': 'form-select'}),
+        help_text="Candidates in this stage without a scheduled interview for the job are scheduled"
+    )
+    interviewers = forms.ModelMultipleChoiceField(
+        queryset=User.objects.filter(is_staff=True),
+        widget=forms.CheckboxSelectMultiple(attrs={'class': 'list-unstyled'}),
+    )
+    panel_size = forms.IntegerField(
+        min_value=1, initial=1,
+        widget=forms.NumberInput(attrs={'class': 'form-control'}),
+        help_text="Interviewers per interview"
+    )
+    duration = forms.IntegerField(
+        min_value=15, max_value=240, initial=60,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'step': 15}),
+        help_text="Duration in minutes"
+    )
+    start_date = forms.DateField(widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}))
+    end_date = forms.DateField(widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}))
+    day_start = forms.TimeField(
+        initial=WORKING_HOURS[0],
+        widget=forms.TimeInput(attrs={'type': 'time', 'class': 'form-control'}, format='%H:%M'),
+    )
+    day_end = forms.TimeField(
+        initial=WORKING_HOURS[1],
+        widget=forms.TimeInput(attrs={'type': 'time', 'class': 'form-control'}, format='%H:%M'),
+    )
+    location = forms.CharField(
+        max_length=200, required=False,
+        widget=forms.TextInput(attrs={
+            'class': 'form-control',
+            'placeholder': 'Office location or virtual meeting link'
+        })
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        today = timezone.localdate()
+        self.fields['start_date'].initial = today + timedelta(days=1)
+        self.fields['end_date'].initial = today + timedelta(days=14)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start_date = cleaned_data.get('start_date')
+        end_date = cleaned_data.get('end_date')
+        if start_date and end_date:
+            if start_date < timezone.localdate():
+                self.add_error('start_date', "Interviews cannot be scheduled in the past.")
+            if end_date < start_date:
+                self.add_error('end_date', "The end date must not be before the start date.")
+            elif (end_date - start_date).days > 90:
+                self.add_error('end_date', "Schedule at most 90 days at a time.")
+        day_start = cleaned_data.get('day_start')
+        day_end = cleaned_data.get('day_end')
+        if day_start and day_end and day_start >= day_end:
+            self.add_error('day_end', "The working day must end after it starts.")
+        interviewers = cleaned_data.get('interviewers')
+        panel_size = cleaned_data.get('panel_size')
+        if interviewers and panel_size and panel_size > len(interviewers):
+            self.add_error('panel_size', "Select at least as many interviewers as the panel size.")
+        return cleaned_data
+
+    def period(self):
+        """
+        Return the (start, end) datetimes to schedule within
+        """
+        start = timezone.make_aware(datetime.combine(self.cleaned_data['start_date'], time.min))
+        end = timezone.make_aware(datetime.combine(self.cleaned_data['end_date'] + timedelta(days=1), time.min))
+        return max(start, timezone.now()), end
+
 class EmailTemplateForm(forms.ModelForm):
     """
     Form for creating and editing email templates
@@ -124,12 +213,40 @@ class SendEmailForm(forms.Form):
         if template_id:
             self.fields['template'].initial = template_id
 
+class EmailCampaignForm(forms.ModelForm):
+    """
+    Form for emailing every candidate in one stage of a job
+    """
+    class Meta:
+        model = EmailCampaign
+        fields = ['job', 'stage', 'template', 'subject', 'body']
+        widgets = {
+            'job': forms.Select(attrs={'class': 'form-select'}),
+            'stage': forms.Select(attrs={'class': 'form-select'}),
+            'template': forms.Select(attrs={'class': 'form-select'}),
+            'subject': forms.TextInput(attrs={'class': 'form-control'}),
+            'body': forms.Textarea(attrs={
+                'rows': 10,
+                'class': 'form-control',
+                'placeholder': 'Enter email content...\nYou can use variables like {{candidate.first_name}}, {{job.title}}, etc.'
+            }),
+        }
+        help_texts = {
+            'template': 'When a template is selected its body is used instead of the text below.',
+        }
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('template') and not cleaned_data.get('body'):
+            self.add_error('body', 'Enter a message or select a template.')
+        return cleaned_data
+
 class CandidateStageUpdateForm(forms.ModelForm):
     """
-    Form for updating a candidate's recruitment stage
+    Form for updating the recruitment stage of a candidate's application
     """
     class Meta:
-        model = Candidate
+        model = Application
         fields = ['stage']
         widgets = {
             'stage': forms.Select(attrs={'class': 'form-select'})
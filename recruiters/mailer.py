@@ -0,0 +1,239 @@
+# recruiters/mailer.py
+"""
+Queued outbound email.
+
+Views never talk to the mail server. They add OutboundEmail rows (or, for a
+mailing to every candidate in a stage of a job, a single EmailCampaign row)
+and return. The send_queued_email management command expands campaigns into
+messages, claims queued messages in batches and sends each batch over one
+reused backend connection. Messages that fail are retried with exponential
+backoff and marked failed after MAX_ATTEMPTS tries.
+"""
+import logging
+import smtplib
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.template import Template
+from django.utils import timezone
+
+from candidates.exporting import chunked
+from candidates.models import Candidate
+from jobs.models import JobPost
+from .models import EmailCampaign, OutboundEmail
+from .rendering import compiled_template, render_many
+
+logger = logging.getLogger(__name__)
+
+SEND_BATCH_SIZE = 100
+CAMPAIGN_INSERT_BATCH_SIZE = 1000
+MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = timedelta(minutes=1)
+RETRY_MAX_DELAY = timedelta(hours=1)
+
+
+def queue_email(to_email, subject, body, candidate=None, from_email=None):
+    """
+    Add one message to the outbound queue
+    """
+    return OutboundEmail.objects.create(
+        candidate=candidate, to_email=to_email, subject=subject, body=body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+    )
+
+
+def queue_application_emails(applications, subject, template=None, body='', sender=None):
+    """
+    Queue one message per (candidate_id, job_id) pair in `applications`,
+    rendering the EmailTemplate `template`, or else the text `body`, with
+    the candidate, job and sender like a campaign. Candidates and jobs are
+    loaded, and messages inserted, a chunk at a time. Returns the number of
+    messages queued.
+    """
+    compiled = compiled_template(template) if template else Template(body)
+    count = 0
+    for chunk in chunked(applications, CAMPAIGN_INSERT_BATCH_SIZE):
+        candidates = Candidate.objects.in_bulk({candidate_id for candidate_id, _ in chunk})
+        jobs = JobPost.objects.in_bulk({job_id for _, job_id in chunk})
+        recipients = [
+            (candidates[candidate_id], jobs[job_id]) for candidate_id, job_id in chunk
+            if candidate_id in candidates and job_id in jobs
+        ]
+        bodies = render_many(compiled, (
+            {'candidate': candidate, 'job': job, 'recruiter': sender} for candidate, job in recipients
+        ))
+        OutboundEmail.objects.bulk_create([
+            OutboundEmail(
+                candidate_id=candidate.id, to_email=candidate.email, from_email=settings.DEFAULT_FROM_EMAIL,
+                subject=subject, body=body,
+            )
+            for (candidate, _), body in zip(recipients, bodies)
+        ])
+        count += len(recipients)
+    return count
+
+
+def retry_delay(attempts):
+    """
+    Wait before the next try of a message that has failed `attempts` times
+    """
+    return min(RETRY_BASE_DELAY * 2 ** max(attempts - 1, 0), RETRY_MAX_DELAY)
+
+
+def expand_campaigns():
+    """
+    Turn pending campaigns into one queued message per recipient. Each
+    campaign is expanded in a single transaction, so a worker that dies
+    halfway leaves it pending rather than half-sent.
+    """
+    expanded = 0
+    for campaign_id in EmailCampaign.objects.filter(status='pending').order_by('created_at').values_list('id', flat=True):
+        with transaction.atomic():
+            if not EmailCampaign.objects.filter(id=campaign_id, status='pending').update(
+                status='queued', queued_at=timezone.now(),
+            ):
+                continue
+            campaign = EmailCampaign.objects.select_related('job', 'template', 'created_by').get(id=campaign_id)
+            count = _queue_campaign_emails(campaign)
+            EmailCampaign.objects.filter(id=campaign_id).update(recipient_count=count)
+        expanded += 1
+    return expanded
+
+
+def _queue_campaign_emails(campaign):
+    # The body is compiled once and rendered for every recipient
+    template = compiled_template(campaign.template) if campaign.template else Template(campaign.body)
+    recipients = Candidate.objects.filter(
+        applications__job_id=campaign.job_id, applications__stage=campaign.stage,
+    ).order_by('id')
+    count = 0
+    for chunk in chunked(recipients.iterator(chunk_size=CAMPAIGN_INSERT_BATCH_SIZE), CAMPAIGN_INSERT_BATCH_SIZE):
+        bodies = render_many(template, (
+            {'candidate': candidate, 'job': campaign.job, 'recruiter': campaign.created_by} for candidate in chunk
+        ))
+        OutboundEmail.objects.bulk_create([
+            OutboundEmail(
+                candidate_id=candidate.id, campaign_id=campaign.id, to_email=candidate.email,
+                from_email=settings.DEFAULT_FROM_EMAIL, subject=campaign.subject, body=body,
+            )
+            for candidate, body in zip(chunk, bodies)
+        ])
+        count += len(chunk)
+    return count
+
+
+def claim_emails(limit=SEND_BATCH_SIZE):
+    """
+    Move up to `limit` due messages to sending and return them. The batch is
+    claimed with one conditional UPDATE tagged with a fresh token, so several
+    workers can poll the queue without sending the same message twice.
+    """
+    now = timezone.now()
+    due = list(
+        OutboundEmail.objects.filter(status='queued', next_attempt_at__lte=now)
+        .order_by('next_attempt_at', 'id').values_list('id', flat=True)[:limit]
+    )
+    if not due:
+        return []
+    token = uuid.uuid4().hex
+    OutboundEmail.objects.filter(id__in=due, status='queued').update(
+        status='sending', claim_token=token, claimed_at=now, attempts=F('attempts') + 1,
+    )
+    return list(OutboundEmail.objects.filter(id__in=due, claim_token=token).order_by('id'))
+
+
+def requeue_stale_emails(older_than=timedelta(minutes=15)):
+    """
+    Return messages left sending by a worker that died back to the queue
+    """
+    cutoff = timezone.now() - older_than
+    return OutboundEmail.objects.filter(status='sending', claimed_at__lt=cutoff).update(status='queued')
+
+
+def _is_connection_error(exc):
+    # smtplib errors subclass OSError; only a dropped or refused connection
+    # means the remaining messages need a new one
+    return isinstance(exc, smtplib.SMTPServerDisconnected) or (
+        isinstance(exc, OSError) and not isinstance(exc, smtplib.SMTPException)
+    )
+
+
+def send_batch(emails, connection=None):
+    """
+    Send claimed messages over a single backend connection and record the
+    outcome of each. Returns the number sent.
+    """
+    if not emails:
+        return 0
+    connection = connection or get_connection(fail_silently=False)
+    sent = []
+    failed = []
+    try:
+        connection.open()
+    except Exception as exc:
+        logger.warning("Could not connect to the mail server: %s", exc)
+        failed = [(email, exc) for email in emails]
+    else:
+        try:
+            for position, email in enumerate(emails):
+                message = EmailMessage(
+                    email.subject, email.body, email.from_email, [email.to_email], connection=connection,
+                )
+                try:
+                    message.send()
+                except Exception as exc:
+                    failed.append((email, exc))
+                    if not _is_connection_error(exc):
+                        continue
+                    # Reconnect once for the rest of the batch; if that fails
+                    # too, they are retried later
+                    connection.close()
+                    try:
+                        connection.open()
+                    except Exception as reconnect_error:
+                        failed.extend((rest, reconnect_error) for rest in emails[position + 1:])
+                        break
+                else:
+                    sent.append(email.id)
+        finally:
+            connection.close()
+
+    now = timezone.now()
+    if sent:
+        OutboundEmail.objects.filter(id__in=sent).update(status='sent', sent_at=now, last_error='')
+    for email, exc in failed:
+        email.last_error = f"{type(exc).__name__}: {exc}"
+        if email.attempts >= MAX_ATTEMPTS:
+            email.status = 'failed'
+        else:
+            email.status = 'queued'
+            email.next_attempt_at = now + retry_delay(email.attempts)
+    OutboundEmail.objects.bulk_update(
+        [email for email, _ in failed], ['status', 'last_error', 'next_attempt_at'], batch_size=500,
+    )
+    return len(sent)
+
+
+def send_queued_emails(batch_size=SEND_BATCH_SIZE, poll_interval=None, progress=None):
+    """
+    Expand pending campaigns and send every due message. Returns once the
+    queue is drained unless `poll_interval` is given, in which case it keeps
+    polling. `progress(sent)` is called after each batch.
+    """
+    sent = 0
+    while True:
+        expand_campaigns()
+        emails = claim_emails(batch_size)
+        if not emails:
+            if poll_interval is None:
+                return sent
+            time.sleep(poll_interval)
+            continue
+        sent += send_batch(emails)
+        if progress is not None:
+            progress(sent)
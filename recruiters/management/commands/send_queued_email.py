@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from recruiters.mailer import SEND_BATCH_SIZE, requeue_stale_emails, send_queued_emails
+
+
+class Command(BaseCommand):
+    help = 'Send queued outbound email in batches over a reused connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=SEND_BATCH_SIZE,
+                            help='Messages claimed and sent per connection')
+        parser.add_argument('--poll-interval', type=float, default=5.0,
+                            help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the queue is empty instead of polling')
+
+    def handle(self, *args, **options):
+        requeued = requeue_stale_emails()
+        if requeued:
+            self.stdout.write(f'Requeued {requeued} stale message(s)')
+
+        sent = send_queued_emails(
+            batch_size=max(1, options['batch_size']),
+            poll_interval=None if options['once'] else options['poll_interval'],
+            progress=lambda sent: self.stdout.write(f'Sent {sent} message(s)'),
+        )
+        self.stdout.write(self.style.SUCCESS(f'Done, sent {sent} message(s)'))
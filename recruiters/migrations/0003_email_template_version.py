@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recruiters', '0002_outbound_email'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailtemplate',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
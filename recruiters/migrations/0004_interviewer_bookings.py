@@ -0,0 +1,53 @@
+# Generated by Django 5.1.7 on 2026-10-18 17:09
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def book_scheduled_interviews(apps, schema_editor):
+    Interview = apps.get_model('recruiters', 'Interview')
+    InterviewerBooking = apps.get_model('recruiters', 'InterviewerBooking')
+    intervals = {
+        interview_id: (scheduled_at, scheduled_at + timedelta(minutes=duration))
+        for interview_id, scheduled_at, duration in Interview.objects.filter(status='scheduled').values_list(
+            'id', 'scheduled_at', 'duration',
+        )
+    }
+    bookings = [
+        InterviewerBooking(
+            interview_id=interview_id, interviewer_id=user_id,
+            starts_at=intervals[interview_id][0], ends_at=intervals[interview_id][1],
+        )
+        for interview_id, user_id in Interview.interviewers.through.objects.values_list('interview_id', 'user_id')
+        if interview_id in intervals
+    ]
+    InterviewerBooking.objects.bulk_create(bookings, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recruiters', '0003_email_template_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InterviewerBooking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('starts_at', models.DateTimeField()),
+                ('ends_at', models.DateTimeField()),
+                ('interview', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bookings', to='recruiters.interview')),
+                ('interviewer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='interview_bookings', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['interviewer', 'ends_at'], name='booking_interviewer_end')],
+                'constraints': [models.UniqueConstraint(fields=('interview', 'interviewer'), name='unique_interview_booking')],
+            },
+        ),
+        migrations.RunPython(book_scheduled_interviews, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
-from candidates.models import Candidate
+from django.utils import timezone
+from candidates.models import Application, Candidate
 from jobs.models import JobPost
 
 class Note(models.Model):
@@ -27,10 +28,49 @@ class Interview(models.Model):
     location = models.CharField(max_length=200, blank=True, help_text="Physical location or virtual meeting link")
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='scheduled')
     notes = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return f"Interview with {self.candidate} for {self.job}"
 
+
+class InterviewerBooking(models.Model):
+    """
+    Time an interviewer has committed to a scheduled interview. One row per
+    (interview, interviewer), kept in step with Interview by
+    recruiters.scheduling so that availability checks are an indexed range
+    query on each interviewer's future bookings.
+    """
+    interview = models.ForeignKey(Interview, on_delete=models.CASCADE, related_name='bookings')
+    interviewer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='interview_bookings')
+    starts_at = models.DateTimeField()
+    ends_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['interview', 'interviewer'], name='unique_interview_booking'),
+        ]
+        indexes = [
+            models.Index(fields=['interviewer', 'ends_at'], name='booking_interviewer_end'),
+        ]
+
+    def __str__(self):
+        return f"{self.interviewer} booked {self.starts_at:%Y-%m-%d %H:%M}-{self.ends_at:%H:%M}"
+
+class CalendarFeed(models.Model):
+    """
+    Secret iCalendar feed URL of a user's interviews. `changed_at` moves
+    whenever one of those interviews changes, so polling clients can be
+    answered from this row alone.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='calendar_feed')
+    token = models.CharField(max_length=64, unique=True)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Calendar feed for {self.user}"
+
+
 class EmailTemplate(models.Model):
     TYPE_CHOICES = [
         ('application_received', 'Application Received'),
@@ -45,6 +85,80 @@ class EmailTemplate(models.Model):
     body = models.TextField()
     created_by = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped on every save; compiled bodies are cached per (id, version)
+    version = models.PositiveIntegerField(default=1, editable=False)
     
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            super().save(*args, **kwargs)
+            return
+        # Incremented in the database so concurrent edits never share a version
+        self.version = models.F('version') + 1
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+        super().save(*args, **kwargs)
+        self.refresh_from_db(fields=['version'])
+
+class EmailCampaign(models.Model):
+    """
+    A bulk email to every candidate in one stage of a job. The request only
+    stores this row; the send_queued_email worker expands it into one
+    OutboundEmail per candidate.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('queued', 'Queued'),
+    ]
+
+    job = models.ForeignKey(JobPost, on_delete=models.CASCADE, related_name='email_campaigns')
+    stage = models.CharField(max_length=20, choices=Application.STAGE_CHOICES)
+    template = models.ForeignKey(EmailTemplate, on_delete=models.SET_NULL, null=True, blank=True)
+    subject = models.CharField(max_length=200)
+    body = models.TextField(blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    recipient_count = models.PositiveIntegerField(default=0)
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+    queued_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.subject} to {self.get_stage_display()} candidates for {self.job}"
+
+
+class OutboundEmail(models.Model):
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    candidate = models.ForeignKey(
+        Candidate, on_delete=models.SET_NULL, null=True, blank=True, related_name='outbound_emails',
+    )
+    campaign = models.ForeignKey(
+        EmailCampaign, on_delete=models.CASCADE, null=True, blank=True, related_name='emails',
+    )
+    to_email = models.EmailField()
+    from_email = models.CharField(max_length=254)
+    subject = models.CharField(max_length=200)
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claim_token = models.CharField(max_length=32, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbound_status_next'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {self.to_email} ({self.status})"
@@ -0,0 +1,75 @@
+# recruiters/rendering.py
+"""
+Email template rendering.
+
+Parsing a template body costs far more than rendering it, so compiled bodies
+are kept in a small per-process LRU cache keyed on the EmailTemplate id and
+its version. Saving a template bumps the version, so every process picks up
+the new body the next time it loads the row; the local entry is also dropped
+straight away by a signal (see recruiters.signals).
+
+render_many() renders one compiled template against many contexts, reusing a
+single Context, for mailings to many candidates.
+"""
+import threading
+from collections import OrderedDict
+
+from django.template import Context, Template
+
+TEMPLATE_CACHE_SIZE = 256
+
+_lock = threading.Lock()
+_compiled = OrderedDict()
+
+
+def compiled_template(email_template):
+    """
+    Return the compiled body of an EmailTemplate, parsing it only once per
+    version
+    """
+    key = (email_template.pk, email_template.version)
+    with _lock:
+        template = _compiled.get(key)
+        if template is not None:
+            _compiled.move_to_end(key)
+            return template
+    template = Template(email_template.body)
+    with _lock:
+        _compiled[key] = template
+        while len(_compiled) > TEMPLATE_CACHE_SIZE:
+            _compiled.popitem(last=False)
+    return template
+
+
+def forget_template(template_id):
+    """
+    Drop every cached version of a template
+    """
+    with _lock:
+        for key in [key for key in _compiled if key[0] == template_id]:
+            del _compiled[key]
+
+
+def clear_template_cache():
+    with _lock:
+        _compiled.clear()
+
+
+def render_template(email_template, context):
+    """
+    Render an EmailTemplate's body with a dict of variables
+    """
+    return compiled_template(email_template).render(Context(context))
+
+
+def render_many(template, contexts):
+    """
+    Yield `template` (an EmailTemplate or a compiled Template) rendered with
+    each dict of variables in `contexts`
+    """
+    if not isinstance(template, Template):
+        template = compiled_template(template)
+    context = Context()
+    for variables in contexts:
+        with context.push(variables):
+            yield template.render(context)
@@ -0,0 +1,316 @@
+# recruiters/scheduling.py
+"""
+Interviewer availability.
+
+Each scheduled interview holds one InterviewerBooking row per interviewer,
+covering [scheduled_at, scheduled_at + duration). Bookings are rebuilt from
+the interview whenever it or its interviewers change (see
+recruiters.signals), and cancelled or completed interviews hold none.
+
+Conflict checks and free-slot searches read only the bookings of the
+interviewers involved that end after the start of the period of interest,
+which the (interviewer, ends_at) index serves as a range scan, so their cost
+does not grow with the number of past interviews.
+"""
+import bisect
+import math
+from collections import deque
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from ats_project.caching import candidate_stamp, touch
+from candidates.models import Application
+from candidates.pipeline import change_stage
+from .calendar_feed import touch_calendars
+from .models import Interview, InterviewerBooking
+
+# Local working hours and days (Monday is 0) used when suggesting slots
+WORKING_HOURS = (time(9), time(17))
+WORKING_DAYS = frozenset(range(5))
+SLOT_STEP = timedelta(minutes=15)
+SEARCH_HORIZON = timedelta(days=30)
+SUGGESTED_SLOTS = 5
+ALIGNMENT_EPOCH = datetime(2000, 1, 1, tzinfo=dt_timezone.utc)
+
+
+class SchedulingConflict(Exception):
+    """Raised when interviewers are already booked for part of a slot."""
+
+    def __init__(self, conflicts):
+        self.conflicts = conflicts
+        super().__init__(', '.join(describe_conflict(booking) for booking in conflicts))
+
+
+def interview_interval(scheduled_at, duration):
+    return scheduled_at, scheduled_at + timedelta(minutes=duration)
+
+
+def sync_bookings(interviews):
+    """
+    Rebuild the bookings of the given interviews from their current time,
+    status and interviewers with three queries
+    """
+    interviews = {interview.pk: interview for interview in interviews}
+    if not interviews:
+        return
+    InterviewerBooking.objects.filter(interview_id__in=interviews).delete()
+    scheduled = {pk: interview for pk, interview in interviews.items() if interview.status == 'scheduled'}
+    if not scheduled:
+        return
+    bookings = []
+    for interview_id, user_id in Interview.interviewers.through.objects.filter(
+        interview_id__in=scheduled,
+    ).values_list('interview_id', 'user_id'):
+        interview = scheduled[interview_id]
+        starts_at, ends_at = interview_interval(interview.scheduled_at, interview.duration)
+        bookings.append(InterviewerBooking(
+            interview_id=interview_id, interviewer_id=user_id, starts_at=starts_at, ends_at=ends_at,
+        ))
+    InterviewerBooking.objects.bulk_create(bookings, batch_size=1000)
+
+
+def add_bookings(interview, interviewer_ids):
+    """
+    Book newly added interviewers for a scheduled interview
+    """
+    if interview.status != 'scheduled' or not interviewer_ids:
+        return
+    starts_at, ends_at = interview_interval(interview.scheduled_at, interview.duration)
+    InterviewerBooking.objects.bulk_create([
+        InterviewerBooking(interview=interview, interviewer_id=user_id, starts_at=starts_at, ends_at=ends_at)
+        for user_id in interviewer_ids
+    ], ignore_conflicts=True)
+
+
+def lock_interviewers(interviewer_ids):
+    """
+    Serialise bookings for these interviewers until the current transaction
+    ends, so two requests cannot both pass a conflict check for the same slot
+    """
+    list(User.objects.select_for_update().filter(id__in=interviewer_ids).order_by('id').values_list('id', flat=True))
+
+
+def find_conflicts(interviewer_ids, start, end, exclude_interview=None):
+    """
+    Return the bookings of the given interviewers that overlap [start, end)
+    """
+    bookings = InterviewerBooking.objects.filter(
+        interviewer_id__in=interviewer_ids, ends_at__gt=start, starts_at__lt=end,
+    )
+    if exclude_interview is not None:
+        bookings = bookings.exclude(interview_id=exclude_interview)
+    return list(bookings.select_related('interviewer').order_by('starts_at', 'interviewer_id'))
+
+
+def ensure_available(interviewer_ids, start, end, exclude_interview=None):
+    conflicts = find_conflicts(interviewer_ids, start, end, exclude_interview)
+    if conflicts:
+        raise SchedulingConflict(conflicts)
+
+
+def describe_conflict(booking):
+    interviewer = booking.interviewer.get_full_name() or booking.interviewer.username
+    starts_at = timezone.localtime(booking.starts_at)
+    ends_at = timezone.localtime(booking.ends_at)
+    return f"{interviewer} is already booked from {starts_at:%b %d, %H:%M} to {ends_at:%H:%M}"
+
+
+def merge_intervals(intervals):
+    """
+    Sort intervals and merge the ones that overlap or touch
+    """
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def busy_intervals(interviewer_ids, start, end):
+    """
+    Merged intervals between `start` and `end` when any of the interviewers is
+    booked
+    """
+    return merge_intervals(
+        InterviewerBooking.objects.filter(
+            interviewer_id__in=interviewer_ids, ends_at__gt=start, starts_at__lt=end,
+        ).values_list('starts_at', 'ends_at')
+    )
+
+
+def working_windows(start, end, working_hours=WORKING_HOURS, working_days=WORKING_DAYS):
+    """
+    Yield the working-hour windows, in the current time zone, that fall
+    between `start` and `end`
+    """
+    tz = timezone.get_current_timezone()
+    day = timezone.localtime(start, tz).date()
+    while True:
+        day_start = timezone.make_aware(datetime.combine(day, working_hours[0]), tz)
+        if day_start >= end:
+            return
+        if day.weekday() in working_days:
+            day_end = timezone.make_aware(datetime.combine(day, working_hours[1]), tz)
+            window = (max(day_start, start), min(day_end, end))
+            if window[0] < window[1]:
+                yield window
+        day += timedelta(days=1)
+
+
+def free_windows(windows, busy):
+    """
+    Yield the parts of sorted, disjoint `windows` not covered by the merged
+    `busy` intervals
+    """
+    position = 0
+    for start, end in windows:
+        while position < len(busy) and busy[position][1] <= start:
+            position += 1
+        cursor = start
+        index = position
+        while index < len(busy) and busy[index][0] < end:
+            if busy[index][0] > cursor:
+                yield cursor, busy[index][0]
+            cursor = max(cursor, busy[index][1])
+            index += 1
+        if cursor < end:
+            yield cursor, end
+
+
+def align(moment, step=SLOT_STEP):
+    """
+    Round up to the next multiple of `step` past the hour
+    """
+    steps = math.ceil((moment - ALIGNMENT_EPOCH) / step)
+    return ALIGNMENT_EPOCH + steps * step
+
+
+def free_slots(interviewer_ids, duration, after=None, count=SUGGESTED_SLOTS,
+               working_hours=WORKING_HOURS, horizon=SEARCH_HORIZON):
+    """
+    Return up to `count` start times, earliest first, at which all of the
+    interviewers are free for `duration` minutes within working hours
+    """
+    length = timedelta(minutes=duration)
+    now = timezone.now()
+    start = max(after or now, now)
+    end = start + horizon
+    busy = busy_intervals(interviewer_ids, start, end)
+    slots = []
+    for window_start, window_end in free_windows(working_windows(start, end, working_hours), busy):
+        slot = align(window_start)
+        while slot + length <= window_end:
+            slots.append(slot)
+            if len(slots) == count:
+                return slots
+            slot = align(slot + length)
+    return slots
+
+
+class InterviewerCalendar:
+    """
+    In-memory busy intervals per interviewer, loaded with one query, for
+    planning many interviews at once
+    """
+    def __init__(self, interviewer_ids, start, end):
+        self.busy = {interviewer_id: [] for interviewer_id in interviewer_ids}
+        for interviewer_id, starts_at, ends_at in InterviewerBooking.objects.filter(
+            interviewer_id__in=interviewer_ids, ends_at__gt=start, starts_at__lt=end,
+        ).values_list('interviewer_id', 'starts_at', 'ends_at'):
+            self.busy[interviewer_id].append((starts_at, ends_at))
+        self.busy = {interviewer_id: merge_intervals(intervals) for interviewer_id, intervals in self.busy.items()}
+        self.load = {interviewer_id: 0 for interviewer_id in interviewer_ids}
+
+    def is_free(self, interviewer_id, start, end):
+        intervals = self.busy[interviewer_id]
+        # The last interval starting before `end` is the only one that can overlap
+        position = bisect.bisect_left(intervals, (end,))
+        return position == 0 or intervals[position - 1][1] <= start
+
+    def book(self, interviewer_id, start, end):
+        bisect.insort(self.busy[interviewer_id], (start, end))
+        self.load[interviewer_id] += 1
+
+
+def plan_interviews(candidate_ids, interviewer_ids, duration, start, end,
+                    working_hours=WORKING_HOURS, panel_size=1):
+    """
+    Assign each candidate, in order, the earliest slot within working hours
+    between `start` and `end` at which `panel_size` interviewers from the pool
+    are free. Several interviews can run in parallel with different panels;
+    among free interviewers the ones with the fewest interviews so far are
+    picked. Returns ([(candidate_id, scheduled_at, [interviewer_id])],
+    [candidate_ids that did not fit]).
+    """
+    length = timedelta(minutes=duration)
+    calendar = InterviewerCalendar(interviewer_ids, start, end)
+    pending = deque(candidate_ids)
+    planned = []
+    for window_start, window_end in working_windows(start, end, working_hours):
+        slot = align(window_start)
+        while pending and slot + length <= window_end:
+            slot_end = slot + length
+            free = [
+                interviewer_id for interviewer_id in interviewer_ids
+                if calendar.is_free(interviewer_id, slot, slot_end)
+            ]
+            free.sort(key=lambda interviewer_id: (calendar.load[interviewer_id], interviewer_id))
+            while pending and len(free) >= panel_size:
+                panel, free = free[:panel_size], free[panel_size:]
+                for interviewer_id in panel:
+                    calendar.book(interviewer_id, slot, slot_end)
+                planned.append((pending.popleft(), slot, panel))
+            slot += SLOT_STEP
+        if not pending:
+            break
+    return planned, list(pending)
+
+
+def schedule_interviews(job, candidate_ids, interviewer_ids, duration, start, end,
+                        working_hours=WORKING_HOURS, panel_size=1, location='', user=None):
+    """
+    Plan and create interviews for many candidates in one transaction, with
+    bulk inserts for the interviews, their interviewers and bookings.
+    Applications still in the new or screening stage move to interview.
+    Returns (created interviews, candidate ids that did not fit).
+    """
+    interviewer_ids = sorted(set(interviewer_ids))
+    with transaction.atomic():
+        lock_interviewers(interviewer_ids)
+        planned, unscheduled = plan_interviews(
+            candidate_ids, interviewer_ids, duration, start, end, working_hours, panel_size,
+        )
+        interviews = Interview.objects.bulk_create([
+            Interview(
+                candidate_id=candidate_id, job=job, scheduled_at=scheduled_at, duration=duration,
+                location=location,
+            )
+            for candidate_id, scheduled_at, _ in planned
+        ])
+        Interview.interviewers.through.objects.bulk_create([
+            Interview.interviewers.through(interview_id=interview.id, user_id=interviewer_id)
+            for interview, (_, _, panel) in zip(interviews, planned)
+            for interviewer_id in panel
+        ], batch_size=1000)
+        InterviewerBooking.objects.bulk_create([
+            InterviewerBooking(
+                interview_id=interview.id, interviewer_id=interviewer_id,
+                starts_at=interview.scheduled_at, ends_at=interview.scheduled_at + timedelta(minutes=duration),
+            )
+            for interview, (_, _, panel) in zip(interviews, planned)
+            for interviewer_id in panel
+        ], batch_size=1000)
+        early = Application.objects.filter(
+            job=job, candidate_id__in=[candidate_id for candidate_id, _, _ in planned],
+            stage__in=['new', 'screening'],
+        ).values_list('id', flat=True)
+        change_stage(list(early), 'interview', user=user)
+        touch_calendars({interviewer_id for _, _, panel in planned for interviewer_id in panel})
+        touch(*{candidate_stamp(candidate_id) for candidate_id, _, _ in planned})
+    return interviews, unscheduled
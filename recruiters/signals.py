@@ -0,0 +1,86 @@
+# recruiters/signals.py
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from ats_project.caching import candidate_stamp, touch
+from candidates.models import Candidate
+from jobs.models import JobPost
+from .calendar_feed import touch_calendars
+from .models import EmailTemplate, Interview, InterviewerBooking
+from .rendering import forget_template
+from .scheduling import add_bookings, sync_bookings
+
+
+@receiver(post_save, sender=EmailTemplate)
+@receiver(post_delete, sender=EmailTemplate)
+def forget_compiled_template(sender, instance, **kwargs):
+    forget_template(instance.pk)
+
+
+@receiver(post_save, sender=Interview)
+def sync_saved_interview_bookings(sender, instance, created, **kwargs):
+    # A new interview has no interviewers yet; they arrive through m2m_changed
+    if not created:
+        sync_bookings([instance])
+        touch_calendars(interview=instance)
+
+
+@receiver(pre_delete, sender=Interview)
+def touch_deleted_interview_calendars(sender, instance, **kwargs):
+    touch_calendars(interview=instance)
+
+
+@receiver(post_save, sender=Candidate)
+def touch_candidate_calendars(sender, instance, created, **kwargs):
+    # Event summaries show the candidate's name and the job title
+    if not created:
+        touch_calendars(interviews=Interview.objects.filter(candidate=instance))
+
+
+@receiver(post_save, sender=JobPost)
+def touch_job_calendars(sender, instance, created, **kwargs):
+    if not created:
+        touch_calendars(interviews=Interview.objects.filter(job=instance))
+
+
+@receiver(m2m_changed, sender=Interview.interviewers.through)
+def sync_interviewer_bookings(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        touch_calendars([instance.pk] if reverse else None, interview=None if reverse else instance)
+    elif action in ('post_add', 'post_remove'):
+        touch_calendars([instance.pk] if reverse else pk_set)
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        # Interviews added to or removed from a user's conducted_interviews
+        if action == 'post_clear':
+            InterviewerBooking.objects.filter(interviewer=instance).delete()
+        else:
+            sync_bookings(Interview.objects.filter(id__in=pk_set))
+    elif action == 'post_add':
+        add_bookings(instance, pk_set)
+    elif action == 'post_remove':
+        InterviewerBooking.objects.filter(interview=instance, interviewer_id__in=pk_set).delete()
+    else:
+        InterviewerBooking.objects.filter(interview=instance).delete()
+
+
+@receiver(post_save, sender=Interview)
+@receiver(post_delete, sender=Interview)
+def touch_interview_candidate_page(sender, instance, **kwargs):
+    touch(candidate_stamp(instance.candidate_id))
+
+
+@receiver(m2m_changed, sender=Interview.interviewers.through)
+def touch_interviewer_candidate_pages(sender, instance, action, reverse, pk_set, **kwargs):
+    # Interviewer names are shown on the candidate's interviews tab
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        touch(candidate_stamp(instance.candidate_id))
+        return
+    if action == 'pre_clear':
+        interviews = Interview.objects.filter(interviewers=instance)
+    else:
+        interviews = Interview.objects.filter(id__in=pk_set)
+    touch(*{candidate_stamp(candidate_id) for candidate_id in interviews.values_list('candidate_id', flat=True)})
@@ -1,3 +1,486 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import smtplib
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends import locmem
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from ats_project.query_budget import QueryBudgetTestMixin
+from candidates.models import Application, Candidate
+from jobs.models import Department, JobPost
+from .mailer import MAX_ATTEMPTS, claim_emails, queue_email, requeue_stale_emails, retry_delay, send_queued_emails
+from .scheduling import find_conflicts, free_slots, plan_interviews
+from .rendering import clear_template_cache, compiled_template, render_many, render_template
+from .calendar_feed import get_or_create_feed
+from .models import CalendarFeed, EmailCampaign, EmailTemplate, Interview, InterviewerBooking, Note, OutboundEmail
+
+
+class RecruiterViewQueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('recruiter', 'recruiter@example.com', 'password', is_staff=True)
+        cls.interviewers = [
+            User.objects.create_user(f'interviewer{i}', f'interviewer{i}@example.com', 'password', is_staff=True)
+            for i in range(3)
+        ]
+        department = Department.objects.create(name='Engineering')
+        cls.job = JobPost.objects.create(
+            title='Engineer', department=department, location='Remote', description='Build things',
+            requirements='Python, Django', responsibilities='Ship features', status='published',
+            created_by=cls.user,
+        )
+        cls.candidate = Candidate.objects.create(
+            first_name='Ada', last_name='Lovelace', email='ada@example.com', resume='resumes/resume.pdf',
+        )
+        cls.application = Application.objects.create(candidate=cls.candidate, job=cls.job)
+        cls.templates = [
+            EmailTemplate.objects.create(
+                name=f'Template {i}', type='interview_invitation', subject='Interview',
+                body='Hi {{ candidate.first_name }}, about {{ job.title }}', created_by=author,
+            )
+            for i, author in enumerate(cls.interviewers)
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_add_note(self):
+        url = reverse('add_note', args=[self.candidate.id])
+        self.assertWithinQueryBudget(url)
+        self.assertWithinQueryBudget(url, method='post', data={'content': 'Great call'})
+        self.assertTrue(Note.objects.filter(candidate=self.candidate).exists())
+
+    def test_schedule_interview(self):
+        url = reverse('schedule_interview', args=[self.candidate.id, self.job.id])
+        self.assertWithinQueryBudget(url)
+        scheduled_at = (timezone.now() + timedelta(days=2)).strftime('%Y-%m-%dT%H:%M')
+        data = {
+            'interviewers': [user.id for user in self.interviewers],
+            'scheduled_at': scheduled_at, 'duration': 60, 'location': 'Room 1', 'notes': '',
+        }
+        response = self.assertWithinQueryBudget(url, method='post', data=data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Interview.objects.get().interviewers.count(), 3)
+        self.application.refresh_from_db()
+        self.assertEqual(self.application.stage, 'interview')
+
+    def test_interview_export(self):
+        interview = Interview.objects.create(
+            candidate=self.candidate, job=self.job, scheduled_at=timezone.now(), duration=45, location='Room 2',
+        )
+        interview.interviewers.set(self.interviewers[:2])
+
+        # The budget counts the queries made while the body streams
+        response = self.assertWithinQueryBudget(reverse('interview_export', args=['jsonl']))
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['candidate_email'], 'ada@example.com')
+        self.assertEqual([user['username'] for user in rows[0]['interviewers']], ['interviewer0', 'interviewer1'])
+
+        response = self.client.get(reverse('interview_export', args=['csv']), {'status': 'cancelled'})
+        self.assertEqual(len(list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))), 1)
+
+    def test_email_templates(self):
+        response = self.assertWithinQueryBudget(reverse('email_template_list'))
+        self.assertEqual(len(response.context['templates']), 3)
+        self.assertWithinQueryBudget(reverse('email_template_create'))
+        data = {'name': 'Rejection', 'type': 'rejection', 'subject': 'Update', 'body': 'Sorry'}
+        self.assertWithinQueryBudget(reverse('email_template_create'), method='post', data=data)
+
+    def test_send_email(self):
+        self.assertWithinQueryBudget(reverse('send_email', args=[self.candidate.id]))
+        self.assertWithinQueryBudget(
+            reverse('send_email_with_template', args=[self.candidate.id, self.templates[0].id])
+        )
+        data = {'template': self.templates[0].id, 'subject': 'Interview', 'body': 'ignored'}
+        self.assertWithinQueryBudget(reverse('send_email', args=[self.candidate.id]), method='post', data=data)
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(OutboundEmail.objects.get().status, 'queued')
+
+        send_queued_emails()
+        self.assertEqual(mail.outbox[0].body, 'Hi Ada, about Engineer')
+        self.assertEqual(mail.outbox[0].to, ['ada@example.com'])
+        self.assertEqual(OutboundEmail.objects.get().status, 'sent')
+
+    def test_email_campaigns(self):
+        self.assertWithinQueryBudget(reverse('email_campaign_create'))
+        data = {'job': self.job.id, 'stage': 'new', 'template': '', 'subject': 'Hello', 'body': 'Hi {{ candidate.first_name }}'}
+        self.assertWithinQueryBudget(reverse('email_campaign_create'), method='post', data=data)
+        self.assertEqual(mail.outbox, [])
+        send_queued_emails()
+        self.assertEqual([message.body for message in mail.outbox], ['Hi Ada'])
+
+        response = self.assertWithinQueryBudget(reverse('email_campaign_list'))
+        campaign = response.context['campaigns'][0]
+        self.assertEqual((campaign.recipient_count, campaign.sent, campaign.failed), (1, 1, 0))
+
+
+class FlakyEmailBackend(locmem.EmailBackend):
+    """
+    Records connections and refuses recipients at bounce.example.com
+    """
+    opened = 0
+
+    def open(self):
+        FlakyEmailBackend.opened += 1
+        return super().open()
+
+    def send_messages(self, messages):
+        for message in messages:
+            if message.to[0].endswith('@bounce.example.com'):
+                raise smtplib.SMTPRecipientsRefused({message.to[0]: (550, b'No such user')})
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND='recruiters.tests.FlakyEmailBackend')
+class OutboundEmailTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('recruiter', 'recruiter@example.com', 'password', is_staff=True)
+        department = Department.objects.create(name='Engineering')
+        cls.job = JobPost.objects.create(
+            title='Engineer', department=department, location='Remote', description='Build things',
+            requirements='Python, Django', responsibilities='Ship features', status='published',
+            created_by=cls.user,
+        )
+        cls.candidates = [
+            Candidate.objects.create(
+                first_name=f'Candidate{i}', last_name='Test', email=f'candidate{i}@example.com',
+                resume='resumes/resume.pdf',
+            )
+            for i in range(5)
+        ]
+        for candidate in cls.candidates:
+            Application.objects.create(candidate=candidate, job=cls.job, stage='screening')
+        other = Candidate.objects.create(
+            first_name='Other', last_name='Stage', email='other@example.com', resume='resumes/resume.pdf',
+        )
+        Application.objects.create(candidate=other, job=cls.job, stage='new')
+
+    def setUp(self):
+        FlakyEmailBackend.opened = 0
+
+    def test_campaign_sends_batch_over_one_connection(self):
+        template = EmailTemplate.objects.create(
+            name='Screening', type='interview_invitation', subject='Next steps',
+            body='Hi {{ candidate.first_name }}, about {{ job.title }} from {{ recruiter.username }}',
+            created_by=self.user,
+        )
+        EmailCampaign.objects.create(
+            job=self.job, stage='screening', template=template, subject='Next steps', created_by=self.user,
+        )
+
+        self.assertEqual(send_queued_emails(batch_size=10), 5)
+        self.assertEqual(FlakyEmailBackend.opened, 1)
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            [f'candidate{i}@example.com' for i in range(5)],
+        )
+        self.assertEqual(mail.outbox[0].body, 'Hi Candidate0, about Engineer from recruiter')
+        self.assertEqual(EmailCampaign.objects.get().recipient_count, 5)
+
+        # Campaigns are only expanded once
+        self.assertEqual(send_queued_emails(), 0)
+        self.assertEqual(OutboundEmail.objects.count(), 5)
+
+    def test_failed_messages_are_retried_with_backoff(self):
+        bounce = queue_email('nobody@bounce.example.com', 'Hello', 'Hi')
+        queue_email('ada@example.com', 'Hello', 'Hi')
+
+        self.assertEqual(send_queued_emails(), 1)
+        bounce.refresh_from_db()
+        self.assertEqual((bounce.status, bounce.attempts), ('queued', 1))
+        self.assertIn('SMTPRecipientsRefused', bounce.last_error)
+        self.assertGreater(bounce.next_attempt_at, timezone.now())
+        self.assertEqual(len(mail.outbox), 1)
+
+        for attempt in range(2, MAX_ATTEMPTS + 1):
+            OutboundEmail.objects.filter(id=bounce.id).update(next_attempt_at=timezone.now())
+            send_queued_emails()
+            bounce.refresh_from_db()
+            self.assertEqual(bounce.attempts, attempt)
+        self.assertEqual(bounce.status, 'failed')
+        self.assertEqual(retry_delay(1) * 4, retry_delay(3))
+
+    def test_claimed_messages_are_not_claimed_again(self):
+        for candidate in self.candidates:
+            queue_email(candidate.email, 'Hello', 'Hi', candidate=candidate)
+        first = claim_emails(3)
+        second = claim_emails(10)
+        self.assertEqual(len(first), 3)
+        self.assertEqual(len(second), 2)
+        self.assertFalse({email.id for email in first} & {email.id for email in second})
+        self.assertEqual(claim_emails(10), [])
+
+        OutboundEmail.objects.update(claimed_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(requeue_stale_emails(), 5)
+
+
+class EmailTemplateRenderingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('recruiter', 'recruiter@example.com', 'password')
+        cls.template = EmailTemplate.objects.create(
+            name='Invite', type='interview_invitation', subject='Interview',
+            body='Hi {{ candidate.first_name }}', created_by=cls.user,
+        )
+
+    def setUp(self):
+        clear_template_cache()
+
+    def test_compiled_once_per_version(self):
+        compiled = compiled_template(self.template)
+        self.assertIs(compiled_template(EmailTemplate.objects.get(id=self.template.id)), compiled)
+
+        template = EmailTemplate.objects.get(id=self.template.id)
+        template.body = 'Hello {{ candidate.first_name }}'
+        template.save()
+        self.assertEqual(template.version, self.template.version + 1)
+        self.assertIsNot(compiled_template(template), compiled)
+        self.assertEqual(render_template(template, {'candidate': {'first_name': 'Ada'}}), 'Hello Ada')
+
+        # Saves limited to some fields bump the version too
+        template.save(update_fields=['subject'])
+        self.assertEqual(EmailTemplate.objects.get(id=template.id).version, self.template.version + 2)
+
+    def test_render_many(self):
+        contexts = [{'candidate': {'first_name': name}} for name in ['Ada', 'Grace', "O'Brien"]]
+        self.assertEqual(
+            list(render_many(self.template, contexts)),
+            ['Hi Ada', 'Hi Grace', 'Hi O&#x27;Brien'],
+        )
+
+
+class InterviewSchedulingTests(QueryBudgetTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('recruiter', 'recruiter@example.com', 'password', is_staff=True)
+        cls.interviewers = [
+            User.objects.create_user(f'interviewer{i}', f'interviewer{i}@example.com', 'password', is_staff=True)
+            for i in range(3)
+        ]
+        department = Department.objects.create(name='Engineering')
+        cls.job = JobPost.objects.create(
+            title='Engineer', department=department, location='Remote', description='Build things',
+            requirements='Python, Django', responsibilities='Ship features', status='published',
+            created_by=cls.user,
+        )
+        cls.candidates = [
+            Candidate.objects.create(
+                first_name=f'Candidate{i}', last_name='Test', email=f'candidate{i}@example.com',
+                resume='resumes/resume.pdf',
+            )
+            for i in range(2)
+        ]
+        for candidate in cls.candidates:
+            Application.objects.create(candidate=candidate, job=cls.job)
+        # 10:00 on a Monday at least a week away
+        today = timezone.localdate()
+        monday = today + timedelta(days=7 - today.weekday() + 7)
+        cls.monday = timezone.make_aware(timezone.datetime.combine(monday, timezone.datetime.min.time()))
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def at(self, hours, minutes=0, days=0):
+        return self.monday + timedelta(days=days, hours=hours, minutes=minutes)
+
+    def book(self, start, duration, interviewers):
+        interview = Interview.objects.create(
+            candidate=self.candidates[0], job=self.job, scheduled_at=start, duration=duration,
+        )
+        interview.interviewers.set(interviewers)
+        return interview
+
+    def test_bookings_follow_interviews(self):
+        interview = self.book(self.at(10), 60, self.interviewers[:2])
+        self.assertEqual(InterviewerBooking.objects.filter(interview=interview).count(), 2)
+
+        interview.interviewers.remove(self.interviewers[0])
+        self.assertEqual(
+            list(InterviewerBooking.objects.values_list('interviewer_id', flat=True)), [self.interviewers[1].id],
+        )
+
+        interview.scheduled_at = self.at(14)
+        interview.save()
+        self.assertEqual(InterviewerBooking.objects.get().starts_at, self.at(14))
+
+        interview.status = 'cancelled'
+        interview.save()
+        self.assertFalse(InterviewerBooking.objects.exists())
+
+    def test_conflicts_are_overlaps_only(self):
+        ids = [user.id for user in self.interviewers]
+        self.book(self.at(10), 60, self.interviewers[:1])
+        self.assertEqual(len(find_conflicts(ids, self.at(10, 30), self.at(11, 30))), 1)
+        self.assertEqual(find_conflicts(ids, self.at(11), self.at(12)), [])
+        self.assertEqual(find_conflicts(ids[1:], self.at(10), self.at(11)), [])
+
+    def test_free_slots_shared_by_all_interviewers(self):
+        self.book(self.at(9), 60, self.interviewers[:1])
+        self.book(self.at(10), 90, self.interviewers[1:2])
+        self.book(self.at(13), 240, self.interviewers[:1])
+        ids = [user.id for user in self.interviewers[:2]]
+        self.assertEqual(
+            free_slots(ids, 60, after=self.at(8), count=4),
+            [self.at(11, 30), self.at(9, days=1), self.at(10, days=1), self.at(11, days=1)],
+        )
+
+    def test_schedule_interview_rejects_conflicts(self):
+        self.book(self.at(10), 60, self.interviewers[:1])
+        url = reverse('schedule_interview', args=[self.candidates[1].id, self.job.id])
+        data = {
+            'interviewers': [self.interviewers[0].id, self.interviewers[1].id],
+            'scheduled_at': self.at(10, 30).strftime('%Y-%m-%dT%H:%M'), 'duration': 60,
+            'location': 'Room 1', 'notes': '',
+        }
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('interviewer0 is already booked', response.content.decode())
+        self.assertEqual(response.context['form'].suggested_slots[0], self.at(11))
+        self.assertEqual(Interview.objects.count(), 1)
+
+        data['scheduled_at'] = self.at(11).strftime('%Y-%m-%dT%H:%M')
+        self.assertEqual(self.client.post(url, data).status_code, 302)
+        self.assertEqual(InterviewerBooking.objects.count(), 3)
+
+    def test_plan_interviews_without_overlaps(self):
+        self.book(self.at(9), 60, self.interviewers[:1])
+        ids = [user.id for user in self.interviewers[:2]]
+        planned, unscheduled = plan_interviews(
+            list(range(1, 6)), ids, 60, self.at(9), self.at(12), panel_size=1,
+        )
+        # interviewer0 is busy until 10:00, so interviewer1 takes the first slot alone
+        self.assertEqual([(slot, panel) for _, slot, panel in planned], [
+            (self.at(9), [ids[1]]), (self.at(10), [ids[0]]), (self.at(10), [ids[1]]),
+            (self.at(11), [ids[0]]), (self.at(11), [ids[1]]),
+        ])
+        self.assertEqual(unscheduled, [])
+
+        planned, unscheduled = plan_interviews(list(range(1, 6)), ids, 60, self.at(9), self.at(12), panel_size=2)
+        self.assertEqual([slot for _, slot, _ in planned], [self.at(10), self.at(11)])
+        self.assertEqual(unscheduled, [3, 4, 5])
+
+    def test_schedule_interviews_batch(self):
+        for i in range(2, 6):
+            candidate = Candidate.objects.create(
+                first_name=f'Candidate{i}', last_name='Test', email=f'candidate{i}@example.com',
+                resume='resumes/resume.pdf',
+            )
+            Application.objects.create(candidate=candidate, job=self.job)
+        self.book(self.at(10), 60, self.interviewers[:1])
+        url = reverse('schedule_interviews_batch', args=[self.job.id])
+        self.assertWithinQueryBudget(url)
+        data = {
+            'stage': 'new', 'interviewers': [user.id for user in self.interviewers], 'panel_size': 2,
+            'duration': 60, 'start_date': self.monday.date(), 'end_date': self.monday.date(),
+            'day_start': '10:00', 'day_end': '12:00', 'location': 'Room 1',
+        }
+        self.assertWithinQueryBudget(url, method='post', data=data)
+
+        # Candidate0 already has an interview; of the other five only two fit
+        # (10:00 without the booked interviewer0, then 11:00)
+        interviews = Interview.objects.exclude(candidate=self.candidates[0]).order_by('scheduled_at', 'id')
+        self.assertEqual([interview.scheduled_at for interview in interviews], [self.at(10), self.at(11)])
+        for interview in interviews:
+            ids = [user.id for user in interview.interviewers.all()]
+            self.assertEqual(len(ids), 2)
+            start = interview.scheduled_at
+            self.assertEqual(find_conflicts(ids, start, start + timedelta(minutes=60), exclude_interview=interview.id), [])
+        self.assertEqual(InterviewerBooking.objects.count(), 5)
+        self.assertEqual(Application.objects.filter(stage='interview').count(), 2)
+
+
+class InterviewCalendarTests(QueryBudgetTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('recruiter', 'recruiter@example.com', 'password', is_staff=True)
+        cls.interviewer = User.objects.create_user('interviewer', 'interviewer@example.com', 'password', is_staff=True)
+        department = Department.objects.create(name='Engineering')
+        cls.job = JobPost.objects.create(
+            title='Engineer', department=department, location='Remote', description='Build things',
+            requirements='Python, Django', responsibilities='Ship features', status='published',
+            created_by=cls.user,
+        )
+        cls.candidate = Candidate.objects.create(
+            first_name='Ada', last_name='Lovelace', email='ada@example.com', resume='resumes/resume.pdf',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.feed = get_or_create_feed(self.interviewer)
+        self.url = reverse('interview_calendar', args=[self.feed.token])
+
+    def schedule(self, **fields):
+        interview = Interview.objects.create(
+            candidate=self.candidate, job=self.job, scheduled_at=timezone.now() + timedelta(days=2),
+            duration=45, **fields,
+        )
+        interview.interviewers.add(self.interviewer)
+        return interview
+
+    def test_feed_lists_interviews(self):
+        self.schedule(location='Room 1, 2nd floor', notes='Bring a laptop; ask about C++')
+        response = self.assertWithinQueryBudget(self.url)
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        body = response.content.decode()
+        self.assertTrue(body.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertIn('SUMMARY:Interview: Ada Lovelace (Engineer)\r\n', body)
+        self.assertIn('LOCATION:Room 1\\, 2nd floor\r\n', body)
+        self.assertIn('DESCRIPTION:Bring a laptop\\; ask about C++\r\n', body)
+        self.assertTrue(all(len(line.encode()) <= 75 for line in body.split('\r\n')))
+        self.assertEqual(self.client.get(reverse('interview_calendar', args=['wrong'])).status_code, 404)
+
+    def test_unchanged_feed_is_not_modified(self):
+        interview = self.schedule()
+        response = self.client.get(self.url)
+        etag = response['ETag']
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+        # Any change to the interviewer's interviews changes the feed
+        interview.status = 'cancelled'
+        interview.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('STATUS:CANCELLED', response.content.decode())
+
+        etag = response['ETag']
+        interview.interviewers.remove(self.interviewer)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertNotIn('BEGIN:VEVENT', response.content.decode())
+
+    def test_renames_change_the_feed(self):
+        self.schedule()
+        etag = self.client.get(self.url)['ETag']
+
+        self.candidate.last_name = 'King'
+        self.candidate.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('SUMMARY:Interview: Ada King (Engineer)\r\n', response.content.decode())
+
+        self.job.title = 'Staff Engineer'
+        self.job.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('SUMMARY:Interview: Ada King (Staff Engineer)\r\n', response.content.decode())
+
+    def test_feed_settings(self):
+        self.client.force_login(self.interviewer)
+        response = self.assertWithinQueryBudget(reverse('calendar_feed_settings'))
+        self.assertTrue(response.context['feed_url'].endswith(self.url))
+        self.assertWithinQueryBudget(reverse('calendar_feed_settings'), method='post')
+        self.assertNotEqual(CalendarFeed.objects.get(user=self.interviewer).token, self.feed.token)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
@@ -4,6 +4,14 @@ from . import views
 urlpatterns = [
     path('notes/add/<int:candidate_id>/', views.add_note, name='add_note'),
     path('interviews/schedule/<int:candidate_id>/<int:job_id>/', views.schedule_interview, name='schedule_interview'),
+    path('interviews/batch/<int:job_id>/', views.schedule_interviews_batch, name='schedule_interviews_batch'),
+    path('interviews/calendar/', views.calendar_feed_settings, name='calendar_feed_settings'),
+    path('interviews/calendar/<str:token>.ics', views.interview_calendar, name='interview_calendar'),
+    path('interviews/export/<str:fmt>/', views.interview_export, name='interview_export'),
     path('email/<int:candidate_id>/', views.send_email, name='send_email'),
     path('email/<int:candidate_id>/<int:template_id>/', views.send_email, name='send_email_with_template'),
+    path('email-campaigns/', views.email_campaign_list, name='email_campaign_list'),
+    path('email-campaigns/create/', views.email_campaign_create, name='email_campaign_create'),
+    path('email-templates/', views.email_template_list, name='email_template_list'),
+    path('email-templates/create/', views.email_template_create, name='email_template_create'),
 ]
\ No newline at end of file
@@ -2,20 +2,33 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.template import Template, Context
-from django.core.mail import send_mail
-from django.conf import settings
-from django.http import HttpResponseRedirect
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Q
+from django.http import Http404, HttpResponse, HttpResponseRedirect
 from django.urls import reverse
-from .models import Note, Interview, EmailTemplate
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from .calendar_feed import feed_etag, get_or_create_feed, new_token, render_feed
+from .exporting import INTERVIEW_EXPORT_COLUMNS, interview_export_queryset, interview_rows
+from .mailer import queue_email
+from .rendering import render_template
+from .scheduling import (
+    SchedulingConflict, ensure_available, interview_interval, lock_interviewers, schedule_interviews,
+)
+from .models import Note, Interview, EmailTemplate, EmailCampaign, CalendarFeed
 from .forms import (
-    NoteForm, InterviewForm, EmailTemplateForm, SendEmailForm,
+    NoteForm, InterviewForm, BatchInterviewForm, EmailTemplateForm, SendEmailForm, EmailCampaignForm,
     CandidateStageUpdateForm, InterviewFeedbackForm
 )
-from candidates.models import Candidate
+from candidates.exporting import ExportFormatError, export_response
+from candidates.models import Application, Candidate
+from candidates.pipeline import change_stage
 from jobs.models import JobPost
+from ats_project.query_budget import query_budget
 
 @login_required
+@query_budget(4)
 def add_note(request, candidate_id):
     """
     Add a note to a candidate's profile
@@ -40,6 +53,7 @@ def add_note(request, candidate_id):
     })
 
 @login_required
+@query_budget(24)
 def schedule_interview(request, candidate_id, job_id):
     """
     Schedule an interview with a candidate
@@ -53,17 +67,33 @@ def schedule_interview(request, candidate_id, job_id):
             interview = form.save(commit=False)
             interview.candidate = candidate
             interview.job = job
-            interview.save()
-            
-            # Save many-to-many relationships
-            form.save_m2m()
+            interviewer_ids = [user.id for user in form.cleaned_data['interviewers']]
+            try:
+                with transaction.atomic():
+                    # Check again under lock in case someone else booked the
+                    # slot since the form was validated
+                    lock_interviewers(interviewer_ids)
+                    ensure_available(interviewer_ids, *interview_interval(interview.scheduled_at, interview.duration))
+                    interview.save()
+                    
+                    # Save many-to-many relationships
+                    form.save_m2m()
+            except SchedulingConflict as exc:
+                form.add_error(None, str(exc))
+                return render(request, 'recruiters/interview_form.html', {
+                    'form': form,
+                    'candidate': candidate,
+                    'job': job
+                })
             
             messages.success(request, f'Interview with {candidate.first_name} {candidate.last_name} scheduled successfully!')
             
-            # Update candidate stage if it's still in early stages
-            if candidate.stage in ['new', 'screening']:
-                candidate.stage = 'interview'
-                candidate.save()
+            # Move the application on if it is still in an early stage
+            change_stage(
+                Application.objects.filter(candidate=candidate, job=job, stage__in=['new', 'screening'])
+                .values_list('id', flat=True),
+                'interview', user=request.user,
+            )
             
             # In a real implementation, this would send email notifications
             # notify_candidate_and_interviewers(interview)
@@ -79,16 +109,78 @@ def schedule_interview(request, candidate_id, job_id):
     })
 
 @login_required
+@query_budget(22)
+def schedule_interviews_batch(request, job_id):
+    """
+    Schedule interviews for every candidate of a job in a stage at once
+    """
+    job = get_object_or_404(JobPost, id=job_id)
+    
+    if request.method == 'POST':
+        form = BatchInterviewForm(request.POST)
+        if form.is_valid():
+            data = form.cleaned_data
+            already_scheduled = Interview.objects.filter(
+                candidate=OuterRef('candidate'), job=job, status='scheduled',
+            )
+            candidate_ids = list(
+                Application.objects.filter(job=job, stage=data['stage'])
+                .exclude(Exists(already_scheduled))
+                .order_by('stage_changed_at', 'id').values_list('candidate_id', flat=True)
+            )
+            start, end = form.period()
+            interviews, unscheduled = schedule_interviews(
+                job, candidate_ids, [user.id for user in data['interviewers']], data['duration'], start, end,
+                working_hours=(data['day_start'], data['day_end']), panel_size=data['panel_size'],
+                location=data['location'], user=request.user,
+            )
+            messages.success(request, f'Scheduled {len(interviews)} interview(s) for {job.title}.')
+            if unscheduled:
+                messages.warning(
+                    request, f'{len(unscheduled)} candidate(s) could not be fitted in; '
+                    'widen the dates or working hours, or add interviewers.'
+                )
+            return redirect('job_detail', job_id=job.id)
+    else:
+        form = BatchInterviewForm()
+    
+    return render(request, 'recruiters/interview_batch_form.html', {
+        'form': form,
+        'job': job
+    })
+
+@login_required
+@query_budget(4)
+def interview_export(request, fmt):
+    """
+    Stream all interviews as CSV, JSON Lines or Parquet. The body costs two
+    queries per EXPORT_CHUNK_SIZE interviews; the budget covers one chunk.
+    """
+    interviews = Interview.objects.all()
+    status = request.GET.get('status', '')
+    if status in dict(Interview.STATUS_CHOICES):
+        interviews = interviews.filter(status=status)
+    try:
+        return export_response(
+            interview_rows(interview_export_queryset(interviews)),
+            INTERVIEW_EXPORT_COLUMNS, fmt, f'interviews-{timezone.localdate().isoformat()}',
+        )
+    except ExportFormatError as exc:
+        raise Http404(str(exc))
+
+@login_required
+@query_budget(3)
 def email_template_list(request):
     """
     List all email templates
     """
-    templates = EmailTemplate.objects.all().order_by('type', 'name')
+    templates = EmailTemplate.objects.select_related('created_by').order_by('type', 'name')
     return render(request, 'recruiters/email_template_list.html', {
         'templates': templates
     })
 
 @login_required
+@query_budget(3)
 def email_template_create(request):
     """
     Create a new email template
@@ -110,9 +202,10 @@ def email_template_create(request):
     })
     
 @login_required
-def send_email(request, candidate_id):
+@query_budget(6)
+def send_email(request, candidate_id, template_id=None):
     """
-    Send an email to a candidate using a selected template
+    Queue an email to a candidate using a selected template
     """
     candidate = get_object_or_404(Candidate, id=candidate_id)
     
@@ -123,30 +216,101 @@ def send_email(request, candidate_id):
             subject = form.cleaned_data['subject']
             body = form.cleaned_data['body']
             
-            # If a template is selected, render its body
+            # If a template is selected, render its body; {{ job }} is the
+            # job of the candidate's latest application
             if template:
-                body = Template(template.body).render(Context({
+                application = candidate.applications.select_related('job').order_by('-created_at').first()
+                body = render_template(template, {
                     'candidate': candidate,
-                    'job': candidate.job,
+                    'job': application.job if application else None,
+                    'application': application,
                     'recruiter': request.user
-                }))
+                })
             
-            # Send the email
-            send_mail(
-                subject,
-                body,
-                settings.DEFAULT_FROM_EMAIL,
-                [candidate.email],
-                fail_silently=False,
-            )
+            # Queue the email; the send_queued_email worker delivers it
+            queue_email(candidate.email, subject, body, candidate=candidate)
             
             # Show a success message
-            messages.success(request, f'Email sent to {candidate.first_name} {candidate.last_name}!')
+            messages.success(request, f'Email to {candidate.first_name} {candidate.last_name} queued for delivery!')
             return redirect('candidate_detail', candidate_id=candidate.id)
     else:
-        form = SendEmailForm()
+        form = SendEmailForm(template_id=template_id)
     
     return render(request, 'recruiters/send_email_form.html', {
         'form': form,
         'candidate': candidate
-    })    
\ No newline at end of file
+    })
+
+@login_required
+@query_budget(3)
+def email_campaign_list(request):
+    """
+    List bulk email campaigns with their delivery progress
+    """
+    campaigns = EmailCampaign.objects.select_related('job', 'template', 'created_by').annotate(
+        sent=Count('emails', filter=Q(emails__status='sent')),
+        failed=Count('emails', filter=Q(emails__status='failed')),
+    ).order_by('-created_at')[:100]
+    return render(request, 'recruiters/email_campaign_list.html', {
+        'campaigns': campaigns
+    })
+
+@login_required
+@query_budget(5)
+def email_campaign_create(request):
+    """
+    Queue an email to every candidate in one stage of a job
+    """
+    if request.method == 'POST':
+        form = EmailCampaignForm(request.POST)
+        if form.is_valid():
+            campaign = form.save(commit=False)
+            campaign.created_by = request.user
+            campaign.save()
+            messages.success(
+                request, f'Email to {campaign.get_stage_display()} candidates for {campaign.job.title} queued for delivery!'
+            )
+            return redirect('email_campaign_list')
+    else:
+        form = EmailCampaignForm(initial={
+            'job': request.GET.get('job'),
+            'stage': request.GET.get('stage'),
+        })
+
+    return render(request, 'recruiters/email_campaign_form.html', {
+        'form': form
+    })
+
+@login_required
+@query_budget(5)
+def calendar_feed_settings(request):
+    """
+    Show the user's interview calendar feed URL, or replace it with a new one
+    """
+    feed = get_or_create_feed(request.user)
+    if request.method == 'POST':
+        feed.token = new_token()
+        feed.save(update_fields=['token'])
+        messages.success(request, 'Your calendar feed has a new address. The old one no longer works.')
+        return redirect('calendar_feed_settings')
+    
+    return render(request, 'recruiters/calendar_feed.html', {
+        'feed_url': request.build_absolute_uri(reverse('interview_calendar', args=[feed.token]))
+    })
+
+@query_budget(2)
+def interview_calendar(request, token):
+    """
+    iCalendar feed of the interviews a user conducts, for calendar apps. The
+    secret token in the URL stands in for a login.
+    """
+    feed = get_object_or_404(CalendarFeed.objects.only('user_id', 'changed_at'), token=token)
+    etag = feed_etag(feed)
+    last_modified = int(feed.changed_at.timestamp())
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = HttpResponse(render_feed(feed.user_id), content_type='text/calendar; charset=utf-8')
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'private, no-cache'
+    return response